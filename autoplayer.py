@@ -0,0 +1,216 @@
+# autoplayer.py
+# Scripted player for soak / stress runs of the whole stack.
+#
+# The game creates an AutoPlayer when started with --autoplay and calls
+# update() once per frame. Taps are posted as synthetic MOUSEBUTTONUP
+# events, so they go through the same event loop and click handlers as a
+# real finger. A background thread plays the voice bot's part by driving
+# commands through game_state.api. SoakMonitor collects frame times,
+# memory samples and API error counts for the end-of-run report.
+
+import gc
+import os
+import random
+import threading
+import time
+
+import pygame
+from pygame.locals import MOUSEBUTTONUP
+
+from game_state import api
+
+
+class AutoPlayer:
+    """Plays the game through the pygame event queue.
+
+    accuracy    probability that an aimed tap lands on its target
+    tap_rate    taps per second while playing (Poisson)
+    latency_ms  (mean, stddev) delay between picking a target and the tap
+                landing, so fast enemies can move out from under the finger
+    """
+
+    def __init__(self, accuracy=0.8, tap_rate=3.0, latency_ms=(180.0, 60.0),
+                 voice_interval=15.0, pause_every=90.0, seed=None):
+        self.accuracy = accuracy
+        self.tap_rate = tap_rate
+        self.latency_ms = latency_ms
+        self.voice_interval = voice_interval
+        self.pause_every = pause_every
+        self.rng = random.Random(seed)
+        self.pending = []          # [due, (x, y)] taps waiting out their latency
+        self.next_tap = None
+        self.state = None
+        self.state_since = 0.0
+        self.nav_done = False
+        self.taps = 0
+        self.voice_commands = 0
+        self._stop = threading.Event()
+        self._voice_thread = None
+
+    # ---- voice side (runs like the bot process would, off the game thread)
+    def start(self):
+        if self.voice_interval > 0:
+            self._voice_thread = threading.Thread(target=self._voice_loop, daemon=True)
+            self._voice_thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _voice_loop(self):
+        rng = random.Random(self.rng.random())
+        while not self._stop.wait(self.voice_interval):
+            choice = rng.random()
+            if choice < 0.15:
+                api.set_volume(rng.randrange(0, 101, 10))
+            elif choice < 0.25:
+                api.set_difficulty(rng.choice(["easy", "normal", "hard"]))
+            else:
+                api.issue_command(rng.choice(["start", "pause", "resume", "restart"]))
+            self.voice_commands += 1
+
+    # ---- touch side (called from the game loop)
+    def _latency(self):
+        mean, sd = self.latency_ms
+        return max(0.0, self.rng.gauss(mean, sd)) / 1000.0
+
+    def _queue_tap(self, now, pos):
+        # aimed now, lands after the reaction delay
+        self.pending.append([now + self._latency(), pos])
+
+    def _aim(self, enemies):
+        """Pick the on-screen enemy closest to escaping and a point to tap."""
+        target = None
+        for e in enemies:
+            if e["hp"] > 0 and e["rect"].right > 0:
+                if target is None or e["dist"] > target["dist"]:
+                    target = e
+        if target is None:
+            return None
+        r = target["rect"]
+        if self.rng.random() < self.accuracy:
+            return (self.rng.randint(r.left, r.right - 1),
+                    self.rng.randint(r.top, r.bottom - 1))
+        # a miss lands just outside the sprite
+        dx = self.rng.choice((-1, 1)) * self.rng.randint(r.width // 2 + 2, r.width)
+        dy = self.rng.choice((-1, 1)) * self.rng.randint(r.height // 2 + 2, r.height)
+        return (r.centerx + dx, r.centery + dy)
+
+    def update(self, now, state, enemies, buttons):
+        """Schedule and post this frame's synthetic taps.
+
+        `buttons` maps "start", "pause", "resume" and "restart" to the Rects
+        of the on-screen buttons for those actions.
+        """
+        if state != self.state:
+            self.state = state
+            self.state_since = now
+            self.nav_done = False
+            self.next_tap = None
+
+        # screens other than gameplay: press the obvious button after a beat
+        nav = {"menu": "start", "paused": "resume", "game_over": "restart"}.get(state)
+        if nav and not self.nav_done and now - self.state_since > 1.0:
+            self._queue_tap(now, buttons[nav].center)
+            self.nav_done = True
+
+        if state == "playing":
+            if self.next_tap is None:
+                self.next_tap = now + self.rng.expovariate(self.tap_rate)
+            while self.next_tap <= now:
+                self.next_tap += self.rng.expovariate(self.tap_rate)
+                pos = self._aim(enemies)
+                if pos is not None:
+                    self._queue_tap(now, pos)
+            if self.pause_every > 0 and self.rng.random() < (1.0 / 30) / self.pause_every:
+                self._queue_tap(now, buttons["pause"].center)
+
+        keep = []
+        for item in self.pending:
+            if item[0] <= now:
+                # stamped like a PiTFT touch: the moment the "finger" landed,
+                # not when it aimed, or lag compensation would rewind the
+                # player's own reaction time away
+                pygame.event.post(pygame.event.Event(MOUSEBUTTONUP, {"pos": item[1], "button": 1,
+                                                                     "timestamp": item[0]}))
+                self.taps += 1
+            else:
+                keep.append(item)
+        self.pending = keep
+
+
+class SoakMonitor:
+    """Frame-time histograms, memory samples and API error counts."""
+
+    BUCKETS = 250      # 1 ms buckets; the last one catches everything slower
+
+    def __init__(self, budget_ms=1000.0 / 30, sample_every=10.0):
+        self.budget_ms = budget_ms
+        self.sample_every = sample_every
+        self.interval_hist = [0] * self.BUCKETS
+        self.work_hist = [0] * self.BUCKETS
+        self.frames = 0
+        self.dropped = 0
+        self.worst_interval = 0.0
+        self.worst_work = 0.0
+        self.started = time.time()
+        self.next_sample = self.started
+        self.samples = []          # (elapsed_sec, rss_kb, gc_objects)
+
+    def frame(self, interval_ms, work_ms):
+        self.frames += 1
+        self.interval_hist[min(int(interval_ms), self.BUCKETS - 1)] += 1
+        self.work_hist[min(int(work_ms), self.BUCKETS - 1)] += 1
+        if interval_ms > 1.5 * self.budget_ms:
+            self.dropped += 1
+        self.worst_interval = max(self.worst_interval, interval_ms)
+        self.worst_work = max(self.worst_work, work_ms)
+
+    def sample(self, now):
+        if now >= self.next_sample:
+            self.samples.append((now - self.started, _rss_kb(), len(gc.get_objects())))
+            self.next_sample = now + self.sample_every
+
+    def _percentile(self, hist, q):
+        target = q * sum(hist)
+        seen = 0
+        for ms, n in enumerate(hist):
+            seen += n
+            if seen >= target and n:
+                return ms
+        return 0
+
+    def report(self, extra=None):
+        elapsed = time.time() - self.started
+        lines = ["=== Soak report ===",
+                 "duration      %.1f min, %d frames (%.1f fps)"
+                 % (elapsed / 60.0, self.frames, self.frames / max(elapsed, 1e-9))]
+        for name, hist, worst in (("frame", self.interval_hist, self.worst_interval),
+                                  ("work", self.work_hist, self.worst_work)):
+            lines.append("%-13s p50 %d ms  p95 %d ms  p99 %d ms  max %.1f ms"
+                         % (name + " time", self._percentile(hist, 0.50),
+                            self._percentile(hist, 0.95),
+                            self._percentile(hist, 0.99), worst))
+        lines.append("dropped       %d frames over %.0f ms"
+                     % (self.dropped, 1.5 * self.budget_ms))
+        if len(self.samples) >= 2:
+            t0, rss0, obj0 = self.samples[0]
+            t1, rss1, obj1 = self.samples[-1]
+            hours = max((t1 - t0) / 3600.0, 1e-9)
+            lines.append("memory        rss %d -> %d KB (%+.0f KB/h), gc objects %d -> %d (%+.0f/h)"
+                         % (rss0, rss1, (rss1 - rss0) / hours,
+                            obj0, obj1, (obj1 - obj0) / hours))
+        errors = api.get_error_counts()
+        lines.append("api errors    %d total %s" % (sum(errors.values()), errors or ""))
+        for key, value in (extra or {}).items():
+            lines.append("%-13s %s" % (key, value))
+        return "\n".join(lines)
+
+
+def _rss_kb():
+    """Current resident set size in KB (Linux), falling back to peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
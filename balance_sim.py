@@ -0,0 +1,244 @@
+# balance_sim.py
+# Headless Monte Carlo difficulty balancing.
+#
+# Plays the game rules from game_rules.py without pygame, over a sweep of
+# difficulty parameters and a simple player model (Poisson taps at a given
+# rate, each hitting with a given accuracy), spread over a process pool.
+# Spawns follow waves/<difficulty>.json when the game would use one.
+#
+#   python3 balance_sim.py --rounds 20000 --tap-rate 2,3,4 --accuracy 0.7,0.9
+#   python3 balance_sim.py --difficulty hard --speed 45,60 --player-hp 3,4
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from game_rules import (SCREEN_SIZE, ENEMY_W, SPAWN_INTERVAL,
+                        DIFFICULTY_SETTINGS, ENEMY_TYPES, build_path_sets,
+                        move_along_path, has_escaped)
+from wave_scheduler import WAVE_DIR, WaveScheduler, load_waves, default_wave
+
+W, H = SCREEN_SIZE
+PATH_SETS = build_path_sets(W, H, ENEMY_W)
+WAVES = load_waves(PATH_SETS, ENEMY_TYPES)   # the same files as the game
+TICK = 1.0 / 30          # the game runs at clock.tick(30)
+MAX_ROUND_SEC = 600.0    # safety stop for configs nobody can finish
+
+FIELDS = ["difficulty", "path", "speed", "hp", "count", "player_hp",
+          "tap_rate", "accuracy", "rounds", "win_rate",
+          "mean_win_sec", "mean_round_sec"]
+
+
+def simulate_round(rng, events, paths, path, speed, init_hp, player_hp,
+                   tap_rate, accuracy, spawn_interval=SPAWN_INTERVAL):
+    """Play one round headlessly. Returns (won, seconds).
+
+    `events` is the round's wave (see wave_scheduler.py); entries without a
+    type use `speed`/`init_hp`, entries without a path use `path`, and a
+    path index picks from `paths`, like spawn_enemy() in the game.
+    """
+    enemies = []
+    wave = WaveScheduler(events, spawn_interval)
+    t = 0.0
+    next_tap = rng.expovariate(tap_rate) if tap_rate > 0 else MAX_ROUND_SEC
+
+    while t < MAX_ROUND_SEC:
+        t += TICK
+
+        # taps land on last frame's positions, like the game's event loop;
+        # the player aims at the on-screen enemy closest to escaping
+        while next_tap <= t:
+            next_tap += rng.expovariate(tap_rate)
+            target = None
+            for e in enemies:
+                if e["hp"] > 0 and -ENEMY_W < e["x"] < W:
+                    if target is None or e["dist"] > target["dist"]:
+                        target = e
+            if target is not None and rng.random() < accuracy:
+                target["hp"] -= 1
+
+        wave.poll(t, lambda entry: enemies.append(
+            new_enemy(entry, paths, path, speed, init_hp)))
+
+        keep = 0
+        for e in enemies:
+            move_along_path(e, TICK)
+            if has_escaped(e):
+                player_hp -= 1
+            elif e["hp"] > 0:
+                enemies[keep] = e
+                keep += 1
+        del enemies[keep:]
+
+        if player_hp <= 0:
+            return False, t
+        if wave.empty() and not enemies:
+            return True, t
+    return False, t
+
+
+def new_enemy(entry, paths, path, speed, init_hp):
+    if entry["path"] is not None:
+        path = paths[entry["path"]]
+    if entry["type"] is not None:
+        speed = ENEMY_TYPES[entry["type"]]["speed"]
+        init_hp = ENEMY_TYPES[entry["type"]]["hp"]
+    sx, sy = path[0]
+    return {"path": path, "hp": init_hp, "x": float(sx), "y": float(sy),
+            "speed": speed, "seg_idx": 0, "dist": 0.0}
+
+
+def run_batch(task):
+    """Worker entry point: simulate `rounds` rounds of one configuration."""
+    key, rounds, seed = task
+    diff, path_idx, speed, hp, count, player_hp, tap_rate, accuracy = key
+    rng = random.Random(seed)
+    paths = PATH_SETS[diff]
+    events = WAVES.get(diff) or default_wave(count, SPAWN_INTERVAL)
+    wins = 0
+    win_time = 0.0
+    total_time = 0.0
+    for _ in range(rounds):
+        won, sec = simulate_round(rng, events, paths, paths[path_idx], speed, hp,
+                                  player_hp, tap_rate, accuracy)
+        total_time += sec
+        if won:
+            wins += 1
+            win_time += sec
+    return key, rounds, wins, win_time, total_time
+
+
+def _list(text, cast):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def build_configs(args):
+    """Cartesian product of the sweep; unset parameters use the difficulty's values.
+
+    A difficulty with a wave file gets its count from the file.
+    """
+    configs = []
+    for diff in args.difficulty:
+        base = DIFFICULTY_SETTINGS[diff]
+        speeds = args.speed or [base["ENEMY_SPEED"]]
+        hps = args.hp or [base["INIT_HP"]]
+        if diff in WAVES:
+            counts = [sum(e["count"] for e in WAVES[diff])]
+        else:
+            counts = args.count or [base["MAX_ENEMIES"]]
+        player_hps = args.player_hp or [base["PLAYER_HP"]]
+        for path_idx in range(len(PATH_SETS[diff])):
+            for combo in itertools.product(speeds, hps, counts, player_hps,
+                                           args.tap_rate, args.accuracy):
+                configs.append((diff, path_idx) + combo)
+    return configs
+
+
+def build_tasks(configs, rounds, batch, seed):
+    tasks = []
+    n = 0
+    for key in configs:
+        left = rounds
+        while left > 0:
+            size = min(batch, left)
+            tasks.append((key, size, seed * 1000003 + n))
+            n += 1
+            left -= size
+    return tasks
+
+
+def print_table(rows):
+    header = ("%-7s %4s %6s %4s %5s %4s %5s %5s %8s %6s %8s %8s"
+              % ("diff", "path", "speed", "hp", "count", "php", "taps",
+                 "acc", "rounds", "win%", "t_win", "t_round"))
+    last_group = None
+    for r in rows:
+        group = (r["difficulty"], r["path"])
+        if group != last_group:
+            print()
+            print(header)
+            print("-" * len(header))
+            last_group = group
+        t_win = "%.1f" % r["mean_win_sec"] if r["mean_win_sec"] is not None else "-"
+        print("%-7s %4d %6.1f %4d %5d %4d %5.1f %5.2f %8d %5.1f%% %8s %8.1f"
+              % (r["difficulty"], r["path"], r["speed"], r["hp"], r["count"],
+                 r["player_hp"], r["tap_rate"], r["accuracy"], r["rounds"],
+                 100.0 * r["win_rate"], t_win, r["mean_round_sec"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo difficulty balancing")
+    parser.add_argument("--difficulty", default="easy,normal,hard",
+                        type=lambda s: _list(s, str))
+    parser.add_argument("--rounds", type=int, default=2000,
+                        help="rounds per configuration")
+    parser.add_argument("--tap-rate", default="2,3,4", type=lambda s: _list(s, float),
+                        help="player taps per second")
+    parser.add_argument("--accuracy", default="0.6,0.8,0.95",
+                        type=lambda s: _list(s, float),
+                        help="probability that a tap hits its target")
+    parser.add_argument("--speed", type=lambda s: _list(s, float), help="ENEMY_SPEED values")
+    parser.add_argument("--hp", type=lambda s: _list(s, int), help="INIT_HP values")
+    parser.add_argument("--count", type=lambda s: _list(s, int), help="MAX_ENEMIES values")
+    parser.add_argument("--player-hp", type=lambda s: _list(s, int), help="PLAYER_HP values")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch", type=int, default=500,
+                        help="rounds per worker task")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--csv", help="also write the table to this CSV file")
+    args = parser.parse_args()
+
+    for diff in args.difficulty:
+        if diff not in DIFFICULTY_SETTINGS:
+            parser.error("unknown difficulty %r" % diff)
+        if diff in WAVES:
+            if args.count:
+                parser.error("%s uses %s; --count doesn't apply to it"
+                             % (diff, os.path.join(WAVE_DIR, diff + ".json")))
+            print("[Sim] %s: spawning from %s" % (diff, os.path.join(WAVE_DIR, diff + ".json")))
+
+    configs = build_configs(args)
+    tasks = build_tasks(configs, args.rounds, args.batch, args.seed)
+    print("[Sim] %d configs x %d rounds = %d rounds on %d workers"
+          % (len(configs), args.rounds, len(configs) * args.rounds, args.workers))
+
+    totals = {}
+    t0 = time.time()
+    with Pool(processes=args.workers) as pool:
+        for key, rounds, wins, win_time, total_time in pool.imap_unordered(run_batch, tasks):
+            acc = totals.setdefault(key, [0, 0, 0.0, 0.0])
+            acc[0] += rounds
+            acc[1] += wins
+            acc[2] += win_time
+            acc[3] += total_time
+    elapsed = time.time() - t0
+
+    rows = []
+    for key in configs:
+        rounds, wins, win_time, total_time = totals[key]
+        row = dict(zip(FIELDS, key))
+        row["rounds"] = rounds
+        row["win_rate"] = wins / float(rounds)
+        row["mean_win_sec"] = win_time / wins if wins else None
+        row["mean_round_sec"] = total_time / rounds
+        rows.append(row)
+
+    print_table(rows)
+    print("\n[Sim] %d rounds in %.1fs (%.0f rounds/s)"
+          % (len(configs) * args.rounds, elapsed,
+             len(configs) * args.rounds / max(elapsed, 1e-9)))
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print("[Sim] Wrote %s" % args.csv)
+
+
+if __name__ == "__main__":
+    main()
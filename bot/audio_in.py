@@ -1,12 +1,11 @@
 import sounddevice as sd
-import numpy as np
 import pygame
 import time
 
-try:
-    import RPi.GPIO as GPIO
-    _gpio_initialized = False
-except:
+from gpio_input import shared_input, is_fake
+from .audio_ring import AudioRing
+
+if is_fake():
     print('Warning: Not in the Respi Env!')
 
 def record_utterance(seconds: float = 2.5, samplerate: int = 16000) -> bytes:
@@ -40,24 +39,24 @@ def init_pygame_for_keys():
         pygame.display.set_caption("Press and hold SPACE to talk")
 
 
-def record_until_space_release(samplerate: int = 16000, max_seconds: float = 6.0) -> bytes:
+def record_until_space_release(samplerate: int = 16000, max_seconds: float = 6.0) -> memoryview:
     """
     Press and hold the Space key to start recording; release it to stop.
         - Audio format: 16 kHz, mono, 16-bit PCM (compatible with Lex RecognizeUtterance)
         - max_seconds: Safety limit to prevent the user from holding the key indefinitely; recording is automatically truncated when the limit is reached.
-    Returns raw bytes, which can be directly used as the Lex inputStream.
+    Returns a memoryview of the raw PCM bytes in a preallocated buffer.
     """
     init_pygame_for_keys()
 
     print(">>> Hold SPACE to talk, release SPACE to finish (Esc to cancel).")
 
-    recording = []
+    ring = AudioRing(int(samplerate * max_seconds))
     started = False
     stream = None
 
     def callback(indata, frames, time, status):
-        # indata: shape (frames, channels)
-        recording.append(indata.copy())
+        # indata: shape (frames, channels); only ever the newest max_seconds are kept
+        ring.write(indata[:, 0])
 
     clock = pygame.time.Clock()
     elapsed = 0.0
@@ -104,50 +103,45 @@ def record_until_space_release(samplerate: int = 16000, max_seconds: float = 6.0
         stream.stop()
         stream.close()
 
-    if not recording:
+    if not ring.written:
         print("[REC] No audio captured.")
-        return b""
+        return memoryview(b"")
 
-    audio_np = np.concatenate(recording, axis=0)  # (N, 1)
-    print(f"[REC] Captured {audio_np.shape[0] / samplerate:.2f}s audio.")
-    return audio_np.tobytes()
+    print(f"[REC] Captured {min(ring.written, ring.capacity) / samplerate:.2f}s audio.")
+    return ring.view(0, ring.written)
 
 def init_gpio_for_button(pin: int):
-    global _gpio_initialized
-    if _gpio_initialized:
-        return
-    BUTTON_PIN = pin
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    _gpio_initialized = True
-    print(f"[GPIO] Button on BCM pin {BUTTON_PIN}, pull-up enabled.")
+    buttons = shared_input()
+    if "ptt" not in buttons.buttons:
+        buttons.add_button("ptt", pin)
+        print(f"[GPIO] Button on BCM pin {pin}, pull-up enabled, edge interrupts.")
+    return buttons
 
 def record_until_button_release(
     pin: int,
     samplerate: int = 16000,
     max_seconds: float = 6.0
-) -> bytes:
+) -> memoryview:
     
-    init_gpio_for_button(pin)
+    buttons = init_gpio_for_button(pin)
 
     print(f">>> Hold the physical button (BCM {pin}) to talk, release to send.")
 
     print("[REC] Waiting for button press...")
     try:
-        while GPIO.input(pin) == GPIO.HIGH:
-            time.sleep(0.01)
+        buttons.wait_press("ptt")
     except KeyboardInterrupt:
         print("[REC] Interrupted before recording.")
         return b""
 
     print("[REC] Button pressed, start recording...")
 
-    recording_chunks = []
+    ring = AudioRing(int(samplerate * max_seconds))
     start_time = time.time()
 
     def callback(indata, frames, time_info, status):
         # indata: shape (frames, channels), dtype=int16
-        recording_chunks.append(indata.copy())
+        ring.write(indata[:, 0])
 
     stream = sd.InputStream(
         samplerate=samplerate,
@@ -158,25 +152,20 @@ def record_until_button_release(
     stream.start()
 
     try:
-        while True:
-            if GPIO.input(pin) == GPIO.HIGH:
-                print("[REC] Button released, stopping.")
-                break
-            if time.time() - start_time >= max_seconds:
-                print(f"[REC] Max {max_seconds}s reached, stopping.")
-                break
-            time.sleep(0.01)
+        if buttons.wait_release("ptt", max_seconds - (time.time() - start_time)):
+            print("[REC] Button released, stopping.")
+        else:
+            print(f"[REC] Max {max_seconds}s reached, stopping.")
     except KeyboardInterrupt:
         print("[REC] Interrupted during recording.")
 
     stream.stop()
     stream.close()
 
-    if not recording_chunks:
+    if not ring.written:
         print("[REC] No audio captured.")
-        return b""
+        return memoryview(b"")
 
-    audio_np = np.concatenate(recording_chunks, axis=0)  # (N, 1)
-    duration = audio_np.shape[0] / samplerate
+    duration = min(ring.written, ring.capacity) / samplerate
     print(f"[REC] Captured {duration:.2f}s audio.")
-    return audio_np.tobytes()
+    return ring.view(0, ring.written)
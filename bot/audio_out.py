@@ -2,19 +2,31 @@ import os
 import io
 import time
 import threading
-from typing import Dict
+from typing import Dict, Optional
 
 import boto3
 import pygame
 from dotenv import load_dotenv
 from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
 
+from .cancel import Cancelled, check
+
 #load_dotenv()
 
 _tts_cache: Dict[str, bytes] = {}
 _cache_lock = threading.Lock()
 _pygame_inited = False
 
+# playback state, so the capture side can ignore the bot's own voice
+_playing = threading.Event()
+_played_until = 0.0      # time.monotonic() when the last clip finished
+
+
+def is_playing(tail: float = 0.0) -> bool:
+    """True while a clip is playing, or within `tail` seconds after it ended
+    (room echo and mixer latency outlast get_busy())."""
+    return _playing.is_set() or time.monotonic() - _played_until < tail
+
 
 def _get_polly_client():
     session = boto3.Session(
@@ -32,10 +44,12 @@ def _ensure_pygame_mixer():
         _pygame_inited = True
 
 
-def _synthesize_with_retry(text: str, voice_id: str, max_retries: int = 3) -> bytes:
+def _synthesize_with_retry(text: str, voice_id: str, max_retries: int = 3,
+                           cancel: Optional[threading.Event] = None) -> bytes:
     delay = 0.5
     last_exc = None
     for attempt in range(1, max_retries + 1):
+        check(cancel)
         try:
             polly = _get_polly_client()
             resp = polly.synthesize_speech(
@@ -52,9 +66,14 @@ def _synthesize_with_retry(text: str, voice_id: str, max_retries: int = 3) -> by
     raise last_exc
 
 
-def speak(text: str, voice_id: str = None):
+def speak(text: str, voice_id: str = None, cancel: Optional[threading.Event] = None) -> bool:
+    """
+    Say `text` and block until it has played. Setting `cancel` stops
+    playback within one mixer poll (10 ms) and skips any synthesis not yet
+    started. Returns False if the clip was cut short or never played.
+    """
     if not text:
-        return
+        return False
 
     voice_id = voice_id or os.getenv("POLLY_VOICE", "Joanna")
     print(f"[Polly] → {text}")
@@ -64,19 +83,35 @@ def speak(text: str, voice_id: str = None):
 
     if audio_stream is None:
         try:
-            audio_stream = _synthesize_with_retry(text, voice_id)
+            audio_stream = _synthesize_with_retry(text, voice_id, cancel=cancel)
             with _cache_lock:
                 _tts_cache[text] = audio_stream
+        except Cancelled:
+            print("[Polly] Cancelled before playback.")
+            return False
         except Exception as e:
             print(f"[Polly FATAL] Failed to synthesize speech: {e}")
 
             fallback_msg = "Sorry, my voice is having trouble right now."
 
             print(f"[Polly] (fallback, no audio) → {fallback_msg}")
-            return
+            return False
 
+    global _played_until
+    if cancel is not None and cancel.is_set():
+        return False
     _ensure_pygame_mixer()
     pygame.mixer.music.load(io.BytesIO(audio_stream))
-    pygame.mixer.music.play()
-    while pygame.mixer.music.get_busy():
-        pygame.time.wait(10)
+    _playing.set()
+    try:
+        pygame.mixer.music.play()
+        while pygame.mixer.music.get_busy():
+            if cancel is not None and cancel.is_set():
+                pygame.mixer.music.stop()
+                print("[Polly] Playback interrupted.")
+                return False
+            pygame.time.wait(10)
+        return True
+    finally:
+        _played_until = time.monotonic()
+        _playing.clear()
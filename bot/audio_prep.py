@@ -0,0 +1,123 @@
+import time
+
+import numpy as np
+
+
+# recognize_utterance content types for 16-bit little-endian mono PCM
+CONTENT_TYPES = {
+    16000: "audio/l16; rate=16000; channels=1",
+    8000: "audio/lpcm; sample-rate=8000; sample-size-bits=16; channel-count=1; is-big-endian=false",
+}
+
+
+def _halfband_taps(n: int = 31) -> np.ndarray:
+    """Windowed-sinc low-pass at a quarter of the input rate (for 2:1 decimation)."""
+    k = np.arange(n) - (n - 1) / 2.0
+    taps = 0.5 * np.sinc(0.5 * k) * np.hamming(n)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+_HALFBAND = _halfband_taps()
+
+
+class PreparedAudio:
+    """An utterance ready for Lex, plus what preparing it changed."""
+
+    def __init__(self, pcm: bytes, samplerate: int, content_type: str,
+                 in_bytes: int, trimmed_ms: float, gain_db: float, prep_ms: float):
+        self.pcm = pcm
+        self.samplerate = samplerate
+        self.content_type = content_type
+        self.in_bytes = in_bytes
+        self.trimmed_ms = trimmed_ms
+        self.gain_db = gain_db
+        self.prep_ms = prep_ms
+
+    def summary(self) -> str:
+        out = len(self.pcm)
+        saved = 100.0 * (1.0 - out / self.in_bytes) if self.in_bytes else 0.0
+        return (f"{self.in_bytes / 1024:.1f} KB -> {out / 1024:.1f} KB ({saved:.0f}% smaller), "
+                f"trimmed {self.trimmed_ms:.0f} ms, gain {self.gain_db:+.1f} dB, "
+                f"{self.samplerate} Hz, {self.prep_ms:.1f} ms")
+
+
+class AudioPrep:
+    """
+    Shrinks a captured utterance before it is uploaded to Lex.
+
+    - trims leading and trailing silence (the endpointer always hands over
+      `silence_ms` of it, plus the capture pre-roll), keeping `pad_ms` on
+      each side so word edges survive;
+    - peak-normalizes to `target_dbfs`, with at most `max_gain_db` of boost
+      so a quiet room isn't turned into loud noise;
+    - optionally decimates 16 kHz to 8 kHz (`target_rate=8000`), which
+      halves the upload again at some cost in recognition accuracy.
+
+    Silence is judged per `frame_ms` frame against the loudest frame
+    (`trim_db` below it) and an absolute `floor` RMS.
+    """
+
+    def __init__(
+        self,
+        samplerate: int = 16000,
+        target_rate: int = 16000,
+        frame_ms: int = 20,
+        trim_db: float = 35.0,
+        floor: float = 100.0,
+        pad_ms: int = 150,
+        target_dbfs: float = -3.0,
+        max_gain_db: float = 18.0,
+    ):
+        if target_rate not in CONTENT_TYPES or samplerate % target_rate:
+            raise ValueError(f"Unsupported Lex sample rate {target_rate} for {samplerate} Hz input")
+        self.samplerate = samplerate
+        self.target_rate = target_rate
+        self.frame = samplerate * frame_ms // 1000
+        self.trim_ratio = 10.0 ** (-trim_db / 20.0)
+        self.floor = floor
+        self.pad = samplerate * pad_ms // 1000
+        self.target_peak = 32767.0 * 10.0 ** (target_dbfs / 20.0)
+        self.max_gain = 10.0 ** (max_gain_db / 20.0)
+
+    def voiced_range(self, x: np.ndarray):
+        """Sample range [start, end) from the first to the last non-silent frame, padded."""
+        n = x.shape[0] // self.frame
+        if n == 0:
+            return 0, x.shape[0]
+        frames = x[:n * self.frame].reshape(n, self.frame)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        loud = np.flatnonzero(rms >= max(self.floor, float(rms.max()) * self.trim_ratio))
+        if loud.size == 0:
+            return 0, x.shape[0]
+        start = max(0, int(loud[0]) * self.frame - self.pad)
+        end = min(x.shape[0], (int(loud[-1]) + 1) * self.frame + self.pad)
+        return start, end
+
+    def process(self, pcm: bytes) -> PreparedAudio:
+        t0 = time.perf_counter()
+        x = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+
+        start, end = self.voiced_range(x)
+        trimmed_ms = (x.shape[0] - (end - start)) * 1000.0 / self.samplerate
+        x = x[start:end]
+
+        gain = 1.0
+        peak = float(np.abs(x).max()) if x.size else 0.0
+        if peak > 0.0:
+            gain = min(self.target_peak / peak, self.max_gain)
+            x *= gain
+
+        if self.target_rate != self.samplerate:
+            factor = self.samplerate // self.target_rate
+            x = np.convolve(x, _HALFBAND, mode="same")[::factor]
+
+        out = np.clip(np.rint(x), -32768, 32767).astype("<i2").tobytes()
+        return PreparedAudio(
+            pcm=out,
+            samplerate=self.target_rate,
+            content_type=CONTENT_TYPES[self.target_rate],
+            in_bytes=len(pcm),
+            trimmed_ms=trimmed_ms,
+            gain_db=20.0 * np.log10(gain),
+            prep_ms=(time.perf_counter() - t0) * 1000.0,
+        )
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class AudioRing:
+    """
+    Preallocated int16 capture buffer for the sounddevice callbacks.
+
+    The buffer is mirrored (every sample is stored at i and i + capacity),
+    so any window of up to `capacity` samples is one contiguous slice and
+    can be handed out as a memoryview without copying. Positions are
+    absolute sample counts (`written` only ever grows), which doubles as
+    a sample clock for endpointing.
+
+    Nothing here allocates arrays per block: write() copies straight
+    into the buffer.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buf = np.zeros(2 * capacity, dtype=np.int16)
+        self.written = 0
+
+    def reset(self):
+        self.written = 0
+
+    def write(self, block: np.ndarray):
+        """Append a 1-D int16 block (e.g. indata[:, 0])."""
+        n = block.shape[0]
+        if n > self.capacity:
+            block = block[n - self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+        cap = self.capacity
+        pos = self.written % cap
+        first = min(n, cap - pos)
+        self.buf[pos:pos + first] = block[:first]
+        self.buf[pos + cap:pos + cap + first] = block[:first]
+        rest = n - first
+        if rest:
+            self.buf[:rest] = block[first:]
+            self.buf[cap:cap + rest] = block[first:]
+        self.written += n
+
+    def oldest(self) -> int:
+        """First absolute sample index still held in the buffer."""
+        return max(0, self.written - self.capacity)
+
+    def view(self, start: int, end: int) -> memoryview:
+        """
+        Zero-copy little-endian PCM bytes for absolute samples [start, end).
+        Only valid until the ring wraps over them again.
+        """
+        start = max(start, self.oldest())
+        end = min(end, self.written)
+        if end <= start:
+            return memoryview(b"")
+        pos = start % self.capacity
+        return memoryview(self.buf[pos:pos + (end - start)]).cast("B")
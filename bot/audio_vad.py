@@ -1,8 +1,172 @@
-import time
+import threading
 from typing import Optional
 
 import numpy as np
-import sounddevice as sd
+
+from .audio_ring import AudioRing
+
+
+class Endpointer:
+    """
+    Energy-threshold endpointing, run from the audio callback.
+
+    update() is fed every block along with its absolute sample position and
+    returns "start" when speech begins, "end" when the utterance is over and
+    None otherwise. All timing is in samples, so decisions are exact to the
+    block and independent of when the callback happens to be scheduled.
+    After "end", `start` and `end` hold the utterance's sample range.
+
+    `onset_blocks` consecutive voiced blocks are needed to start an
+    utterance, so a single click or bang doesn't open one.
+    """
+
+    def __init__(
+        self,
+        samplerate: int = 16000,
+        energy_threshold: float = 50.0,
+        min_speech_ms: int = 300,
+        max_speech_ms: int = 6000,
+        silence_ms: int = 600,
+        block_size: int = 1024,
+        onset_blocks: int = 1,
+    ):
+        self.samplerate = samplerate
+        self.onset_blocks = onset_blocks
+        self.energy_threshold = energy_threshold
+        self.min_speech = samplerate * min_speech_ms // 1000
+        self.max_speech = samplerate * max_speech_ms // 1000
+        self.silence = samplerate * silence_ms // 1000
+        self._scratch = np.zeros(block_size, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.speaking = False
+        self.voiced_run = 0
+        self.run_start = 0
+        self.start = 0
+        self.end = 0
+        self.last_voice = 0
+        self.reason = None
+
+    def begin_at(self, start: int, end: int):
+        """Open an utterance at `start` without waiting for an onset (barge-in)."""
+        self.reset()
+        self.speaking = True
+        self.start = start
+        self.last_voice = end
+
+    def rms(self, block: np.ndarray) -> float:
+        """RMS of an int16 block via a preallocated float32 scratch (no temporaries)."""
+        n = block.shape[0]
+        if n > self._scratch.shape[0]:
+            self._scratch = np.zeros(n, dtype=np.float32)
+        s = self._scratch[:n]
+        np.copyto(s, block, casting="unsafe")
+        return float(np.sqrt(np.dot(s, s) / n)) if n else 0.0
+
+    def is_voice(self, block: np.ndarray) -> bool:
+        return self.rms(block) > self.energy_threshold
+
+    def update(self, block: np.ndarray, pos: int) -> Optional[str]:
+        end = pos + block.shape[0]
+        voice = self.is_voice(block)
+        if not self.speaking:
+            if not voice:
+                self.voiced_run = 0
+                return None
+            if self.voiced_run == 0:
+                self.run_start = pos
+            self.voiced_run += 1
+            if self.voiced_run < self.onset_blocks:
+                return None
+            self.voiced_run = 0
+            self.speaking = True
+            self.start = self.run_start
+            self.last_voice = end
+            self.reason = None
+            return "start"
+        if voice:
+            self.last_voice = end
+        length = end - self.start
+        if length >= self.max_speech:
+            self.reason = "max"
+        elif end - self.last_voice >= self.silence and length >= self.min_speech:
+            self.reason = "silence"
+        else:
+            return None
+        self.speaking = False
+        self.end = end
+        return "end"
+
+
+class AdaptiveEndpointer(Endpointer):
+    """
+    Endpointer for noisy rooms: the threshold follows the noise floor and a
+    loud block only counts as voice if its spectrum looks like speech.
+
+    - noise floor: tracked in dB on non-voice blocks, falling fast and rising
+      slowly, so steady BGM or crowd noise raises the bar instead of opening
+      utterances; a block must beat it by `snr_db`
+    - speech band: share of energy in 300-3400 Hz must exceed `min_band_ratio`
+      (rejects rumble and hiss)
+    - flatness: spectral flatness must stay under `max_flatness` (rejects
+      broadband noise such as crowd chatter and fans)
+    - hangover: `onset_blocks` voiced blocks to start, `silence_ms` to end
+
+    The FFT only runs on blocks that already passed the energy test.
+    """
+
+    def __init__(
+        self,
+        samplerate: int = 16000,
+        min_speech_ms: int = 300,
+        max_speech_ms: int = 6000,
+        silence_ms: int = 600,
+        block_size: int = 1024,
+        onset_blocks: int = 2,
+        snr_db: float = 9.0,
+        min_energy: float = 30.0,
+        min_band_ratio: float = 0.5,
+        max_flatness: float = 0.45,
+        floor_rise: float = 0.02,
+        floor_fall: float = 0.3,
+    ):
+        super().__init__(samplerate, min_energy, min_speech_ms, max_speech_ms,
+                         silence_ms, block_size, onset_blocks)
+        self.snr_db = snr_db
+        self.min_band_ratio = min_band_ratio
+        self.max_flatness = max_flatness
+        self.floor_rise = floor_rise
+        self.floor_fall = floor_fall
+        self.noise_db = None
+        freqs = np.fft.rfftfreq(block_size, 1.0 / samplerate)
+        self._band = (freqs >= 300.0) & (freqs <= 3400.0)
+        self._window = np.hanning(block_size).astype(np.float32)
+
+    def is_voice(self, block: np.ndarray) -> bool:
+        rms = self.rms(block)
+        db = 20.0 * np.log10(rms + 1e-3)
+        if self.noise_db is None:
+            self.noise_db = db
+        voice = rms > self.energy_threshold and db > self.noise_db + self.snr_db
+        if voice:
+            voice = self._speech_like(block)
+        if not voice:
+            # adapt only on non-voice blocks, so speech doesn't raise the floor
+            rate = self.floor_fall if db < self.noise_db else self.floor_rise
+            self.noise_db += rate * (db - self.noise_db)
+        return voice
+
+    def _speech_like(self, block: np.ndarray) -> bool:
+        n = block.shape[0]
+        if n != self._window.shape[0]:
+            return True
+        s = self._scratch[:n]          # rms() just filled it with this block
+        power = np.abs(np.fft.rfft(s * self._window)) ** 2 + 1e-9
+        total = float(power.sum())
+        band_ratio = float(power[self._band].sum()) / total
+        flatness = float(np.exp(np.mean(np.log(power)))) / (total / power.shape[0])
+        return band_ratio >= self.min_band_ratio and flatness <= self.max_flatness
 
 
 def record_one_utterance_vad(
@@ -12,39 +176,40 @@ def record_one_utterance_vad(
     min_speech_ms: int = 300,
     max_speech_ms: int = 6000,
     silence_ms: int = 600,
-) -> bytes:
-    min_speech_sec = min_speech_ms / 1000.0
-    max_speech_sec = max_speech_ms / 1000.0
-    silence_sec = silence_ms / 1000.0
+    preroll_ms: int = 200,
+    idle_timeout: float = 10.0,
+) -> memoryview:
+    """
+    Capture one utterance into a preallocated ring buffer and return it as
+    a zero-copy memoryview of 16-bit PCM bytes. `preroll_ms` of audio from
+    before the threshold crossing is kept so the first word isn't clipped.
+    The endpoint is decided in the audio callback; this thread just waits.
+    """
+    # imported here so the endpointers can be used offline (see vad_eval.py)
+    import sounddevice as sd
 
-    state = "idle"
-    utterance_blocks = []
-    speech_start_time: Optional[float] = None
-    last_voice_time: Optional[float] = None
+    preroll = int(samplerate * preroll_ms / 1000)
+    ring = AudioRing(preroll + samplerate * max_speech_ms // 1000 + block_size)
+    endpointer = Endpointer(samplerate, energy_threshold, min_speech_ms,
+                            max_speech_ms, silence_ms, block_size)
+    started = threading.Event()
+    ended = threading.Event()
 
     print("[VAD] Listening for one utterance...")
 
     def callback(indata, frames, time_info, status):
-        nonlocal state, utterance_blocks, speech_start_time, last_voice_time
         if status:
             print(f"[VAD] Input status: {status}")
-
-        block = indata.copy()
-        block_f32 = block.astype(np.float32)
-        rms = float(np.sqrt(np.mean(block_f32 ** 2)))
-        now = time.time()
-
-        if state == "idle":
-            if rms > energy_threshold:
-                # start speaking
-                state = "speaking"
-                utterance_blocks = [block]
-                speech_start_time = now
-                last_voice_time = now
-        else:
-            utterance_blocks.append(block)
-            if rms > energy_threshold:
-                last_voice_time = now
+        if ended.is_set():
+            return
+        block = indata[:, 0]
+        pos = ring.written
+        ring.write(block)
+        event = endpointer.update(block, pos)
+        if event == "start":
+            started.set()
+        elif event == "end":
+            ended.set()
 
     with sd.InputStream(
         samplerate=samplerate,
@@ -53,29 +218,21 @@ def record_one_utterance_vad(
         blocksize=block_size,
         callback=callback,
     ):
-        start = time.time()
-        while True:
-            now = time.time()
-            if state == "idle":
-                if now - start > 10.0:
-                    break
-            else:
-                # speaking
-                elapsed_speech = now - speech_start_time
-                elapsed_silence = now - last_voice_time
-                if elapsed_speech >= max_speech_sec:
-                    print("[VAD] Max utterance length reached.")
-                    break
-                if elapsed_silence >= silence_sec and elapsed_speech >= min_speech_sec:
-                    print("[VAD] Detected utterance end.")
-                    break
-            time.sleep(0.01)
-
-    if not utterance_blocks:
+        if started.wait(idle_timeout):
+            # generous bound in case the device stops delivering blocks
+            ended.wait(max_speech_ms / 1000.0 + 2.0)
+        ended.set()
+
+    if not started.is_set():
         print("[VAD] No speech detected in this window.")
-        return b""
+        return memoryview(b"")
+    if endpointer.reason == "max":
+        print("[VAD] Max utterance length reached.")
+    else:
+        print("[VAD] Detected utterance end.")
 
-    audio_np = np.concatenate(utterance_blocks, axis=0)
-    duration = audio_np.shape[0] / samplerate
+    end = endpointer.end if endpointer.reason else ring.written
+    audio = ring.view(endpointer.start - preroll, end)
+    duration = len(audio) / (2 * samplerate)
     print(f"[VAD] Captured {duration:.2f}s audio.")
-    return audio_np.tobytes()
+    return audio
@@ -3,11 +3,8 @@ import threading
 import requests
 import boto3
 import json
-import gzip
-import base64
 import time
 from dotenv import load_dotenv
-from botocore.exceptions import BotoCoreError, ClientError
 
 from game_state.api import *
 from .persona import (
@@ -19,8 +16,14 @@ from .persona import (
     INTENT_PAUSE,
     INTENT_RESUME,
 )
-from .audio_out import speak
-from .audio_vad import record_one_utterance_vad
+from .audio_out import speak, is_playing
+from .capture import CaptureService
+from .audio_vad import AdaptiveEndpointer
+from .audio_prep import AudioPrep
+from .recognizer import LexRecognizer, StreamingRecognizer
+from .local_asr import LocalRecognizer, HybridRecognizer
+from .pipeline import Pipeline, Turn
+from .cancel import Cancelled, check
 from .interaction_logger import log_interaction
 
 
@@ -33,6 +36,15 @@ BOT_ID = os.getenv("LEX_BOT_ID")
 BOT_ALIAS_ID = os.getenv("LEX_ALIAS_ID")
 LOCALE_ID = os.getenv("LEX_LOCALE_ID", "en_US")
 SESSION_ID = os.getenv("LEX_SESSION_ID", "pi_voice_session") # Use voice session
+ECHO_TAIL_SEC = float(os.getenv("BOT_ECHO_TAIL_MS", "400")) / 1000.0 # room echo after TTS stops
+AUDIO_PREP = os.getenv("BOT_AUDIO_PREP", "1") == "1" # trim/normalize before upload
+LEX_RATE = int(os.getenv("BOT_LEX_RATE", "16000")) # 8000 halves the upload again
+RECOGNIZER = os.getenv("BOT_RECOGNIZER", "lex") # "lex", "stream", "local" or "hybrid"
+STREAM_ADDR = os.getenv("BOT_STREAM_ADDR", "127.0.0.1:8765") # see bot/stream_server.py
+SPEAK_QUEUE = int(os.getenv("BOT_SPEAK_QUEUE", "2")) # replies + announcements waiting to be spoken
+BARGE_IN_DB = os.getenv("BOT_BARGE_IN_DB", "10") # how far over our own echo the user must be; "" disables
+PIPELINE_REPORT_EVERY = int(os.getenv("BOT_PIPELINE_REPORT_EVERY", "10")) # turns between latency reports
+VOSK_MODEL = os.getenv("VOSK_MODEL", os.path.join(os.path.dirname(__file__), "models", "vosk-model-small-en-us-0.15"))
 
 lex = boto3.client("lexv2-runtime", region_name=AWS_REGION)
 bedrock = boto3.client("bedrock-runtime", region_name=AWS_REGION)
@@ -41,9 +53,32 @@ agent_client = boto3.client("bedrock-agent-runtime", region_name=AWS_REGION)
 VALID_LEVELS = {"easy", "normal", "hard"}
 MIN_CONF = 0.9
 
-# --- Lex Helper Functions ---
-
-def llm_reply(user_text: str, game_state: dict):
+# --- Recognizer ---
+
+def make_recognizer():
+    """
+    Pick the speech backend from BOT_RECOGNIZER:
+      lex     one recognize_utterance upload per utterance (default)
+      stream  stream to a recognition server while the user talks, Lex as fallback
+      local   on-device vosk for the game commands only, no network
+      hybrid  local first, Lex for anything outside the command grammar
+    """
+    prep = AudioPrep(samplerate=16000, target_rate=LEX_RATE) if AUDIO_PREP else None
+    lex_recognizer = LexRecognizer(lex, BOT_ID, BOT_ALIAS_ID, LOCALE_ID, SESSION_ID, prep=prep)
+    if RECOGNIZER in ("local", "hybrid"):
+        try:
+            local = LocalRecognizer(VOSK_MODEL)
+        except RuntimeError as e:
+            print(f"[Bot] Local recognizer unavailable ({e}), using Lex.")
+            return lex_recognizer
+        return local if RECOGNIZER == "local" else HybridRecognizer(local, lex_recognizer)
+    if RECOGNIZER == "stream":
+        host, _, port = STREAM_ADDR.rpartition(":")
+        return StreamingRecognizer(host or "127.0.0.1", int(port), session_id=SESSION_ID,
+                                   fallback=lex_recognizer)
+    return lex_recognizer
+
+def llm_reply(user_text: str, game_state: dict, cancel: threading.Event = None):
     prompt = f"""
 You are a sarcastic, slightly rude, playful AI companion inside a tower-defense game.
 
@@ -77,82 +112,18 @@ Reply with ONE short, snarky sentence.
             }
         ],
     }
+    check(cancel)
     response = bedrock.invoke_model(
         modelId="anthropic.claude-3-haiku-20240307-v1:0",  
         body=json.dumps(body),
     )
     resp_body = json.loads(response["body"].read())
+    check(cancel)  # the user talked over us while Bedrock was thinking
 
     return resp_body["content"][0]["text"].strip()
 
 
 
-def _decode_b64_gzip_json(s: str):
-    if not s:
-        return None
-    raw = base64.b64decode(s)
-    data = gzip.decompress(raw)
-    return json.loads(data.decode("utf-8"))
-
-
-def parse_lex_utterance_response(resp):
-    headers = resp.get("ResponseMetadata", {}).get("HTTPHeaders", {})
-
-    session_state = _decode_b64_gzip_json(headers.get("x-amz-lex-session-state")) or {}
-    intent_obj = session_state.get("intent", {}) or {}
-    intent_name = intent_obj.get("name", INTENT_FALLBACK)
-
-    interpretations = _decode_b64_gzip_json(headers.get("x-amz-lex-interpretations")) or []
-    confidence = None
-    if interpretations:
-        top = interpretations[0]
-        intent_name = top.get("intent", {}).get("name", intent_name) or intent_name
-        confidence = top.get("nluConfidence", {}).get("score")
-
-    raw_slots = intent_obj.get("slots", {}) or {}
-    slots = {}
-    for k, v in raw_slots.items():
-        if v and "value" in v and "interpretedValue" in v["value"]:
-            slots[k] = v["value"]["interpretedValue"]
-
-    input_transcript = None
-    if "x-amz-lex-input-transcript" in headers:
-        try:
-            input_transcript = (
-                gzip.decompress(base64.b64decode(headers["x-amz-lex-input-transcript"]))
-                .decode("utf-8")
-            )
-        except Exception:
-            input_transcript = None
-
-    return intent_name, confidence, slots, input_transcript
-
-
-def _call_lex_with_retry(audio_bytes: bytes, max_retries: int = 3):
-    delay = 0.3
-    last_exc = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            t0 = time.time()
-            resp = lex.recognize_utterance(
-                botId=BOT_ID,
-                botAliasId=BOT_ALIAS_ID,
-                localeId=LOCALE_ID,
-                sessionId=SESSION_ID,
-                requestContentType="audio/l16; rate=16000; channels=1",
-                responseContentType="text/plain; charset=utf-8",
-                inputStream=audio_bytes,
-            )
-            latency_ms = (time.time() - t0) * 1000.0
-            return resp, latency_ms
-        except (BotoCoreError, ClientError) as e:
-            last_exc = e
-            print(f"[Lex ERROR] attempt {attempt}/{max_retries}: {e}")
-            time.sleep(delay)
-            delay *= 2
-    raise last_exc
-
-
 def handle_intent(intent, slots):
     if intent == INTENT_DIFFICULTY:
         level = slots["level"]
@@ -177,123 +148,221 @@ def handle_intent(intent, slots):
     return action
 
 
+def recognize_stage(turn: Turn):
+    """Audio -> intent. On failure the turn goes on with only an apology to speak."""
+    try:
+        turn.result = _recognizer.recognize(turn.audio, turn.stream, cancel=turn.cancel)
+    except Cancelled:
+        raise
+    except Exception as e:
+        print(f"[{_recognizer.name.capitalize()} FATAL] Failed after retries: {e}")
+        log_interaction(
+            modality="voice",
+            input_transcript="",
+            intent=INTENT_FALLBACK,
+            confidence=None,
+            slots={},
+            action="lex_error",
+            success=False,
+            latency_ms=0.0,
+        )
+        turn.reply = "I had a problem talking to the server. Please try again in a moment."
+        return turn
+
+    result = turn.result
+    print(f"[{result.backend.capitalize()}] transcript={result.transcript!r}, intent={result.intent}, "
+          f"conf={result.confidence}, slots={result.slots}")
+    if result.transcript is None or result.transcript.strip().strip('"') == "":
+        print(f"[{result.backend.capitalize()}] Empty transcript, ignoring this utterance.")
+        return None
+    return turn
+
+
+def act_stage(turn: Turn):
+    """Intent -> game state change and reply text (state API, Bedrock for chit-chat)."""
+    if turn.result is None:
+        return turn
+    result = turn.result
+    intent_name, confidence, slots, transcript = result.intent, result.confidence, result.slots, result.transcript
+
+    MIN_CONF = 0.6
+    final_intent = intent_name
+    final_slots = dict(slots)
+
+    if intent_name == INTENT_DIFFICULTY:
+        lvl = slots.get("level")
+        if lvl not in VALID_LEVELS or (confidence is not None and confidence < MIN_CONF):
+            final_intent = INTENT_FALLBACK
+            final_slots = {}
+    elif intent_name == INTENT_VOLUME:
+        pct = slots.get("percent")
+        try:
+            pct_int = int(pct) if pct is not None else None
+        except ValueError:
+            pct_int = None
+        if (
+            pct_int is None
+            or pct_int < 0
+            or pct_int > 100
+            or (confidence is not None and confidence < MIN_CONF)
+        ):
+            final_intent = INTENT_FALLBACK
+            final_slots = {}
+        else:
+            final_slots["percent"] = pct_int
+    elif intent_name == INTENT_RULES:
+        pass
+    elif intent_name == INTENT_FALLBACK:
+        state = get_state() or {}
+
+        text = (transcript or "").strip().strip('"')
+        if len(text) <= 6 and " " not in text:
+            turn.reply = f'"{text}" huh? That''s all you''ve got?'
+            print(f"[LocalFallback] {turn.reply}")
+            return turn
+
+        try:
+            turn.reply = llm_reply(transcript, state, cancel=turn.cancel)
+            print(f"[Agent] {turn.reply}")
+        except Cancelled:
+            raise
+        except Exception as e:
+            print(f"[Agent ERROR] {e}")
+            turn.reply = "I have no idea what you just said, but it sounded questionable."
+        return turn
+
+    check(turn.cancel)
+    try:
+        action = handle_intent(final_intent, final_slots)
+        success = True
+    except Exception as e:
+        print(f"[Game ERROR] Failed to handle intent {final_intent}: {e}")
+        action = f"game_error:{final_intent}"
+        success = False
+
+    log_interaction(
+        modality="voice",
+        input_transcript=transcript or "",
+        intent=final_intent,
+        confidence=confidence if confidence is not None else 0.0,
+        slots=final_slots,
+        action=action,
+        success=success,
+        latency_ms=result.latency_ms,
+    )
+
+    turn.reply = format_reply(final_intent, final_slots)
+    return turn
+
+
+def speak_stage(turn: Turn):
+    turn.stamps["speak_start"] = time.time()
+    speak(turn.reply, cancel=turn.cancel)
+    check(turn.cancel)
+    return turn
+
+
+_pipeline = None
+_recognizer = None
+_status = None
+_status_lock = threading.Lock()
+
+
+def _update_status(pipeline: Pipeline):
+    """Chat bubble follows the furthest-along busy stage."""
+    global _status
+    if pipeline.is_busy("speak"):
+        status = "speak"
+    elif pipeline.is_busy("recognize") or pipeline.is_busy("act"):
+        status = "think"
+    else:
+        status = "listen"
+    with _status_lock:
+        if status == _status:
+            return
+        _status = status
+    set_chat_status(status)
+
+
+def _on_barge_in():
+    """Audio thread: the user started talking over us. Stop the reply and
+    everything queued behind it; their new utterance follows on its own."""
+    cancelled = _pipeline.cancel_all() if _pipeline is not None else 0
+    print(f"[Bot] Barge-in, cancelled {cancelled} pending turn(s).")
+
+
+def announce(text: str) -> bool:
+    """Queue a spontaneous line for the speak stage; False if it was dropped."""
+    if _pipeline is None:
+        return False
+    return _pipeline.submit(Turn("announce", reply=text), "speak", block=False)
+
+
 def main():
+    global _pipeline, _recognizer
     print("=== Pi Voice Chatbot===")
-    print("Speak when I'm listening; after my reply, I'll listen again. Ctrl+C to exit.\n")
-
-    while True:
-        set_chat_status("listen")
-        audio_bytes = record_one_utterance_vad(
+    print("Speak any time; I keep listening while I think and talk. Ctrl+C to exit.\n")
+
+    # one microphone stream for the whole session, with pre-roll; the
+    # adaptive VAD keeps BGM and crowd noise from reaching Lex, and anything
+    # heard while our own TTS is playing is dropped as self-echo, unless it
+    # is clearly louder than the echo (barge-in)
+    _recognizer = make_recognizer()
+    print(f"[Bot] Recognizer: {_recognizer.name}")
+    capture = CaptureService(
+        samplerate=16000,
+        block_size=1024,
+        max_speech_ms=6000,
+        silence_ms=600,
+        preroll_ms=300,
+        endpointer=AdaptiveEndpointer(
             samplerate=16000,
             block_size=1024,
-            energy_threshold=50.0,   
             max_speech_ms=6000,
             silence_ms=600,
-        )
-        if not audio_bytes:
-            continue
-
-        duration_sec = len(audio_bytes) / (2 * 16000)  # int16 (2 bytes), 16kHz
-        if duration_sec < 0.5:
-            print(f"[VAD] Too short ({duration_sec:.2f}s), ignoring.")
-            continue
-
-        set_chat_status("think")
+        ),
+        echo_gate=lambda: is_playing(ECHO_TAIL_SEC),
+        sink=_recognizer if _recognizer.streaming else None,
+        barge_in_db=float(BARGE_IN_DB) if BARGE_IN_DB else None,
+        on_barge_in=_on_barge_in,
+    )
 
-        try:
-            resp, latency_ms = _call_lex_with_retry(audio_bytes)
-        except Exception as e:
-            print(f"[Lex FATAL] Failed after retries: {e}")
-            speak("I had a problem talking to the server. Please try again in a moment.")
-            log_interaction(
-                modality="voice",
-                input_transcript="",
-                intent=INTENT_FALLBACK,
-                confidence=None,
-                slots={},
-                action="lex_error",
-                success=False,
-                latency_ms=0.0,
-            )
-            continue
-
-        intent_name, confidence, slots, transcript = parse_lex_utterance_response(resp)
-        print(f"[Lex] transcript={transcript!r}, intent={intent_name}, conf={confidence}, slots={slots}")
-
-        if transcript is None or transcript.strip().strip('"') == "":
-            print("[Lex] Empty transcript, ignoring this utterance.")
-            continue
-
-        MIN_CONF = 0.6
-        final_intent = intent_name
-        final_slots = dict(slots)
-
-        if intent_name == INTENT_DIFFICULTY:
-            lvl = slots.get("level")
-            if lvl not in VALID_LEVELS or (confidence is not None and confidence < MIN_CONF):
-                final_intent = INTENT_FALLBACK
-                final_slots = {}
-        elif intent_name == INTENT_VOLUME:
-            pct = slots.get("percent")
-            try:
-                pct_int = int(pct) if pct is not None else None
-            except ValueError:
-                pct_int = None
-            if (
-                pct_int is None
-                or pct_int < 0
-                or pct_int > 100
-                or (confidence is not None and confidence < MIN_CONF)
-            ):
-                final_intent = INTENT_FALLBACK
-                final_slots = {}
-            else:
-                final_slots["percent"] = pct_int
-        elif intent_name == INTENT_RULES:
-            pass
-        elif intent_name == INTENT_FALLBACK:
-            state = get_state() or {}
-
-            text = (transcript or "").strip().strip('"')
-            if len(text) <= 6 and " " not in text:
-                reply = f'"{text}" huh? That''s all you''ve got?'
-                print(f"[LocalFallback] {reply}")
-                speak(reply)
+    # capture -> recognize -> act -> speak, one worker each; full queues
+    # block the stage upstream, and capture itself drops its oldest
+    # utterance when the main loop can't hand them on
+    _pipeline = (Pipeline(on_activity=_update_status)
+                 .add_stage("recognize", recognize_stage, maxsize=1)
+                 .add_stage("act", act_stage, maxsize=1)
+                 .add_stage("speak", speak_stage, maxsize=SPEAK_QUEUE))
+    _pipeline.start()
+    _update_status(_pipeline)
+
+    capture.start()
+    capture.set_listening(True)
+    reported = 0
+    try:
+        while True:
+            audio_bytes, stream = capture.get_utterance(timeout=1.0)
+            if _pipeline.turns >= reported + PIPELINE_REPORT_EVERY:
+                reported = _pipeline.turns
+                print(_pipeline.report())
+            if not audio_bytes:
                 continue
 
-            try:
-                agent_reply = llm_reply(transcript, state)
-                print(f"[Agent] {agent_reply}")
-                speak(agent_reply)
-            except Exception as e:
-                print(f"[Agent ERROR] {e}")
-                speak("I have no idea what you just said, but it sounded questionable.")
-            continue
-    
-        try:
-            action = handle_intent(final_intent, final_slots)
-            success = True
-        except Exception as e:
-            print(f"[Game ERROR] Failed to handle intent {final_intent}: {e}")
-            action = f"game_error:{final_intent}"
-            success = False
-
-        log_interaction(
-            modality="voice",
-            input_transcript=transcript or "",
-            intent=final_intent,
-            confidence=confidence if confidence is not None else 0.0,
-            slots=final_slots,
-            action=action,
-            success=success,
-            latency_ms=latency_ms,
-        )
+            duration_sec = len(audio_bytes) / (2 * 16000)  # int16 (2 bytes), 16kHz
+            if duration_sec < 0.5:
+                print(f"[VAD] Too short ({duration_sec:.2f}s), ignoring.")
+                continue
 
-        reply = format_reply(final_intent, final_slots)
-        set_chat_status("speak")
-        speak(reply)
-        set_chat_status(None)
-        time.sleep(0.2)
+            # blocks while recognize is full: backpressure onto capture
+            _pipeline.submit(Turn("voice", audio_bytes, stream))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.stop()
+        print(_pipeline.report())
+        print(f"capture    dropped {capture.dropped}, echo rejected {capture.echo_rejected}, "
+              f"barge-ins {capture.barge_ins}")
 
 
 menu_speaked = False
@@ -330,35 +399,20 @@ def trigger_loop(interval: float = 3.0):
                 last_stage = stage
 
             if stage == 'menu' and menu_speaked is False:
-                set_chat_status("speak")
-                speak("Aha! Welcome to the game! What can I help you?")
-                set_chat_status(None)
-                menu_speaked = True
+                menu_speaked = announce("Aha! Welcome to the game! What can I help you?")
 
             if stage == 'playing':
                 if state['player_hp'] == 2 and not hp2_speaked:
-                    set_chat_status("speak")
-                    speak("Uh-oh, your HP's looking kinda tragic… maybe try not getting hit?")
-                    set_chat_status(None)
-                    hp2_speaked = True
+                    hp2_speaked = announce("Uh-oh, your HP's looking kinda tragic… maybe try not getting hit?")
             
                 if state['player_hp'] <= 0 and not dead_speaked:
-                    set_chat_status("speak")
-                    speak("Wow. Impressive. You managed to die again. Shall we try that one more time?")
-                    set_chat_status(None)
-                    dead_speaked = True
+                    dead_speaked = announce("Wow. Impressive. You managed to die again. Shall we try that one more time?")
 
                 if state['remaining_enemies'] <= 5 and not few_enemy_speaked:
-                    set_chat_status("speak")
-                    speak("Only a few enemies left. Don't choke now—I'm watching.")
-                    set_chat_status(None)
-                    few_enemy_speaked = True
+                    few_enemy_speaked = announce("Only a few enemies left. Don't choke now—I'm watching.")
 
             if stage == 'game_over' and gameover_speaked is False:
-                set_chat_status("speak")
-                speak("Aha! You dead now!")
-                set_chat_status(None)
-                gameover_speaked = True
+                gameover_speaked = announce("Aha! You dead now!")
 
         except Exception as e:
             print(f"[Trigger] error during periodic task: {e}")
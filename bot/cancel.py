@@ -0,0 +1,13 @@
+import threading
+from typing import Optional
+
+
+class Cancelled(Exception):
+    """The turn's cancel token fired (the user talked over the bot)."""
+
+
+def check(cancel: Optional[threading.Event]):
+    """Raise Cancelled if `cancel` is set. Called around every network call,
+    since botocore requests themselves can't be interrupted."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
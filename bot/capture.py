@@ -0,0 +1,238 @@
+import math
+import queue
+import threading
+from typing import Callable, Optional, Tuple
+
+import sounddevice as sd
+
+from .audio_ring import AudioRing
+from .audio_vad import Endpointer
+
+
+class CaptureService:
+    """
+    Keeps one microphone stream open for the life of the bot.
+
+    The stream writes continuously into a ring buffer, so when speech starts
+    the last `preroll_ms` of audio is already there and the first word is not
+    clipped. Finished utterances (16-bit PCM bytes) are put on a small queue
+    for bot.main; while the bot is thinking or speaking, listening is switched
+    off and onsets are ignored, but the stream (and the pre-roll) keeps running.
+
+    Endpointing runs inside the audio callback on sample counts; the moment
+    an utterance ends it is copied out and queued, which wakes get().
+
+    `echo_gate` is polled once per block and should return True while the
+    bot's own audio may be reaching the microphone. An utterance that
+    overlaps such a block is assumed to be self-capture and dropped, and
+    counted in `echo_rejected`.
+
+    A streaming recognizer can be attached as `sink`: it is handed the
+    pre-roll and every block of an utterance as it is captured (see
+    bot.recognizer.Recognizer), and its stream handle is queued along with
+    the finished audio.
+
+    With `barge_in_db` set, loud speech during playback is told apart from
+    the echo: the mic level is tracked against a decaying peak of the echo
+    heard so far, and `barge_in_blocks` blocks (default one) that beat it
+    by `barge_in_db` start a fresh utterance at that point (exempt from the
+    echo gate) and call `on_barge_in()` from the audio thread, which must
+    only signal, not block. Each reply starts from the loudest echo of the
+    previous one, so barge-in works from its first block; only the very
+    first reply spends ECHO_LEARN_BLOCKS learning the echo instead.
+    """
+
+    ECHO_LEARN_BLOCKS = 4
+
+    def __init__(
+        self,
+        samplerate: int = 16000,
+        block_size: int = 1024,
+        energy_threshold: float = 50.0,
+        min_speech_ms: int = 300,
+        max_speech_ms: int = 6000,
+        silence_ms: int = 600,
+        preroll_ms: int = 300,
+        max_pending: int = 2,
+        endpointer: Optional[Endpointer] = None,
+        echo_gate: Optional[Callable[[], bool]] = None,
+        sink=None,
+        barge_in_db: Optional[float] = None,
+        barge_in_blocks: int = 1,
+        on_barge_in: Optional[Callable[[], None]] = None,
+    ):
+        self.samplerate = samplerate
+        self.block_size = block_size
+        self.preroll = int(samplerate * preroll_ms / 1000)
+
+        self.ring = AudioRing(self.preroll + samplerate * max_speech_ms // 1000 + 2 * block_size)
+        self.endpointer = endpointer or Endpointer(samplerate, energy_threshold, min_speech_ms,
+                                                   max_speech_ms, silence_ms, block_size)
+        self.utterances: "queue.Queue[Tuple[bytes, object]]" = queue.Queue(maxsize=max_pending)
+        self.listening = threading.Event()
+        self.dropped = 0
+        self.echo_gate = echo_gate
+        self.echo_rejected = 0
+        self._echo_overlap = False
+        self.sink = sink
+        self._sink_stream = None
+        self.barge_in_db = barge_in_db
+        self.barge_in_blocks = barge_in_blocks
+        self.on_barge_in = on_barge_in
+        self.barge_ins = 0
+        self._barged = False         # current utterance was opened by a barge-in
+        self._barge_run = 0
+        self._barge_start = 0
+        self._echo_db = None         # decaying peak of our own playback at the mic
+        self._echo_peak = None       # loudest echo of the current reply, seeds the next
+        self._echo_blocks = 0        # blocks spent learning the echo (first reply only)
+        self._was_playing = False
+        self._lead = self.preroll    # audio kept before the current utterance's start
+        self._stream = None
+
+    # ---- lifecycle
+    def start(self):
+        self._stream = sd.InputStream(
+            samplerate=self.samplerate,
+            channels=1,
+            dtype="int16",
+            blocksize=self.block_size,
+            callback=self._callback,
+        )
+        self._stream.start()
+        print(f"[Capture] Microphone open ({self.samplerate} Hz, pre-roll {self.preroll / self.samplerate * 1000:.0f} ms).")
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    # ---- consumer side
+    def set_listening(self, on: bool):
+        """Accept new utterances (True) or ignore speech onsets (False)."""
+        if on:
+            self.listening.set()
+        else:
+            self.listening.clear()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Next finished utterance, or None on timeout."""
+        return self.get_utterance(timeout)[0]
+
+    def get_utterance(self, timeout: Optional[float] = None) -> Tuple[Optional[bytes], object]:
+        """Next finished utterance and its sink stream handle, or (None, None) on timeout."""
+        try:
+            return self.utterances.get(timeout=timeout)
+        except queue.Empty:
+            return None, None
+
+    # ---- audio thread
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            print(f"[Capture] Input status: {status}")
+        block = indata[:, 0]
+        pos = self.ring.written
+        self.ring.write(block)
+        playing = self.echo_gate is not None and self.echo_gate()
+        if playing and not self._was_playing and self._echo_peak is not None:
+            # a new reply: start from the last reply's loudest echo rather
+            # than wherever the decay left off during its tail; a quieter
+            # reply decays it again within a second or so
+            self._echo_db = self._echo_peak
+            self._echo_peak = None
+        self._was_playing = playing
+        ep = self.endpointer
+        if not ep.speaking and not self.listening.is_set():
+            return
+        if not playing:
+            self._barge_run = 0
+        if playing and not self._barged and self._barge_in(block, pos):
+            # the user is talking over us: drop whatever the echo opened and
+            # start their utterance where the loud run began
+            if self._sink_stream is not None:
+                self.sink.abort(self._sink_stream)
+                self._sink_stream = None
+            ep.begin_at(self._barge_start, pos + block.shape[0])
+            event = "start"
+            self._barged = True
+            self._lead = self.block_size
+            self.barge_ins += 1
+            if self.on_barge_in is not None:
+                self.on_barge_in()
+        else:
+            event = ep.update(block, pos)
+            if event == "start":
+                self._lead = self.preroll
+        if event == "start":
+            self._echo_overlap = False
+        if (ep.speaking or event == "end") and playing and not self._barged:
+            self._echo_overlap = True
+        if self.sink is not None:
+            self._feed_sink(event, block, pos)
+        if event == "end":
+            stream, self._sink_stream = self._sink_stream, None
+            self._barged = False
+            if self._echo_overlap:
+                self._echo_overlap = False
+                self.echo_rejected += 1
+                print(f"[Capture] Dropped utterance overlapping bot playback "
+                      f"({self.echo_rejected} so far).")
+                if stream is not None:
+                    self.sink.abort(stream)
+                return
+            if stream is not None:
+                self.sink.end(stream)
+            # copy out before the ring wraps over it; this is the only
+            # copy between the microphone and the Lex upload
+            self._publish(bytes(self.ring.view(ep.start - self._lead, ep.end)), ep.reason, stream)
+
+    def _barge_in(self, block, pos) -> bool:
+        """True once the mic has been well above the playback echo for long enough."""
+        if self.barge_in_db is None:
+            return False
+        level = 20.0 * math.log10(max(self.endpointer.rms(block), 1.0))
+        if self._echo_blocks < self.ECHO_LEARN_BLOCKS:
+            # first reply: no earlier echo to go by, learn how loud our own
+            # voice is at the mic
+            self._echo_db = level if self._echo_db is None else max(level, self._echo_db - 0.5)
+            self._echo_peak = self._echo_db
+            self._echo_blocks += 1
+            return False
+        if level > self._echo_db + self.barge_in_db:
+            if self._barge_run == 0:
+                self._barge_start = pos
+            self._barge_run += 1
+            if self._barge_run >= self.barge_in_blocks:
+                self._barge_run = 0
+                return True
+            return False
+        self._barge_run = 0
+        self._echo_db = max(level, self._echo_db - 0.5)
+        self._echo_peak = level if self._echo_peak is None else max(level, self._echo_peak)
+        return False
+
+    def _feed_sink(self, event, block, pos):
+        try:
+            if event == "start":
+                end = pos + block.shape[0]
+                self._sink_stream = self.sink.begin(bytes(self.ring.view(self.endpointer.start - self._lead, end)))
+            elif self._sink_stream is not None:
+                self.sink.feed(self._sink_stream, block.tobytes())
+        except Exception as e:
+            print(f"[Capture] Streaming sink failed: {e}")
+            self._sink_stream = None
+
+    def _publish(self, pcm: bytes, reason: str, stream=None):
+        duration = len(pcm) / (2 * self.samplerate)
+        print(f"[Capture] Captured {duration:.2f}s audio ({reason}).")
+        try:
+            self.utterances.put_nowait((pcm, stream))
+        except queue.Full:
+            # the bot is behind; the oldest unheard utterance is the least useful
+            try:
+                self.utterances.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self.utterances.put_nowait((pcm, stream))
@@ -0,0 +1,239 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .persona import (
+    INTENT_DIFFICULTY,
+    INTENT_VOLUME,
+    INTENT_FALLBACK,
+    INTENT_PAUSE,
+    INTENT_RESUME,
+)
+from .cancel import check
+from .recognizer import Recognizer, RecognitionResult
+
+try:
+    import vosk
+    vosk.SetLogLevel(-1)
+except ImportError:
+    vosk = None
+
+
+# --- command grammar -------------------------------------------------------
+
+UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+LEVELS = {"easy": "easy", "normal": "normal", "medium": "normal", "hard": "hard"}
+
+# phrases for the constrained decoder; parse_command() accepts more than this
+GRAMMAR = [
+    "set difficulty to easy", "set difficulty to normal", "set difficulty to hard",
+    "easy mode", "normal mode", "medium mode", "hard mode", "make it easy", "make it hard",
+    "set volume to", "volume", "percent", "mute", "full volume",
+    "pause", "pause the game", "stop the game",
+    "resume", "resume the game", "unpause", "continue", "keep going",
+    "one hundred",
+] + list(UNITS) + list(TENS)
+
+
+def parse_number(words) -> Optional[int]:
+    """First number in a word list: digits ("40"), or words up to "one hundred"."""
+    value = None
+    for w in words:
+        if w.isdigit():
+            return int(w)
+        if w in TENS:
+            if value is not None:
+                break
+            value = TENS[w]
+        elif w in UNITS:
+            if value is None:
+                value = UNITS[w]
+            elif value % 10 == 0 and value >= 20 and UNITS[w] < 10:
+                value += UNITS[w]
+            else:
+                break
+        elif w == "hundred":
+            value = (value or 1) * 100
+            break
+        elif value is not None:
+            break
+    return value
+
+
+def parse_command(text: str) -> Optional[Tuple[str, Dict]]:
+    """
+    Map a transcript onto one of the fixed game commands, or None if it is
+    out of grammar (to be left to Lex / the LLM).
+    """
+    words = re.sub(r"[^a-z0-9 ]", " ", (text or "").lower().replace("[unk]", " ")).split()
+    if not words:
+        return None
+    joined = " ".join(words)
+
+    if "unpause" in words or "resume" in words or "continue" in words or "keep going" in joined:
+        return INTENT_RESUME, {}
+    if "pause" in words or "stop the game" in joined:
+        return INTENT_PAUSE, {}
+
+    if "mute" in words:
+        return INTENT_VOLUME, {"percent": 0}
+    if "volume" in words:
+        if "full" in words or "max" in words:
+            return INTENT_VOLUME, {"percent": 100}
+        pct = parse_number(words[words.index("volume") + 1:])
+        if pct is None:
+            pct = parse_number(words)
+        if pct is not None and 0 <= pct <= 100:
+            return INTENT_VOLUME, {"percent": pct}
+        return None
+
+    level = next((LEVELS[w] for w in words if w in LEVELS), None)
+    if level and ("difficulty" in words or "mode" in words or "level" in words
+                  or "make it" in joined or len(words) == 1):
+        return INTENT_DIFFICULTY, {"level": level}
+    return None
+
+
+# --- recognizer ------------------------------------------------------------
+
+class _LocalStream:
+    def __init__(self):
+        self.chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self.done = threading.Event()
+        self.ended_at = 0.0
+        self.text = ""
+        self.confidence = None
+        self.aborted = False
+
+
+class LocalRecognizer(Recognizer):
+    """
+    On-device recognizer for the fixed game commands (vosk, optional).
+
+    The decoder is constrained to GRAMMAR plus "[unk]", which keeps a small
+    model fast and accurate on these phrases. It runs as a capture sink:
+    each utterance is decoded on its own thread while it is spoken, so
+    only the final flush is left after the endpoint. Anything that doesn't
+    parse as a command comes back as FallbackIntent with its transcript.
+    """
+
+    name = "local"
+    streaming = True
+
+    def __init__(self, model_path: str, samplerate: int = 16000, min_confidence: float = 0.6):
+        if vosk is None:
+            raise RuntimeError("vosk is not installed (pip install vosk)")
+        if not os.path.isdir(model_path):
+            raise RuntimeError(f"vosk model not found at {model_path}")
+        self.model = vosk.Model(model_path)
+        self.samplerate = samplerate
+        self.min_confidence = min_confidence
+        self.grammar = json.dumps(GRAMMAR + ["[unk]"])
+
+    def begin(self, pcm: bytes):
+        stream = _LocalStream()
+        stream.chunks.put(pcm)
+        threading.Thread(target=self._decode, args=(stream,), daemon=True).start()
+        return stream
+
+    def feed(self, stream, pcm: bytes):
+        stream.chunks.put(pcm)
+
+    def end(self, stream):
+        stream.ended_at = time.time()
+        stream.chunks.put(None)
+
+    def abort(self, stream):
+        stream.aborted = True
+        stream.chunks.put(None)
+
+    def _decode(self, stream: _LocalStream):
+        try:
+            rec = vosk.KaldiRecognizer(self.model, self.samplerate, self.grammar)
+            rec.SetWords(True)
+            while True:
+                chunk = stream.chunks.get()
+                if chunk is None:
+                    break
+                rec.AcceptWaveform(chunk)
+            if stream.aborted:
+                return
+            result = json.loads(rec.FinalResult())
+            stream.text = result.get("text", "")
+            words = result.get("result") or []
+            if words:
+                stream.confidence = sum(w.get("conf", 0.0) for w in words) / len(words)
+        except Exception as e:
+            print(f"[Local ERROR] {e}")
+        finally:
+            stream.done.set()
+
+    def recognize(self, pcm: bytes, stream=None,
+                  cancel: Optional[threading.Event] = None) -> RecognitionResult:
+        check(cancel)
+        if stream is None:
+            # not streamed (e.g. sink failed): decode the whole utterance now
+            stream = _LocalStream()
+            stream.chunks.put(pcm)
+            stream.chunks.put(None)
+            stream.ended_at = time.time()
+            self._decode(stream)
+        while not stream.done.wait(0.01):
+            check(cancel)
+        latency_ms = (time.time() - stream.ended_at) * 1000.0
+
+        text = stream.text.replace("[unk]", "").strip()
+        parsed = parse_command(text)
+        if parsed is None or (stream.confidence is not None and stream.confidence < self.min_confidence):
+            return RecognitionResult(INTENT_FALLBACK, stream.confidence, {}, text, latency_ms, self.name)
+        intent, slots = parsed
+        return RecognitionResult(intent, stream.confidence, slots, text, latency_ms, self.name)
+
+
+class HybridRecognizer(Recognizer):
+    """
+    Local commands first; only speech the local grammar can't place goes
+    to the remote backend (Lex), which gets the finished audio.
+    """
+
+    name = "hybrid"
+
+    def __init__(self, local: Recognizer, remote: Recognizer):
+        self.local = local
+        self.remote = remote
+        self.streaming = local.streaming
+
+    def begin(self, pcm: bytes):
+        return self.local.begin(pcm)
+
+    def feed(self, stream, pcm: bytes):
+        self.local.feed(stream, pcm)
+
+    def end(self, stream):
+        self.local.end(stream)
+
+    def abort(self, stream):
+        self.local.abort(stream)
+
+    def recognize(self, pcm: bytes, stream=None,
+                  cancel: Optional[threading.Event] = None) -> RecognitionResult:
+        result = self.local.recognize(pcm, stream, cancel)
+        if result.intent != INTENT_FALLBACK:
+            return result
+        print(f"[Hybrid] {result.transcript!r} is out of grammar ({result.latency_ms:.0f} ms), asking {self.remote.name}")
+        remote = self.remote.recognize(pcm, cancel=cancel)
+        remote.latency_ms += result.latency_ms
+        return remote
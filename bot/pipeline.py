@@ -0,0 +1,203 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from .cancel import Cancelled
+
+
+class Turn:
+    """One unit of work flowing through the pipeline (an utterance or an announcement)."""
+
+    def __init__(self, kind: str = "voice", audio: Optional[bytes] = None, stream=None,
+                 reply: Optional[str] = None):
+        self.kind = kind
+        self.audio = audio
+        self.stream = stream
+        self.result = None
+        self.reply = reply
+        self.created = time.time()      # end of speech for voice turns
+        self.stamps: Dict[str, float] = {}
+        self.cancel = threading.Event()
+
+
+class StageStats:
+    """Queue-wait and run-time histograms (10 ms buckets) for one stage."""
+
+    BUCKETS = 1000     # 10 s; the last bucket catches everything slower
+
+    def __init__(self):
+        self.wait = [0] * self.BUCKETS
+        self.run = [0] * self.BUCKETS
+        self.worst_wait = 0.0
+        self.worst_run = 0.0
+        self.count = 0
+
+    def add(self, wait_ms: float, run_ms: float):
+        self.wait[min(int(wait_ms / 10), self.BUCKETS - 1)] += 1
+        self.run[min(int(run_ms / 10), self.BUCKETS - 1)] += 1
+        self.worst_wait = max(self.worst_wait, wait_ms)
+        self.worst_run = max(self.worst_run, run_ms)
+        self.count += 1
+
+
+def _percentile(hist: List[int], q: float) -> int:
+    target = q * sum(hist)
+    seen = 0
+    for bucket, n in enumerate(hist):
+        seen += n
+        if seen >= target and n:
+            return bucket * 10
+    return 0
+
+
+class _Stage:
+    def __init__(self, name: str, fn: Callable, maxsize: int):
+        self.name = name
+        self.fn = fn
+        self.inbox: "queue.Queue[Turn]" = queue.Queue(maxsize=maxsize)
+        self.next: Optional["_Stage"] = None
+        self.busy = False
+        self.stats = StageStats()
+
+
+class Pipeline:
+    """
+    A chain of single-worker stages joined by bounded queues.
+
+    Each stage function takes a Turn and returns it (passed on to the next
+    stage) or None (the turn ends there). One worker per stage keeps turns
+    in order, which the Lex session needs. Backpressure is explicit: a full
+    inbox blocks the stage before it, so a slow stage throttles the one
+    upstream instead of piling up work; submit(block=False) refuses instead
+    and counts the drop.
+
+    `on_activity` is called whenever a stage starts or finishes a turn,
+    so the caller can derive a status ("listen" / "think" / "speak").
+
+    Every turn carries a `cancel` Event for the stage functions to pass
+    down; cancel_all() sets it on everything in flight, and cancelled turns
+    are skipped by the stages that haven't reached them yet.
+    """
+
+    def __init__(self, on_activity: Optional[Callable[["Pipeline"], None]] = None):
+        self.stages: List[_Stage] = []
+        self.by_name: Dict[str, _Stage] = {}
+        self.on_activity = on_activity
+        self.lock = threading.Lock()
+        self.turns = 0
+        self.dropped: Dict[str, int] = {}
+        self.cancelled = 0
+        self.inflight: Set[Turn] = set()
+        self.total = StageStats()        # end of speech -> reply starts playing
+
+    def add_stage(self, name: str, fn: Callable[[Turn], Optional[Turn]], maxsize: int = 2):
+        stage = _Stage(name, fn, maxsize)
+        if self.stages:
+            self.stages[-1].next = stage
+        self.stages.append(stage)
+        self.by_name[name] = stage
+        return self
+
+    def start(self):
+        for stage in self.stages:
+            threading.Thread(target=self._run, args=(stage,), name=f"pipeline-{stage.name}",
+                             daemon=True).start()
+
+    def submit(self, turn: Turn, stage: Optional[str] = None, block: bool = True) -> bool:
+        """Queue a turn at the first stage (or the named one). False if dropped."""
+        target = self.by_name[stage] if stage else self.stages[0]
+        turn.stamps[target.name + "_in"] = time.time()
+        with self.lock:
+            self.inflight.add(turn)
+        try:
+            target.inbox.put(turn, block=block)
+            return True
+        except queue.Full:
+            with self.lock:
+                self.inflight.discard(turn)
+                self.dropped[target.name] = self.dropped.get(target.name, 0) + 1
+            print(f"[Pipeline] {target.name} is full, dropped a turn ({turn.kind}).")
+            return False
+
+    def cancel_all(self) -> int:
+        """Cancel every queued and running turn; returns how many. Safe to
+        call from the audio callback (it only sets events)."""
+        with self.lock:
+            turns = list(self.inflight)
+        for turn in turns:
+            turn.cancel.set()
+        return len(turns)
+
+    def is_busy(self, name: str) -> bool:
+        """True while the stage is running a turn or has turns waiting."""
+        stage = self.by_name[name]
+        return stage.busy or not stage.inbox.empty()
+
+    def _run(self, stage: _Stage):
+        while True:
+            turn = stage.inbox.get()
+            start = time.time()
+            stage.busy = True
+            self._activity()
+            try:
+                if turn.cancel.is_set():
+                    raise Cancelled()
+                out = stage.fn(turn)
+            except Cancelled:
+                with self.lock:
+                    self.cancelled += 1
+                print(f"[Pipeline] {stage.name}: {turn.kind} turn cancelled.")
+                out = None
+            except Exception as e:
+                print(f"[Pipeline] {stage.name} failed: {e}")
+                out = None
+            done = time.time()
+            wait_ms = (start - turn.stamps.get(stage.name + "_in", start)) * 1000.0
+            with self.lock:
+                stage.stats.add(wait_ms, (done - start) * 1000.0)
+            if out is not None and stage.next is not None:
+                # blocks while the next stage is full: backpressure
+                self.submit(out, stage.next.name)
+            else:
+                with self.lock:
+                    self.inflight.discard(turn)
+                if out is not None:
+                    self._finished(turn)
+            stage.busy = False
+            self._activity()
+
+    def _finished(self, turn: Turn):
+        if turn.kind != "voice" or "speak_start" not in turn.stamps:
+            return
+        with self.lock:
+            self.turns += 1
+            ms = (turn.stamps["speak_start"] - turn.created) * 1000.0
+            self.total.add(0.0, ms)
+
+    def _activity(self):
+        if self.on_activity is not None:
+            try:
+                self.on_activity(self)
+            except Exception as e:
+                print(f"[Pipeline] activity callback failed: {e}")
+
+    def report(self) -> str:
+        with self.lock:
+            lines = [f"=== Voice pipeline ({self.turns} turns) ==="]
+            for stage in self.stages:
+                s = stage.stats
+                if not s.count:
+                    continue
+                lines.append(f"{stage.name:<10} n {s.count:<5} wait p50 {_percentile(s.wait, 0.5)} ms "
+                             f"p95 {_percentile(s.wait, 0.95)} ms max {s.worst_wait:.0f} ms | "
+                             f"run p50 {_percentile(s.run, 0.5)} ms p95 {_percentile(s.run, 0.95)} ms "
+                             f"max {s.worst_run:.0f} ms")
+            if self.total.count:
+                lines.append(f"{'reply':<10} end of speech -> reply playing: p50 {_percentile(self.total.run, 0.5)} ms "
+                             f"p95 {_percentile(self.total.run, 0.95)} ms max {self.total.worst_run:.0f} ms")
+            if self.dropped:
+                lines.append("dropped    " + ", ".join(f"{k} {v}" for k, v in sorted(self.dropped.items())))
+            if self.cancelled:
+                lines.append(f"cancelled  {self.cancelled} (barge-in)")
+        return "\n".join(lines)
@@ -0,0 +1,282 @@
+import base64
+import gzip
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from .audio_prep import AudioPrep, CONTENT_TYPES
+from .cancel import check
+from .persona import INTENT_FALLBACK
+
+
+class RecognitionResult:
+    """What a recognizer made of one utterance."""
+
+    def __init__(self, intent: str, confidence: Optional[float], slots: Dict[str, str],
+                 transcript: Optional[str], latency_ms: float, backend: str):
+        self.intent = intent
+        self.confidence = confidence
+        self.slots = slots
+        self.transcript = transcript
+        self.latency_ms = latency_ms      # from the end of the utterance to the result
+        self.backend = backend
+
+
+class Recognizer(ABC):
+    """
+    Speech-to-intent backend used by bot.main.
+
+    Batch backends only implement recognize(), which is abstract: a backend
+    without it fails when it is created, not on the first utterance.
+    Streaming backends set `streaming` and are attached to the
+    CaptureService as its sink: begin() is called from the audio thread
+    when speech starts (with the pre-roll), feed() with every following
+    block, then end() or abort(). None of these may block. begin() returns a handle that comes back out of
+    CaptureService.get_utterance() together with the audio and is passed
+    to recognize().
+
+    recognize() takes the turn's `cancel` token and raises
+    bot.cancel.Cancelled once it is set instead of returning a result.
+    """
+
+    name = "none"
+    streaming = False
+
+    def begin(self, pcm: bytes):
+        return None
+
+    def feed(self, stream, pcm: bytes):
+        pass
+
+    def end(self, stream):
+        pass
+
+    def abort(self, stream):
+        pass
+
+    @abstractmethod
+    def recognize(self, pcm: bytes, stream=None,
+                  cancel: Optional[threading.Event] = None) -> RecognitionResult:
+        """Recognize one finished utterance; `stream` is begin()'s handle."""
+
+
+# --- Lex (batch) -----------------------------------------------------------
+
+def _decode_b64_gzip_json(s: str):
+    if not s:
+        return None
+    raw = base64.b64decode(s)
+    data = gzip.decompress(raw)
+    return json.loads(data.decode("utf-8"))
+
+
+def parse_lex_utterance_response(resp):
+    headers = resp.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+
+    session_state = _decode_b64_gzip_json(headers.get("x-amz-lex-session-state")) or {}
+    intent_obj = session_state.get("intent", {}) or {}
+    intent_name = intent_obj.get("name", INTENT_FALLBACK)
+
+    interpretations = _decode_b64_gzip_json(headers.get("x-amz-lex-interpretations")) or []
+    confidence = None
+    if interpretations:
+        top = interpretations[0]
+        intent_name = top.get("intent", {}).get("name", intent_name) or intent_name
+        confidence = top.get("nluConfidence", {}).get("score")
+
+    raw_slots = intent_obj.get("slots", {}) or {}
+    slots = {}
+    for k, v in raw_slots.items():
+        if v and "value" in v and "interpretedValue" in v["value"]:
+            slots[k] = v["value"]["interpretedValue"]
+
+    input_transcript = None
+    if "x-amz-lex-input-transcript" in headers:
+        try:
+            input_transcript = (
+                gzip.decompress(base64.b64decode(headers["x-amz-lex-input-transcript"]))
+                .decode("utf-8")
+            )
+        except Exception:
+            input_transcript = None
+
+    return intent_name, confidence, slots, input_transcript
+
+
+class LexRecognizer(Recognizer):
+    """One recognize_utterance upload per finished utterance (optionally prepped)."""
+
+    name = "lex"
+
+    def __init__(self, client, bot_id: str, alias_id: str, locale_id: str, session_id: str,
+                 prep: Optional[AudioPrep] = None, max_retries: int = 3):
+        self.client = client
+        self.bot_id = bot_id
+        self.alias_id = alias_id
+        self.locale_id = locale_id
+        self.session_id = session_id
+        self.prep = prep
+        self.max_retries = max_retries
+
+    def _call_with_retry(self, audio_bytes: bytes, content_type: str,
+                         cancel: Optional[threading.Event] = None):
+        delay = 0.3
+        last_exc = None
+        for attempt in range(1, self.max_retries + 1):
+            check(cancel)
+            try:
+                t0 = time.time()
+                resp = self.client.recognize_utterance(
+                    botId=self.bot_id,
+                    botAliasId=self.alias_id,
+                    localeId=self.locale_id,
+                    sessionId=self.session_id,
+                    requestContentType=content_type,
+                    responseContentType="text/plain; charset=utf-8",
+                    inputStream=bytes(audio_bytes),  # botocore wants bytes, not a memoryview
+                )
+                latency_ms = (time.time() - t0) * 1000.0
+                print(f"[Lex] Uploaded {len(audio_bytes) / 1024:.1f} KB, recognized in {latency_ms:.0f} ms")
+                return resp
+            except (BotoCoreError, ClientError) as e:
+                last_exc = e
+                print(f"[Lex ERROR] attempt {attempt}/{self.max_retries}: {e}")
+                time.sleep(delay)
+                delay *= 2
+        raise last_exc
+
+    def recognize(self, pcm: bytes, stream=None,
+                  cancel: Optional[threading.Event] = None) -> RecognitionResult:
+        t0 = time.time()
+        content_type = CONTENT_TYPES[16000]
+        if self.prep is not None:
+            prepared = self.prep.process(pcm)
+            print(f"[Prep] {prepared.summary()}")
+            pcm, content_type = prepared.pcm, prepared.content_type
+        resp = self._call_with_retry(pcm, content_type, cancel)
+        check(cancel)
+        intent, confidence, slots, transcript = parse_lex_utterance_response(resp)
+        return RecognitionResult(intent, confidence, slots, transcript,
+                                 (time.time() - t0) * 1000.0, self.name)
+
+
+# --- streaming -------------------------------------------------------------
+#
+# Wire format (one TCP connection per utterance, see bot/stream_server.py):
+#   client -> server  one JSON header line {"rate": 16000, "format": "l16", "session": ...}
+#                     then frames: 4-byte big-endian length + little-endian PCM;
+#                     a zero-length frame ends the audio
+#   server -> client  one JSON line {"intent", "confidence", "slots", "transcript"}
+#                     or {"error": "..."}
+#
+# boto3's lexv2-runtime has no StartConversation (bidirectional streaming
+# needs the HTTP/2 event-stream SDKs), so a real deployment puts a small
+# proxy speaking this format in front of the streaming ASR of choice.
+
+FRAME = struct.Struct(">I")
+
+
+class _Stream:
+    def __init__(self):
+        self.chunks: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self.done = threading.Event()
+        self.ended_at = 0.0
+        self.result = None
+        self.error = None
+        self.sent = 0
+
+
+class StreamingRecognizer(Recognizer):
+    """
+    Streams each utterance to a recognition server while it is being spoken,
+    so only the server's final decode is left once the endpointer fires.
+
+    Each utterance gets its own sender thread and connection; the audio
+    thread only appends to an in-memory queue. If the stream fails, the
+    finished audio goes to `fallback` (normally the Lex batch backend).
+    """
+
+    name = "stream"
+    streaming = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, samplerate: int = 16000,
+                 session_id: str = "pi_voice_session", timeout: float = 5.0,
+                 fallback: Optional[Recognizer] = None):
+        self.addr = (host, port)
+        self.samplerate = samplerate
+        self.session_id = session_id
+        self.timeout = timeout
+        self.fallback = fallback
+
+    def begin(self, pcm: bytes):
+        stream = _Stream()
+        stream.chunks.put(pcm)
+        threading.Thread(target=self._send, args=(stream,), daemon=True).start()
+        return stream
+
+    def feed(self, stream, pcm: bytes):
+        stream.chunks.put(pcm)
+
+    def end(self, stream):
+        stream.ended_at = time.time()
+        stream.chunks.put(None)
+
+    def abort(self, stream):
+        stream.error = "aborted"
+        stream.chunks.put(None)
+
+    def _send(self, stream: _Stream):
+        try:
+            with socket.create_connection(self.addr, timeout=self.timeout) as sock:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                header = {"rate": self.samplerate, "format": "l16", "session": self.session_id}
+                sock.sendall(json.dumps(header).encode("utf-8") + b"\n")
+                while True:
+                    chunk = stream.chunks.get()
+                    if chunk is None:
+                        break
+                    sock.sendall(FRAME.pack(len(chunk)) + chunk)
+                    stream.sent += len(chunk)
+                if stream.error == "aborted":
+                    return
+                sock.sendall(FRAME.pack(0))
+                line = sock.makefile("rb").readline()
+            reply = json.loads(line.decode("utf-8")) if line else {"error": "connection closed"}
+            if "error" in reply:
+                stream.error = reply["error"]
+            else:
+                stream.result = reply
+        except (OSError, ValueError) as e:
+            stream.error = str(e)
+        finally:
+            stream.done.set()
+
+    def _wait(self, stream: _Stream, cancel: Optional[threading.Event]) -> bool:
+        deadline = time.time() + self.timeout
+        while not stream.done.wait(0.01):
+            check(cancel)
+            if time.time() >= deadline:
+                return False
+        return True
+
+    def recognize(self, pcm: bytes, stream=None,
+                  cancel: Optional[threading.Event] = None) -> RecognitionResult:
+        if stream is not None and self._wait(stream, cancel) and stream.result is not None:
+            r = stream.result
+            latency_ms = (time.time() - stream.ended_at) * 1000.0
+            print(f"[Stream] Streamed {stream.sent / 1024:.1f} KB, result {latency_ms:.0f} ms after endpoint")
+            return RecognitionResult(r.get("intent") or INTENT_FALLBACK, r.get("confidence"),
+                                     r.get("slots") or {}, r.get("transcript"),
+                                     latency_ms, self.name)
+        reason = "no stream" if stream is None else (stream.error or "timed out")
+        if self.fallback is None:
+            raise RuntimeError(f"streaming recognition failed: {reason}")
+        print(f"[Stream] Falling back to {self.fallback.name}: {reason}")
+        return self.fallback.recognize(pcm, cancel=cancel)
@@ -0,0 +1,155 @@
+"""
+Local stand-in for a streaming recognition service.
+
+Speaks the wire format of bot.recognizer.StreamingRecognizer and models a
+recognizer whose decoding keeps up with the audio: each chunk costs
+`decode_ms_per_sec` of work as it arrives, and `final_ms` more once the
+audio ends. The "recognition" itself is an engine function (PCM -> result
+dict); the default just reports how much audio it heard.
+
+    python3 -m bot.stream_server                 # serve on 127.0.0.1:8765
+    python3 -m bot.stream_server --bench         # streaming vs batch latency
+
+With BOT_RECOGNIZER=stream the bot talks to this server instead of Lex.
+"""
+
+import argparse
+import json
+import socketserver
+import threading
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+from .persona import INTENT_FALLBACK
+from .recognizer import FRAME, StreamingRecognizer
+
+
+def echo_engine(pcm: bytes, rate: int) -> Dict:
+    seconds = len(pcm) / (2 * rate)
+    return {"intent": INTENT_FALLBACK, "confidence": None, "slots": {},
+            "transcript": f"({seconds:.2f} s of audio)"}
+
+
+def _read_exact(f, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) < n:
+        raise EOFError("client went away mid-frame")
+    return data
+
+
+class StreamServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr, engine: Callable[[bytes, int], Dict] = echo_engine,
+                 decode_ms_per_sec: float = 150.0, final_ms: float = 80.0):
+        super().__init__(addr, _Handler)
+        self.engine = engine
+        self.decode_ms_per_sec = decode_ms_per_sec
+        self.final_ms = final_ms
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        try:
+            header = json.loads(self.rfile.readline().decode("utf-8"))
+            rate = int(header.get("rate", 16000))
+            audio = bytearray()
+            while True:
+                (n,) = FRAME.unpack(_read_exact(self.rfile, FRAME.size))
+                if n == 0:
+                    break
+                chunk = _read_exact(self.rfile, n)
+                audio += chunk
+                # incremental decode of this chunk
+                time.sleep(server.decode_ms_per_sec * len(chunk) / (2 * rate) / 1000.0)
+            time.sleep(server.final_ms / 1000.0)
+            reply = server.engine(bytes(audio), rate)
+        except (EOFError, ValueError) as e:
+            reply = {"error": str(e)}
+        except Exception as e:
+            reply = {"error": f"engine failed: {e}"}
+        try:
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+        except OSError:
+            pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, **kwargs) -> StreamServer:
+    """Start a server on a background thread and return it (call shutdown() to stop)."""
+    server = StreamServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench(port: int, utterances: int, seconds: float, block: int = 1024, rate: int = 16000, **kwargs):
+    """Latency from endpoint to result: streamed at capture pace vs uploaded at the end."""
+    server = serve(port=port, **kwargs)
+    recognizer = StreamingRecognizer(port=port, samplerate=rate)
+    rng = np.random.default_rng(1)
+    block_sec = block / rate
+    results = {"stream": [], "batch": []}
+    try:
+        for _ in range(utterances):
+            pcm = (rng.standard_normal(int(seconds * rate)) * 1000).astype("<i2").tobytes()
+            step = 2 * block      # bytes per block
+            for mode in ("stream", "batch"):
+                stream = recognizer.begin(pcm[:step])
+                for i in range(step, len(pcm), step):
+                    if mode == "stream":
+                        time.sleep(block_sec)     # sent as it is spoken
+                    # batch: every block is sent at once, after the user is done
+                    recognizer.feed(stream, pcm[i:i + step])
+                recognizer.end(stream)
+                result = recognizer.recognize(pcm, stream)
+                results[mode].append(result.latency_ms)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"=== Streaming recognition bench: {utterances} x {seconds:.1f}s, "
+          f"decode {server.decode_ms_per_sec:.0f} ms/s + final {server.final_ms:.0f} ms ===")
+    for mode, values in results.items():
+        print(f"{mode:<7} p50 {_percentile(values, 0.5):6.0f} ms   p95 {_percentile(values, 0.95):6.0f} ms"
+              f"   max {max(values):6.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local streaming recognition stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--decode-ms-per-sec", type=float, default=150.0,
+                        help="simulated decode cost per second of audio")
+    parser.add_argument("--final-ms", type=float, default=80.0,
+                        help="simulated finalization cost after the last frame")
+    parser.add_argument("--bench", action="store_true", help="run the latency benchmark and exit")
+    parser.add_argument("--utterances", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=1.5)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.port, args.utterances, args.seconds,
+              decode_ms_per_sec=args.decode_ms_per_sec, final_ms=args.final_ms)
+        return
+
+    server = StreamServer((args.host, args.port), decode_ms_per_sec=args.decode_ms_per_sec,
+                          final_ms=args.final_ms)
+    print(f"[StreamServer] Listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Offline scoring for the VAD endpointers.
+
+Runs recorded WAV clips through Endpointer / AdaptiveEndpointer block by
+block, exactly as the capture callback would, and compares the detected
+utterances with hand labels.
+
+Labels: next to each clip.wav, an optional clip.txt in Audacity label
+format ("start<TAB>end[<TAB>text]" in seconds, one speech segment per
+line). A clip without labels is treated as noise only (BGM, crowd, the
+bot's own TTS), so everything detected in it is a false trigger.
+
+    python3 -m bot.vad_eval recordings/ --vad both
+"""
+import argparse
+import glob
+import os
+import wave
+
+import numpy as np
+
+from .audio_vad import Endpointer, AdaptiveEndpointer
+
+
+def load_wav(path: str):
+    """16-bit PCM WAV -> (int16 mono samples, samplerate)."""
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        rate = w.getframerate()
+        data = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+        channels = w.getnchannels()
+    if channels > 1:
+        data = data[::channels]
+    return np.ascontiguousarray(data, dtype=np.int16), rate
+
+
+def load_labels(wav_path: str):
+    path = os.path.splitext(wav_path)[0] + ".txt"
+    segments = []
+    if not os.path.exists(path):
+        return segments
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2:
+                segments.append((float(parts[0]), float(parts[1])))
+    return segments
+
+
+def run_endpointer(ep: Endpointer, samples: np.ndarray, block_size: int):
+    """Feed a whole clip through `ep`; returns [(start_sec, end_sec)]."""
+    ep.reset()
+    rate = float(ep.samplerate)
+    found = []
+    for pos in range(0, samples.shape[0] - block_size + 1, block_size):
+        if ep.update(samples[pos:pos + block_size], pos) == "end":
+            found.append((ep.start / rate, ep.end / rate))
+    if ep.speaking:
+        found.append((ep.start / rate, samples.shape[0] / rate))
+    return found
+
+
+def make_endpointer(kind: str, rate: int, block_size: int, args) -> Endpointer:
+    if kind == "energy":
+        return Endpointer(rate, args.threshold, block_size=block_size, silence_ms=args.silence_ms)
+    return AdaptiveEndpointer(rate, block_size=block_size, silence_ms=args.silence_ms)
+
+
+def score(kind: str, clips, args):
+    stats = {"seconds": 0.0, "labeled": 0, "detected": 0, "hits": 0, "misses": 0,
+             "false": 0, "splits": 0, "onset": [], "endpoint": []}
+    for path, samples, rate, labels in clips:
+        ep = make_endpointer(kind, rate, args.block_size, args)
+        found = run_endpointer(ep, samples, args.block_size)
+        stats["seconds"] += samples.shape[0] / rate
+        stats["labeled"] += len(labels)
+        stats["detected"] += len(found)
+
+        matched = [[] for _ in labels]
+        for d in found:
+            best, best_overlap = None, 0.0
+            for i, (ls, le) in enumerate(labels):
+                overlap = min(d[1], le) - max(d[0], ls)
+                if overlap > best_overlap:
+                    best, best_overlap = i, overlap
+            if best is None:
+                stats["false"] += 1
+            else:
+                matched[best].append(d)
+        for (ls, le), ds in zip(labels, matched):
+            if not ds:
+                stats["misses"] += 1
+                continue
+            stats["hits"] += 1
+            stats["splits"] += len(ds) - 1
+            stats["onset"].append((ds[0][0] - ls) * 1000.0)
+            stats["endpoint"].append((ds[-1][1] - le) * 1000.0)
+    return stats
+
+
+def _ms(values, q=None):
+    if not values:
+        return "-"
+    if q is None:
+        return "%.0f" % (sum(values) / len(values))
+    return "%.0f" % np.percentile(values, q)
+
+
+def print_report(results):
+    print("%-9s %7s %6s %6s %5s %6s %6s %7s %6s %9s %9s %9s"
+          % ("vad", "minutes", "labels", "detect", "hits", "misses", "false",
+             "false/m", "splits", "onset ms", "end ms", "end p95"))
+    for kind, st in results:
+        minutes = st["seconds"] / 60.0
+        print("%-9s %7.1f %6d %6d %5d %6d %6d %7.2f %6d %9s %9s %9s"
+              % (kind, minutes, st["labeled"], st["detected"], st["hits"], st["misses"],
+                 st["false"], st["false"] / max(minutes, 1e-9), st["splits"],
+                 _ms(st["onset"]), _ms(st["endpoint"]), _ms(st["endpoint"], 95)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score VAD endpointers on labeled WAV clips")
+    parser.add_argument("paths", nargs="+", help="WAV files or directories of them")
+    parser.add_argument("--vad", choices=["energy", "adaptive", "both"], default="both")
+    parser.add_argument("--threshold", type=float, default=50.0, help="energy VAD threshold")
+    parser.add_argument("--silence-ms", type=int, default=600)
+    parser.add_argument("--block-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    files = []
+    for p in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(p, "*.wav"))) if os.path.isdir(p) else [p])
+    clips = []
+    for path in files:
+        try:
+            samples, rate = load_wav(path)
+        except (OSError, ValueError, wave.Error) as e:
+            print(f"[VADEval] Skipping {path}: {e}")
+            continue
+        clips.append((path, samples, rate, load_labels(path)))
+    if not clips:
+        print("[VADEval] No clips to score.")
+        return
+
+    kinds = ["energy", "adaptive"] if args.vad == "both" else [args.vad]
+    print_report([(k, score(k, clips, args)) for k in kinds])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# enemy_pool.py
+# Fixed-capacity pool of enemy dicts (and their Rects) reused across spawns.
+
+import pygame
+
+from game_rules import move_along_path, has_escaped
+
+
+class EnemyPool:
+    """Preallocated enemy dicts handed out from a free list.
+
+    `active` is the live enemy list the game iterates over; it is only ever
+    mutated in place so references to it (the game's `enemies`) stay valid.
+    """
+
+    def __init__(self, capacity, enemy_w, enemy_h):
+        self.enemy_w = enemy_w
+        self.enemy_h = enemy_h
+        self.capacity = 0
+        self.free = []
+        self.active = []
+        self.reserve(capacity)
+
+    def _new_enemy(self):
+        return {
+            "rect": pygame.Rect(0, 0, self.enemy_w, self.enemy_h),
+            "uid": 0,
+            "type": None,
+            "path": None,
+            "hp": 0,
+            "pending": 0,        # tap hits queued this frame (spatial_grid.py)
+            "max_hp": 0,
+            "x": 0.0,
+            "y": 0.0,
+            "speed": 0.0,
+            "seg_idx": 0,
+            "dist": 0.0,
+        }
+
+    def reserve(self, capacity):
+        """Grow the pool to at least `capacity` enemies. Call between rounds,
+        never from the per-frame tick."""
+        while self.capacity < capacity:
+            self.free.append(self._new_enemy())
+            self.capacity += 1
+
+    def acquire(self):
+        """Take a recycled enemy and mark it active, or None if exhausted.
+        The caller is responsible for resetting every field."""
+        if not self.free:
+            return None
+        enemy = self.free.pop()
+        self.active.append(enemy)
+        return enemy
+
+    def spawn(self, path, etype, hp, speed, uid):
+        """Acquire an enemy and reset it to the start of `path`; None if the
+        pool is exhausted."""
+        enemy = self.acquire()
+        if enemy is None:
+            return None
+        sx, sy = path[0]
+        enemy["rect"].x = int(sx)
+        enemy["rect"].y = int(sy) - self.enemy_h // 2
+        enemy["type"] = etype
+        enemy["path"] = path
+        enemy["hp"] = hp
+        enemy["pending"] = 0
+        enemy["max_hp"] = hp
+        enemy["x"] = float(sx)
+        enemy["y"] = float(sy)
+        enemy["speed"] = speed
+        enemy["seg_idx"] = 0
+        enemy["dist"] = 0.0      # distance travelled along the path
+        enemy["uid"] = uid       # tells pooled reuses apart (towers.py)
+        return enemy
+
+    def update(self, dt):
+        """Move every active enemy and sync its rect, then release the ones
+        that escaped or died. Compacts `active` in place, so a steady-state
+        tick allocates nothing. Returns how many escaped."""
+        active = self.active
+        half_h = self.enemy_h // 2
+        escaped = 0
+        keep = 0
+        for e in active:
+            move_along_path(e, dt)
+            e["rect"].x = int(e["x"])
+            e["rect"].y = int(e["y"] - half_h)
+
+            if has_escaped(e):
+                escaped += 1
+                self.release(e)
+            elif e["hp"] > 0:
+                active[keep] = e
+                keep += 1
+            else:
+                self.release(e)
+        del active[keep:]
+        return escaped
+
+    def release(self, enemy):
+        """Return an enemy to the free list. The caller drops it from `active`
+        (update() compacts the list in place).
+
+        hp is zeroed so anything still holding the dict (shots in flight,
+        the lag-compensation history) sees it as dead, even an enemy that
+        escaped with hp left.
+        """
+        enemy["hp"] = 0
+        self.free.append(enemy)
+
+    def release_all(self):
+        for enemy in self.active:
+            enemy["hp"] = 0
+        self.free.extend(self.active)
+        del self.active[:]
@@ -0,0 +1,138 @@
+# game_rules.py
+# Pure gameplay rules shared by the pygame front end and the headless
+# balancing simulator (balance_sim.py). No pygame imports here.
+
+SCREEN_SIZE      = (320, 240)
+ENEMY_W, ENEMY_H = 40, 24
+SPAWN_INTERVAL   = 2.0
+
+# Difficulty affects enemy speed / HP / count and the player's HP
+DIFFICULTY_SETTINGS = {
+    "easy":   {"ENEMY_SPEED": 25.0, "INIT_HP": 3, "MAX_ENEMIES": 5,  "PLAYER_HP": 7},
+    "normal": {"ENEMY_SPEED": 30.0, "INIT_HP": 6, "MAX_ENEMIES": 8,  "PLAYER_HP": 5},
+    "hard":   {"ENEMY_SPEED": 60.0, "INIT_HP": 9, "MAX_ENEMIES": 12, "PLAYER_HP": 3},
+}
+
+# Per-type stats for wave entries that name a type; type names match the
+# sprite keys in ENEMY_SPRITES
+ENEMY_TYPES = {
+    "easy":   {"hp": 3, "speed": 25.0},
+    "normal": {"hp": 6, "speed": 30.0},
+    "hard":   {"hp": 9, "speed": 60.0},
+}
+
+
+def build_path_sets(W, H, enemy_w=ENEMY_W):
+    """Build two candidate paths for each difficulty level."""
+    mid_y  = H // 2
+    top_y  = 50
+    bot_y  = H - 80
+
+    return {
+    # EASY
+    "easy": [
+        [
+            (-enemy_w, mid_y),
+            (W + enemy_w, mid_y),
+        ],
+        [
+            (-enemy_w, top_y),
+            (W // 2, bot_y),
+            (W + enemy_w, bot_y - 10),
+        ],
+    ],
+
+    # NORMAL
+    "normal": [
+        [
+            (-enemy_w, 80),
+            (W - 40, 80),
+            (40, 170),
+            (W + enemy_w, 170),
+        ],
+        [
+            (-enemy_w,110),
+            (W // 4, 70),
+            (W // 2, 150),
+            (3 * W // 4, 90),
+            (W + enemy_w, 170),
+        ],
+    ],
+
+    # HARD
+    "hard": [
+
+        [
+        (-enemy_w, 60),
+        (W // 6, 60),
+        (W // 3, 200),
+        (W // 2, 80),
+        (2 * W // 3, 210),
+        (5 * W // 6, 90),
+        (W + enemy_w, 170)
+        ],
+
+        [
+        (-enemy_w, 50),
+        (W // 5, 210),
+        (2 * W // 5, 70),
+        (3 * W // 5, 200),
+        (4 * W // 5, 80),
+        (W + enemy_w, 160)
+        ],
+    ],
+}
+
+
+def move_along_path(enemy, dt):
+    """Move an enemy along its polyline path (updates x, y, seg_idx, dist)."""
+    path = enemy["path"]
+    while dt > 0 and enemy["seg_idx"] < len(path) - 1:
+        sx, sy = enemy["x"], enemy["y"]
+        tx, ty = path[enemy["seg_idx"] + 1]
+
+        dx = tx - sx
+        dy = ty - sy
+        dist = (dx*dx + dy*dy) ** 0.5
+
+        if dist == 0:
+            enemy["seg_idx"] += 1
+            continue
+
+        max_move = enemy["speed"] * dt
+
+        if max_move >= dist:
+            enemy["x"], enemy["y"] = float(tx), float(ty)
+            enemy["seg_idx"] += 1
+            enemy["dist"] += dist
+            dt -= dist / enemy["speed"]
+        else:
+            ratio = max_move / dist
+            enemy["x"] = sx + dx * ratio
+            enemy["y"] = sy + dy * ratio
+            enemy["dist"] += max_move
+            dt = 0
+
+
+def has_escaped(enemy):
+    """True once an enemy has reached the end of its path."""
+    path = enemy["path"]
+    return enemy["seg_idx"] >= len(path) - 1 and enemy["x"] >= path[-1][0]
+
+
+def distance_to_path(x, y, path):
+    """Shortest distance from (x, y) to any segment of a polyline path."""
+    best = None
+    for i in range(len(path) - 1):
+        sx, sy = path[i]
+        tx, ty = path[i + 1]
+        dx = tx - sx
+        dy = ty - sy
+        seg2 = dx*dx + dy*dy
+        t = 0.0 if seg2 == 0 else max(0.0, min(1.0, ((x - sx)*dx + (y - sy)*dy) / seg2))
+        px = sx + dx * t - x
+        py = sy + dy * t - y
+        d = (px*px + py*py) ** 0.5
+        if best is None or d < best:
+            best = d
+    return best
@@ -1,6 +1,20 @@
+import threading
 import requests
 API_BASE_URL = "http://127.0.0.1:5050"
 
+# Failed calls per client function, for soak reports
+_error_counts = {}
+_error_lock = threading.Lock()
+
+def _count_error(name: str):
+    with _error_lock:
+        _error_counts[name] = _error_counts.get(name, 0) + 1
+
+def get_error_counts() -> dict:
+    """Returns a snapshot of failed API calls per client function."""
+    with _error_lock:
+        return dict(_error_counts)
+
 # --- API Client Functions ---
 
 def set_difficulty(level: str):
@@ -8,6 +22,7 @@ def set_difficulty(level: str):
     try:
         requests.post(f"{API_BASE_URL}/config/difficulty", json={"level": level}, timeout=0.5)
     except requests.RequestException as e:
+        _count_error("set_difficulty")
         print(f"[API Error] Failed to set difficulty: {e}")
 
 def set_chat_status(status: str):
@@ -15,6 +30,7 @@ def set_chat_status(status: str):
     try:
         requests.post(f"{API_BASE_URL}/config/chat_status", json={"status": status}, timeout=0.5)
     except requests.RequestException as e:
+        _count_error("set_chat_status")
         print(f"[API Error] Failed to set chat_status: {e}")
 
 def set_volume(percent: int):
@@ -22,6 +38,7 @@ def set_volume(percent: int):
     try:
         requests.post(f"{API_BASE_URL}/config/volume", json={"percent": percent}, timeout=0.5)
     except requests.RequestException as e:
+        _count_error("set_volume")
         print(f"[API Error] Failed to set volume: {e}")
 
 def get_state():
@@ -31,6 +48,7 @@ def get_state():
         response.raise_for_status()
         return response.json()
     except requests.RequestException as e:
+        _count_error("get_state")
         print(f"[API Error] Failed to get state: {e}")
         return None
 
@@ -39,6 +57,7 @@ def issue_command(command: str):
     try:
         requests.post(f"{API_BASE_URL}/command/{command}", timeout=0.5)
     except requests.RequestException as e:
+        _count_error("issue_command")
         print(f"[API Error] Failed to issue command '{command}': {e}")
 
 def update_state(fields: dict):
@@ -47,5 +66,6 @@ def update_state(fields: dict):
         response.raise_for_status()
         return response.json()
     except requests.RequestException as e:
+        _count_error("update_state")
         print(f"[API Error] Failed to get state: {e}")
         return None
\ No newline at end of file
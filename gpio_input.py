@@ -0,0 +1,250 @@
+# gpio_input.py
+# Edge-interrupt GPIO buttons shared by the game, the PiTFT buttons and
+# the push-to-talk recorder.
+#
+# Every button is set up once with add_event_detect(BOTH); RPi.GPIO calls
+# back on its own thread and we debounce in software, then hand the
+# change to any registered callbacks and to an event queue. Readers wait
+# on a threading.Event instead of polling GPIO.input() in a loop.
+#
+# Off the Pi (or with GPIO_FAKE=1) the FakeGPIO backend stands in, and
+# tests can drive its pins with press() / release().
+
+import os
+import queue
+import threading
+import time
+
+
+class FakeGPIO:
+    """Enough of the RPi.GPIO API for ButtonInput, with scriptable pins."""
+
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    PUD_UP = 22
+    PUD_DOWN = 21
+    HIGH = 1
+    LOW = 0
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.levels = {}
+        self.callbacks = {}
+        self.lock = threading.Lock()
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None):
+        self.levels.setdefault(pin, self.LOW if pull_up_down == self.PUD_DOWN else self.HIGH)
+
+    def input(self, pin):
+        return self.levels.get(pin, self.HIGH)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if pin in self.callbacks:
+            raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+        self.callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self, *args):
+        self.callbacks.clear()
+
+    def set_level(self, pin, level):
+        """Drive a pin and fire its edge callback (on the caller's thread)."""
+        with self.lock:
+            old = self.levels.get(pin, self.HIGH)
+            self.levels[pin] = level
+        if old == level or pin not in self.callbacks:
+            return
+        edge, callback = self.callbacks[pin]
+        if callback and (edge == self.BOTH or
+                         (edge == self.FALLING and level == self.LOW) or
+                         (edge == self.RISING and level == self.HIGH)):
+            callback(pin)
+
+    def press(self, pin):
+        self.set_level(pin, self.LOW)
+
+    def release(self, pin):
+        self.set_level(pin, self.HIGH)
+
+
+_backend = None
+
+def get_backend():
+    """RPi.GPIO on a Pi, otherwise (or with GPIO_FAKE=1) a shared FakeGPIO."""
+    global _backend
+    if _backend is None:
+        if os.getenv("GPIO_FAKE") != "1":
+            try:
+                import RPi.GPIO as GPIO
+                _backend = GPIO
+            except (ImportError, RuntimeError):
+                pass
+        if _backend is None:
+            _backend = FakeGPIO()
+    return _backend
+
+def is_fake():
+    return isinstance(get_backend(), FakeGPIO)
+
+
+class _Button:
+    def __init__(self, pin, active_low):
+        self.pin = pin
+        self.active_low = active_low
+        self.pressed = False
+        self.changed_at = 0.0
+        self.press_event = threading.Event()
+        self.release_event = threading.Event()
+        self.release_event.set()
+        self.callbacks = []
+        self.recheck = None
+
+
+class ButtonInput:
+    """Debounced, interrupt-driven buttons.
+
+    add_button(name, pin) sets a pin up once; several names may share a
+    pin (the PiTFT's fourth button doubles as the game's bail-out). Each
+    debounced change is pushed to `events` as (name, pressed, time) and to
+    the callbacks registered with on(name, fn). The queue is bounded;
+    changes nobody drains are dropped once it is full.
+    """
+
+    def __init__(self, backend=None, debounce_ms=30):
+        self.gpio = backend or get_backend()
+        self.debounce = debounce_ms / 1000.0
+        self.buttons = {}       # name -> _Button
+        self.pins = {}          # pin -> _Button
+        self.names = {}         # pin -> [names]
+        self.events = queue.Queue(maxsize=64)
+        self.lock = threading.Lock()
+        self.gpio.setmode(self.gpio.BCM)
+
+    def add_button(self, name, pin, pull_up=True):
+        with self.lock:
+            b = self.pins.get(pin)
+            if b is None:
+                self.gpio.setup(pin, self.gpio.IN,
+                                pull_up_down=self.gpio.PUD_UP if pull_up else self.gpio.PUD_DOWN)
+                b = _Button(pin, active_low=pull_up)
+                self._set_state(b, self._read(b), time.time())
+                self.pins[pin] = b
+                self.names[pin] = []
+                self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=self._edge)
+            if name not in self.names[pin]:
+                self.names[pin].append(name)
+            self.buttons[name] = b
+        return b
+
+    def on(self, name, callback):
+        """Call callback(name, pressed) on every debounced change."""
+        self.buttons[name].callbacks.append((name, callback))
+
+    def is_pressed(self, name):
+        b = self.buttons.get(name)
+        return b is not None and b.pressed
+
+    def wait_press(self, name, timeout=None):
+        return self.buttons[name].press_event.wait(timeout)
+
+    def wait_release(self, name, timeout=None):
+        return self.buttons[name].release_event.wait(timeout)
+
+    def get_events(self, out):
+        """Append every queued (name, pressed, time) event to `out`."""
+        try:
+            while True:
+                out.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        return out
+
+    def close(self):
+        with self.lock:
+            for pin, b in self.pins.items():
+                if b.recheck is not None:
+                    b.recheck.cancel()
+                try:
+                    self.gpio.remove_event_detect(pin)
+                except RuntimeError:
+                    pass
+            self.pins.clear()
+            self.buttons.clear()
+            self.names.clear()
+
+    def _read(self, b):
+        level = self.gpio.input(b.pin)
+        return (level == self.gpio.LOW) if b.active_low else (level == self.gpio.HIGH)
+
+    def _set_state(self, b, pressed, now):
+        b.pressed = pressed
+        b.changed_at = now
+        if pressed:
+            b.release_event.clear()
+            b.press_event.set()
+        else:
+            b.press_event.clear()
+            b.release_event.set()
+
+    def _edge(self, pin):
+        b = self.pins.get(pin)
+        if b is None:
+            return
+        now = time.time()
+        pressed = self._read(b)
+        with self.lock:
+            if pressed == b.pressed:
+                return
+            if now - b.changed_at < self.debounce:
+                # still bouncing: look again once the window has passed, so
+                # a real change inside the window is not lost
+                if b.recheck is None:
+                    b.recheck = threading.Timer(self.debounce - (now - b.changed_at),
+                                                self._recheck, (pin,))
+                    b.recheck.daemon = True
+                    b.recheck.start()
+                return
+            self._set_state(b, pressed, now)
+            names = list(self.names[pin])
+        self._notify(b, names, pressed, now)
+
+    def _recheck(self, pin):
+        b = self.pins.get(pin)
+        if b is None:
+            return
+        b.recheck = None
+        self._edge(pin)
+
+    def _notify(self, b, names, pressed, now):
+        for name in names:
+            try:
+                self.events.put_nowait((name, pressed, now))
+            except queue.Full:
+                pass
+        for name, callback in b.callbacks:
+            try:
+                callback(name, pressed)
+            except Exception as e:
+                print("[GPIO] Button callback failed:", e)
+
+
+_shared = None
+
+def shared_input():
+    """The process-wide ButtonInput, so every user sets a pin up only once."""
+    global _shared
+    if _shared is None:
+        _shared = ButtonInput()
+    return _shared
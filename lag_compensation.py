@@ -0,0 +1,176 @@
+# lag_compensation.py
+# Rewind enemy positions to the moment a touch actually happened.
+#
+# By the time a tap reaches handle_playing_click() it has sat in the evdev
+# thread, the pigame queue and up to a frame of the main loop, and the enemy
+# the player aimed at has moved on. The game records where every enemy was
+# drawn each frame; a tap carrying its hardware timestamp is tested against
+# the frame that was on screen at that instant instead of the current one.
+#
+# Timestamps are time.time() seconds, the same clock evdev stamps events
+# with (CLOCK_REALTIME).
+
+
+class PositionHistory:
+    """Ring buffer of the last `frames` drawn enemy positions.
+
+    Each frame slot is a set of preallocated parallel arrays (enemy, uid,
+    rect edges, dist) holding up to `capacity` enemies, overwritten in place
+    by record() so the per-frame snapshot allocates nothing. reserve() grows
+    them; like EnemyPool.reserve, call it between rounds.
+    """
+
+    HIST_BUCKETS = 30      # 10 ms buckets for the rewind histogram
+
+    def __init__(self, frames=16, max_rewind=0.25, capacity=16):
+        self.max_rewind = max_rewind
+        self.times = [0.0] * frames
+        self.sizes = [0] * frames
+        self.capacity = 0
+        self.enemy = [[] for _ in range(frames)]
+        self.uid = [[] for _ in range(frames)]
+        self.left = [[] for _ in range(frames)]
+        self.top = [[] for _ in range(frames)]
+        self.right = [[] for _ in range(frames)]
+        self.bottom = [[] for _ in range(frames)]
+        self.dist = [[] for _ in range(frames)]
+        self.reserve(capacity)
+        self.head = 0
+        self.count = 0
+
+        self.taps = 0
+        self.compensated = 0
+        self.rescued = 0       # hit in the rewound frame, would have missed now
+        self.too_old = 0
+        self.rewind_hist = [0] * self.HIST_BUCKETS
+        self.rewind_total = 0.0
+        self.rewind_max = 0.0
+
+    def reserve(self, capacity):
+        """Grow every frame slot to hold at least `capacity` enemies."""
+        grow = capacity - self.capacity
+        if grow <= 0:
+            return
+        for f in range(len(self.times)):
+            self.enemy[f].extend([None] * grow)
+            self.uid[f].extend([0] * grow)
+            self.left[f].extend([0] * grow)
+            self.top[f].extend([0] * grow)
+            self.right[f].extend([0] * grow)
+            self.bottom[f].extend([0] * grow)
+            self.dist[f].extend([0.0] * grow)
+        self.capacity = capacity
+
+    def clear(self):
+        for f in range(len(self.times)):
+            refs = self.enemy[f]
+            for k in range(self.sizes[f]):
+                refs[k] = None      # don't keep recycled enemies alive
+            self.sizes[f] = 0
+        self.count = 0
+
+    def record(self, now, enemies):
+        """Remember where each live enemy was drawn in the frame shown at `now`.
+
+        Enemies past `capacity` are not recorded (their taps are simply not
+        rewound); reserve() for the pool size to avoid that.
+        """
+        f = self.head
+        refs = self.enemy[f]
+        uids = self.uid[f]
+        left = self.left[f]
+        top = self.top[f]
+        right = self.right[f]
+        bottom = self.bottom[f]
+        dist = self.dist[f]
+        cap = self.capacity
+        n = 0
+        for e in enemies:
+            if e["hp"] > 0 and n < cap:
+                r = e["rect"]
+                refs[n] = e
+                uids[n] = e["uid"]
+                left[n] = r.left
+                top[n] = r.top
+                right[n] = r.right
+                bottom[n] = r.bottom
+                dist[n] = e["dist"]
+                n += 1
+        for k in range(n, self.sizes[f]):
+            refs[k] = None
+        self.sizes[f] = n
+        self.times[f] = now
+        self.head = (self.head + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+
+    def _frame_at(self, t):
+        """Index of the newest frame shown at or before `t`, or None."""
+        n = len(self.times)
+        for k in range(1, self.count + 1):
+            i = (self.head - k) % n
+            if self.times[i] <= t:
+                return i
+        return None
+
+    def query_point(self, x, y, t, now):
+        """Return the enemy that was under (x, y) at time `t`, or None.
+
+        Only enemies that are still alive (same spawn uid, hp left after
+        the hits already queued this frame) count, and touches older than
+        max_rewind are not compensated at all.
+        """
+        self.taps += 1
+        rewind = now - t
+        if rewind <= 0.0:
+            return None
+        if rewind > self.max_rewind:
+            self.too_old += 1
+            return None
+        i = self._frame_at(t)
+        if i is None:
+            return None
+
+        refs = self.enemy[i]
+        uids = self.uid[i]
+        left = self.left[i]
+        top = self.top[i]
+        right = self.right[i]
+        bottom = self.bottom[i]
+        dist = self.dist[i]
+        best = None
+        best_dist = 0.0
+        for k in range(self.sizes[i]):
+            if left[k] <= x < right[k] and top[k] <= y < bottom[k]:
+                e = refs[k]
+                if e["uid"] != uids[k] or e["hp"] <= e["pending"]:
+                    continue
+                if best is None or dist[k] > best_dist:
+                    best = e
+                    best_dist = dist[k]
+        if best is None:
+            return None
+
+        self.compensated += 1
+        self.rewind_total += rewind
+        self.rewind_max = max(self.rewind_max, rewind)
+        self.rewind_hist[min(int(rewind * 100), self.HIST_BUCKETS - 1)] += 1
+        if not best["rect"].collidepoint(x, y):
+            self.rescued += 1
+        return best
+
+    def report(self):
+        if not self.compensated:
+            return "%d taps, none compensated" % self.taps
+        mean = self.rewind_total / self.compensated
+        target = 0.95 * self.compensated
+        seen = 0
+        p95 = 0
+        for bucket, n in enumerate(self.rewind_hist):
+            seen += n
+            if seen >= target:
+                p95 = (bucket + 1) * 10
+                break
+        return ("%d/%d taps rewound (mean %.0f ms, p95 <%d ms, max %.0f ms), "
+                "%d rescued, %d too old"
+                % (self.compensated, self.taps, mean * 1000.0, p95,
+                   self.rewind_max * 1000.0, self.rescued, self.too_old))
@@ -0,0 +1,77 @@
+# particles.py
+# Cosmetic particle effects (hit sparks, death bursts, tower muzzle flashes)
+# stored in NumPy arrays and advanced with one vectorised step per tick.
+
+import numpy as np
+import pygame
+
+
+class ParticleSystem:
+    """Fixed-capacity particle store.
+
+    Slots are handed out round-robin, so when the system is full a new
+    emission overwrites the oldest particles first. Nothing is allocated
+    per particle; update() is a handful of array operations and draw()
+    writes every live particle into the target surface in one batch.
+    """
+
+    def __init__(self, capacity=512, gravity=120.0, drag=3.0, seed=None):
+        self.capacity = capacity
+        self.gravity = gravity
+        self.drag = drag
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)     # seconds left; <= 0 is dead
+        self.color = np.zeros(capacity, dtype=np.uint32)     # surface-mapped pixel values
+        self.head = 0
+        self.rng = np.random.default_rng(seed)   # cosmetic only, kept off the game RNG
+
+    def clear(self):
+        self.life[:] = 0.0
+
+    def emit(self, x, y, count, speed, color, life=0.4):
+        """Spray `count` particles from (x, y) in random directions.
+        `color` is a pixel value from surface.map_rgb()."""
+        count = min(count, self.capacity)
+        idx = (self.head + np.arange(count)) % self.capacity
+        self.head = (self.head + count) % self.capacity
+
+        angle = self.rng.uniform(0.0, 2.0 * np.pi, count)
+        mag = self.rng.uniform(0.3, 1.0, count) * speed
+        self.pos[idx, 0] = x
+        self.pos[idx, 1] = y
+        self.vel[idx, 0] = np.cos(angle) * mag
+        self.vel[idx, 1] = np.sin(angle) * mag
+        self.life[idx] = self.rng.uniform(0.5, 1.0, count) * life
+        self.color[idx] = color
+
+    def update(self, dt):
+        live = self.life > 0.0
+        if not live.any():
+            return
+        self.vel *= max(0.0, 1.0 - self.drag * dt)
+        self.vel[:, 1] += self.gravity * dt
+        self.pos += self.vel * dt
+        self.life -= dt
+
+    def alive(self):
+        return int(np.count_nonzero(self.life > 0.0))
+
+    def draw(self, surface):
+        """Plot every live particle as a 2x2 block with one array write."""
+        live = np.flatnonzero(self.life > 0.0)
+        if live.size == 0:
+            return
+        w, h = surface.get_size()
+        xs = self.pos[live, 0].astype(np.intp)
+        ys = self.pos[live, 1].astype(np.intp)
+        inside = (xs >= 0) & (xs < w - 1) & (ys >= 0) & (ys < h - 1)
+        xs = xs[inside]
+        ys = ys[inside]
+        colors = self.color[live[inside]]
+        pixels = pygame.surfarray.pixels2d(surface)
+        pixels[xs, ys] = colors
+        pixels[xs + 1, ys] = colors
+        pixels[xs, ys + 1] = colors
+        pixels[xs + 1, ys + 1] = colors
+        del pixels   # unlock the surface
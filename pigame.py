@@ -1,4 +1,4 @@
-import pygame,pitft_touchscreen,os
+import pygame,pitft_touchscreen,os,time,gpio_input
 defaultrot = os.getenv('PIGAME_ROT') or '90'
 support_gpio = True
 envmk = ['PIGAME_V2','PIGAME_INVERTX','PIGAME_INVERTY','PIGAME_SWAPXY','PIGAME_BTN1','PIGAME_BTN2','PIGAME_BTN3','PIGAME_BTN4']
@@ -11,7 +11,7 @@ except ImportError:
     support_gpio = False
 from pygame.locals import *
 class PiTft:
-    def __init__(self,rotation:int=-1,v2:bool=False if env['PIGAME_V2']=='off' else True,allow_gpio:bool=True,invertx:bool=True if env['PIGAME_INVERTX']=='on' else False,inverty:bool=True if env['PIGAME_INVERTY']=='on' else False,swapxy:bool=True if env['PIGAME_SWAPXY']=='on' else False,buttons=[False if env['PIGAME_BTN1']=='off' else True,False if env['PIGAME_BTN2']=='off' else True,False if env['PIGAME_BTN3']=='off' else True,False if env['PIGAME_BTN4']=='off' else True]):
+    def __init__(self,rotation:int=-1,v2:bool=False if env['PIGAME_V2']=='off' else True,allow_gpio:bool=True,invertx:bool=True if env['PIGAME_INVERTX']=='on' else False,inverty:bool=True if env['PIGAME_INVERTY']=='on' else False,swapxy:bool=True if env['PIGAME_SWAPXY']=='on' else False,buttons=[False if env['PIGAME_BTN1']=='off' else True,False if env['PIGAME_BTN2']=='off' else True,False if env['PIGAME_BTN3']=='off' else True,False if env['PIGAME_BTN4']=='off' else True],panel_width:int=240,panel_height:int=320):
         self.use_gpio = support_gpio and allow_gpio and not (os.getenv('PIGAME_GPIO') == 'off')
         if not self.use_gpio:
             buttons=[False,False,False,False]
@@ -24,7 +24,10 @@ class PiTft:
         self.invertx = invertx
         self.inverty = inverty
         self.swapxy = swapxy
-        self.cachedpos = [0,0]
+        self.lastpos = {}      # per contact (slot, None for single-touch panels)
+        self.rawpos = (0,0)
+        self.batch = []
+        self.__compile_transform(rotation,panel_width,panel_height)
         self.__b1 = False
         self.__b2 = False
         self.__b3 = False
@@ -34,102 +37,123 @@ class PiTft:
         self.__pin3 = 23
         self.__pin4 = 27
         if self.use_gpio:
-            GPIO.setmode(GPIO.BCM)
+            # edge-interrupt, debounced buttons shared with the rest of the process
+            self.buttons = gpio_input.shared_input()
         if buttons[0]:
-            GPIO.setup(self.__pin1, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            self.buttons.add_button("pitft1", self.__pin1)
             self.__b1 = True
         if buttons[1]:
-            GPIO.setup(self.__pin2, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            self.buttons.add_button("pitft2", self.__pin2)
             self.__b2 = True
         if buttons[2]:
-            GPIO.setup(self.__pin3, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            self.buttons.add_button("pitft3", self.__pin3)
             self.__b3 = True
         if buttons[3]:
             if not v2:
                 self.__pin4 = 21
-            GPIO.setup(self.__pin4, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            self.buttons.add_button("pitft4", self.__pin4)
             self.__b4 = True
         self.pitft.start()
+    def __compile_transform(self,rotation,pw,ph):
+        """Fold rotation, inversion and axis swap into one affine map
+        x = ax*rx + bx*ry + cx, y = ay*rx + by*ry + cy from raw panel
+        coordinates (pw x ph, portrait) to screen coordinates."""
+        if rotation==0:
+            m=[1,0,0, 0,1,0]; w,h=pw,ph
+        elif rotation==90:
+            m=[0,1,0, -1,0,pw]; w,h=ph,pw
+        elif rotation==180:
+            m=[-1,0,pw, 0,-1,ph]; w,h=pw,ph
+        elif rotation==270:
+            m=[0,-1,ph, 1,0,0]; w,h=ph,pw
+        else:
+            raise ValueError("PiTft rotation must be 0, 90, 180 or 270, not %r" % (rotation,))
+        if self.invertx:
+            m[0:3]=[-m[0],-m[1],w-m[2]]
+        if self.inverty:
+            m[3:6]=[-m[3],-m[4],h-m[5]]
+        if self.swapxy:
+            m=m[3:6]+m[0:3]
+            w,h=h,w
+        self.ax,self.bx,self.cx,self.ay,self.by,self.cy=m
+        self.width,self.height=w,h
     def update(self):
         """Add Touchscreen Events to PyGame event queue."""
-        while not self.pitft.queue_empty():
-            for r in self.pitft.get_event():
-                e={"y":(r["x"] if r["x"] else self.cachedpos[0]),"x":(r["y"] if r["y"] else self.cachedpos[1])}
-                rel=(e["x"] - self.cachedpos[0],e["y"] - self.cachedpos[1])
-                self.cachedpos=(e["x"],e["y"])
-                if self.pitft.pigamerotr==90:
-                    e={"x":e["x"],"y":240-e["y"]}
-                    rel=(rel[0],240-rel[1])
-                elif self.pitft.pigamerotr==270:
-                    e={"x":320-e["x"],"y":e["y"]}
-                    rel=(320-rel[0],rel[1])
-                else:
-                    raise(Exception("PiTft rotation is unsupported"))
-                d={}
-                t=MOUSEBUTTONUP if r["touch"]==0 else (MOUSEMOTION if self.pitft.button_down else MOUSEBUTTONDOWN)
-                if self.invertx:
-                    e={"x":320-e["x"],"y":e["y"]}
-                    rel=(320-rel[0],rel[1])
-                if self.inverty:
-                    rel=(rel[0],240-rel[1])
-                    e={"y":240-e["y"],"x":e["x"]}
-                if self.swapxy:
-                    rel=(rel[1],rel[0])
-                    e={"x":e["y"],"y":e["x"]}
-                if t==MOUSEBUTTONDOWN:
-                    d["button"]=1
-                    d["pos"]=(e["x"],e["y"])
-                    self.pitft.button_down = True
-                    pygame.mouse.set_pos(e["x"],e["y"])
-                elif t==MOUSEBUTTONUP:
-                    self.pitft.button_down = False
-                    d["button"]=1
-                    d["pos"]=(e["x"],e["y"])
-                else:
-                    d["buttons"]=(True,False,False)
-                    d["rel"]=rel
-                    d["pos"]=(e["x"],e["y"])
-                    pygame.mouse.set_pos(e["x"],e["y"])
-                pe=pygame.event.Event(t,d)
-                pygame.event.post(pe)
+        ax,bx,cx,ay,by,cy=self.ax,self.bx,self.cx,self.ay,self.by,self.cy
+        for r in self.pitft.get_events(self.batch):
+            rx=r["x"] if r["x"] is not None else self.rawpos[0]
+            ry=r["y"] if r["y"] is not None else self.rawpos[1]
+            self.rawpos=(rx,ry)
+            x=ax*rx+bx*ry+cx
+            y=ay*rx+by*ry+cy
+            pos=(x,y)
+            slot=r.get("slot")
+            d={"pos":pos,"finger":slot,"timestamp":r["time"],"read_time":r.get("read_time"),"post_time":time.time()}
+            if slot is None:
+                # single-touch panel: press vs drag from our own button state
+                down=self.pitft.button_down
+                self.pitft.button_down=r["touch"]!=0
+            else:
+                down=r["motion"]
+            if r["touch"]==0:
+                t=MOUSEBUTTONUP
+                d["button"]=1
+                self.lastpos.pop(slot,None)
+            elif down:
+                t=MOUSEMOTION
+                last=self.lastpos.get(slot,pos)
+                d["buttons"]=(True,False,False)
+                d["rel"]=(x-last[0],y-last[1])
+                self.lastpos[slot]=pos
+            else:
+                t=MOUSEBUTTONDOWN
+                d["button"]=1
+                self.lastpos[slot]=pos
+            pygame.event.post(pygame.event.Event(t,d))
+        del self.batch[:]
     def __del__(self):
         """Cleaning up Touchscreen events and Threads when the Object destroyed."""
         self.pitft.stop()
         if self.use_gpio:
             GPIO.cleanup()
+    def __on_press(self,name,pin,callback):
+        # RPi.GPIO-style callback(channel) on press; debouncing is done by
+        # gpio_input, so the old bouncetime argument is no longer needed
+        if callback:
+            self.buttons.on(name,lambda n,pressed:callback(pin) if pressed else None)
     def Button1Interrupt(self,callback=None,bouncetime=200):
         """Calls callback if Button1 pressed."""
-        if self.__b1: 
-            GPIO.add_event_detect(self.__pin1,GPIO.FALLING,callback=callback,bouncetime=bouncetime)
+        if self.__b1:
+            self.__on_press("pitft1",self.__pin1,callback)
     def Button2Interrupt(self,callback=None,bouncetime=200):
         """Calls callback if Button2 pressed."""
-        if self.__b2: 
-            GPIO.add_event_detect(self.__pin2,GPIO.FALLING,callback=callback,bouncetime=bouncetime)
+        if self.__b2:
+            self.__on_press("pitft2",self.__pin2,callback)
     def Button3Interrupt(self,callback=None,bouncetime=200):
         """Calls callback if Button3 pressed."""
-        if self.__b3: 
-            GPIO.add_event_detect(self.__pin3,GPIO.FALLING,callback=callback,bouncetime=bouncetime)
+        if self.__b3:
+            self.__on_press("pitft3",self.__pin3,callback)
     def Button4Interrupt(self,callback=None,bouncetime=200):
         """Calls callback if Button4 pressed."""
-        if self.__b4: 
-            GPIO.add_event_detect(self.__pin4,GPIO.FALLING,callback=callback,bouncetime=bouncetime)
+        if self.__b4:
+            self.__on_press("pitft4",self.__pin4,callback)
     @property
     def Button1(self):
         """Equals True if Button 1 is pressed."""
         if self.__b1:
-            return not GPIO.input(self.__pin1)
+            return self.buttons.is_pressed("pitft1")
     @property
     def Button2(self):
         """Equals True if Button 2 is pressed."""
         if self.__b2:
-            return not GPIO.input(self.__pin2)
+            return self.buttons.is_pressed("pitft2")
     @property
     def Button3(self):
         """Equals True if Button 3 is pressed."""
         if self.__b3:
-            return not GPIO.input(self.__pin3)
+            return self.buttons.is_pressed("pitft3")
     @property
     def Button4(self):
         """Equals True if Button 4 is pressed."""
         if self.__b4:
-            return not GPIO.input(self.__pin4)
+            return self.buttons.is_pressed("pitft4")
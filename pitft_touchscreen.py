@@ -2,6 +2,9 @@
 #  piTFT touchscreen handling using evdev
 
 import os
+import selectors
+import struct
+import time
 
 try:
     import evdev
@@ -9,33 +12,189 @@ except ImportError:
     print("Evdev package is not installed.  Run 'pip3 install evdev' or 'pip install evdev' (Python 2.7) to install.")
     raise(ImportError("Evdev package not found."))
 import threading
-try:
-    # python 3.5+
-    import queue
-except ImportError:
-    # python 2.7
-    import Queue as queue
+
+
+# Bounded buffer between the evdev reader thread and the main loop
+class TouchRing(object):
+    """Fixed-size ring of touch events, drained by the consumer in one batch.
+
+    Consecutive motion reports are merged: a motion event that arrives while
+    the newest queued event is motion of the same contact replaces it, so a finger drag
+    costs one slot however long the main loop takes to come back. If the
+    ring still fills up, the oldest queued motion event is dropped to make
+    room (an incoming motion is dropped if there is none); a press or
+    release is only dropped, oldest first, when the ring holds nothing but
+    presses and releases. Every drop is counted in `dropped`.
+    """
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.head = 0          # index of the oldest event
+        self.count = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def put(self, event):
+        with self.lock:
+            if self.count and event.get('motion'):
+                last = (self.head + self.count - 1) % self.capacity
+                tail = self.slots[last]
+                if tail.get('motion') and tail.get('slot') == event.get('slot'):
+                    self.slots[last] = event
+                    self.coalesced += 1
+                    return
+            if self.count == self.capacity:
+                self.dropped += 1
+                if not self._drop_motion():
+                    if event.get('motion'):
+                        return
+                    self.slots[self.head] = None
+                    self.head = (self.head + 1) % self.capacity
+                    self.count -= 1
+            self.slots[(self.head + self.count) % self.capacity] = event
+            self.count += 1
+
+    def _drop_motion(self):
+        """Remove the oldest queued motion event; False if there is none.
+        Only runs on overflow, so the O(n) shift is off the common path."""
+        cap = self.capacity
+        for k in range(self.count):
+            if self.slots[(self.head + k) % cap].get('motion'):
+                # close the gap by moving the older events up one slot
+                for j in range(k, 0, -1):
+                    self.slots[(self.head + j) % cap] = self.slots[(self.head + j - 1) % cap]
+                self.slots[self.head] = None
+                self.head = (self.head + 1) % cap
+                self.count -= 1
+                return True
+        return False
+
+    def drain(self, out):
+        """Move every queued event, oldest first, onto the list `out`."""
+        with self.lock:
+            for k in range(self.count):
+                i = (self.head + k) % self.capacity
+                out.append(self.slots[i])
+                self.slots[i] = None
+            self.head = 0
+            self.count = 0
+        return out
+
+    def empty(self):
+        return self.count == 0
+
+
+# Raw `struct input_event` records as read from /dev/input/eventN, so a
+# stream captured with `cat /dev/input/touchscreen > touches.bin` can be
+# replayed as-is: timeval (sec, usec), type, code, value.
+INPUT_EVENT = struct.Struct("llHHi")
+
+
+def write_event_stream(filename, events):
+    """Write (timestamp, type, code, value) tuples as a raw evdev stream."""
+    with open(filename, "wb") as f:
+        for ts, etype, code, value in events:
+            sec = int(ts)
+            f.write(INPUT_EVENT.pack(sec, int(round((ts - sec) * 1e6)), etype, code, value))
+
+
+def synthetic_taps(taps=100, drag_steps=10, interval=0.1, x=120, y=160):
+    """Evdev events for `taps` single-finger taps, each dragged over
+    `drag_steps` motion reports, `interval` seconds apart."""
+    ec = evdev.ecodes
+    events = []
+    ts = 0.0
+    for n in range(taps):
+        events.append((ts, ec.EV_ABS, ec.ABS_MT_TRACKING_ID, n))
+        events.append((ts, ec.EV_ABS, ec.ABS_X, x))
+        events.append((ts, ec.EV_ABS, ec.ABS_Y, y))
+        events.append((ts, ec.EV_KEY, ec.BTN_TOUCH, 1))
+        events.append((ts, ec.EV_SYN, ec.SYN_REPORT, 0))
+        for step in range(drag_steps):
+            ts += 0.005
+            events.append((ts, ec.EV_ABS, ec.ABS_X, x + step))
+            events.append((ts, ec.EV_SYN, ec.SYN_REPORT, 0))
+        ts += 0.005
+        events.append((ts, ec.EV_ABS, ec.ABS_MT_TRACKING_ID, -1))
+        events.append((ts, ec.EV_KEY, ec.BTN_TOUCH, 0))
+        events.append((ts, ec.EV_SYN, ec.SYN_REPORT, 0))
+        ts += interval
+    return events
+
+
+MAX_SLOTS = 10     # multi-touch contacts tracked at once
+
+
+def synthetic_multitouch(taps=100, fingers=2, interval=0.1, x=60, y=160, spacing=60):
+    """Like synthetic_taps() but `fingers` contacts press and lift in the
+    same reports, using the multi-touch slot protocol."""
+    ec = evdev.ecodes
+    events = []
+    ts = 0.0
+    tracking = 0
+    for n in range(taps):
+        for f in range(fingers):
+            events.append((ts, ec.EV_ABS, ec.ABS_MT_SLOT, f))
+            events.append((ts, ec.EV_ABS, ec.ABS_MT_TRACKING_ID, tracking))
+            events.append((ts, ec.EV_ABS, ec.ABS_MT_POSITION_X, x + f * spacing))
+            events.append((ts, ec.EV_ABS, ec.ABS_MT_POSITION_Y, y))
+            tracking += 1
+        events.append((ts, ec.EV_KEY, ec.BTN_TOUCH, 1))
+        events.append((ts, ec.EV_SYN, ec.SYN_REPORT, 0))
+        ts += 0.03
+        for f in range(fingers):
+            events.append((ts, ec.EV_ABS, ec.ABS_MT_SLOT, f))
+            events.append((ts, ec.EV_ABS, ec.ABS_MT_TRACKING_ID, -1))
+        events.append((ts, ec.EV_KEY, ec.BTN_TOUCH, 0))
+        events.append((ts, ec.EV_SYN, ec.SYN_REPORT, 0))
+        ts += interval
+    return events
 
 
 # Class for handling events from piTFT
 class pitft_touchscreen(threading.Thread):
-    def __init__(self, device_path=os.getenv("PIGAME_TS") or "/dev/input/touchscreen", grab=False):
+    """Single reader thread. Waits in a selector (epoll on Linux) on the
+    device fd and a wakeup pipe, so stop() returns it promptly. With
+    `replay` (or $PIGAME_TS_REPLAY) set, events come from a raw evdev
+    stream file instead of the device; `realtime=False` feeds them as fast
+    as possible for benchmarking.
+
+    Panels that speak the multi-touch protocol (ABS_MT_SLOT/POSITION_*)
+    get one event per changed contact per report, tagged with its 'slot',
+    so simultaneous fingers press and release independently. Single-touch
+    panels, including ones that also send ABS_MT_TRACKING_ID, keep the
+    ABS_X/ABS_Y + BTN_TOUCH path."""
+    def __init__(self, device_path=os.getenv("PIGAME_TS") or "/dev/input/touchscreen", grab=False,
+                 replay=os.getenv("PIGAME_TS_REPLAY"), realtime=True):
         super(pitft_touchscreen, self).__init__()
+        self.daemon = True
         self.device_path = device_path
         self.grab = grab
-        self.events = queue.Queue()
+        self.replay = replay
+        self.realtime = realtime
+        self.events = TouchRing()
         self.shutdown = threading.Event()
+        self.wake_r, self.wake_w = os.pipe()
+        self.replayed = 0
+        self.event = None
+        self.dropping = False
+        self.mt = False
+        self.slot = 0
+        self.slots = [{'id': -1, 'x': None, 'y': None, 'changed': False,
+                       'began': False, 'ended': False} for _ in range(MAX_SLOTS)]
+        self.new_event()
 
     def run(self):
-        thread_process = threading.Thread(target=self.process_device)
-        # run thread as a daemon so it gets cleaned up on exit.
-        thread_process.daemon = True
-        thread_process.start()
-        self.shutdown.wait()
+        try:
+            if self.replay:
+                self.process_replay()
+            else:
+                self.process_device()
+        finally:
+            self.shutdown.set()
 
-    # thread function
-    def process_device(self):
-        device = None
+    def open_device(self):
         # if the path to device is not found, InputDevice raises an OSError
         # exception.  This will handle it and close thread.
         try:
@@ -47,59 +206,152 @@ class pitft_touchscreen(threading.Thread):
                       " message: {2}.".format(self.device_path,
                                               type(ex).__name__, str(ex))
             raise Exception(message)
-        finally:
-            if device is None:
-                self.shutdown.set()
-        # Loop for getting evdev events
-        event = {'time': None, 'id': None, 'x': None, 'y': None, 'touch': None}
-        dropping = False
-        while not self.shutdown.is_set():
-            for input_event in device.read_loop():
-                if input_event.type == evdev.ecodes.EV_ABS:
-                    if input_event.code == evdev.ecodes.ABS_X:
-                        event['x'] = input_event.value
-                    elif input_event.code == evdev.ecodes.ABS_Y:
-                        event['y'] = input_event.value
-                    elif input_event.code == evdev.ecodes.ABS_MT_TRACKING_ID:
-                        event['id'] = input_event.value
-                        if input_event.value == -1:
-                            event['x'] = None
-                            event['y'] = None
-                            event['touch'] = None
-                    elif input_event.code == evdev.ecodes.ABS_MT_POSITION_X:
-                        pass
-                    elif input_event.code == evdev.ecodes.ABS_MT_POSITION_Y:
+        return device
+
+    # thread function
+    def process_device(self):
+        device = self.open_device()
+        selector = selectors.DefaultSelector()
+        selector.register(device.fd, selectors.EVENT_READ, "device")
+        selector.register(self.wake_r, selectors.EVENT_READ, "wake")
+        try:
+            while not self.shutdown.is_set():
+                for key, _ in selector.select():
+                    if key.data == "wake":
+                        return
+                    try:
+                        for input_event in device.read():
+                            self.handle(input_event.type, input_event.code,
+                                        input_event.value, input_event.timestamp())
+                    except BlockingIOError:
                         pass
-                elif input_event.type == evdev.ecodes.EV_KEY:
-                    event['touch'] = input_event.value
-                elif input_event.type == evdev.ecodes.SYN_REPORT:
-                    if dropping:
-                        event['x'] = None
-                        event['y'] = None
-                        event['touch'] = None
-                        dropping = False
+        finally:
+            selector.close()
+            if self.grab:
+                device.ungrab()
+            device.close()
+
+    def process_replay(self):
+        """Feed a raw evdev stream file through the same parser. Timestamps
+        are shifted so the first event is 'now'; with realtime the original
+        spacing is kept."""
+        with open(self.replay, "rb") as f:
+            data = f.read()
+        start = time.time()
+        first = None
+        for sec, usec, etype, code, value in INPUT_EVENT.iter_unpack(data[:len(data) - len(data) % INPUT_EVENT.size]):
+            ts = sec + usec / 1e6
+            if first is None:
+                first = ts
+            ts = start + (ts - first)
+            if self.realtime:
+                delay = ts - time.time()
+                if delay > 0 and self.shutdown.wait(delay):
+                    return
+            elif self.shutdown.is_set():
+                return
+            self.handle(etype, code, value, ts)
+            self.replayed += 1
+
+    def new_event(self):
+        # the next report starts from the last published touch state
+        e = self.event
+        self.event = {'time': None, 'id': None, 'x': None, 'y': None, 'touch': None}
+        if e is not None:
+            self.event['x'] = e['x']
+            self.event['y'] = e['y']
+            self.event['id'] = e['id']
+            self.event['touch'] = e['touch']
+        self.key_seen = False
+
+    def handle(self, etype, code, value, timestamp):
+        """Parse one evdev event; a SYN_REPORT publishes the touch state."""
+        event = self.event
+        if etype == evdev.ecodes.EV_ABS:
+            if code == evdev.ecodes.ABS_X:
+                event['x'] = value
+            elif code == evdev.ecodes.ABS_Y:
+                event['y'] = value
+            elif code == evdev.ecodes.ABS_MT_SLOT:
+                self.mt = True
+                self.slot = value if 0 <= value < MAX_SLOTS else -1
+            elif code == evdev.ecodes.ABS_MT_TRACKING_ID:
+                event['id'] = value
+                if value == -1:
+                    event['x'] = None
+                    event['y'] = None
+                    event['touch'] = None
+                # TRACKING_ID alone doesn't mean slot mode: single-touch
+                # panels send it with ABS_X/ABS_Y (see synthetic_taps)
+                if self.slot >= 0:
+                    slot = self.slots[self.slot]
+                    if value == -1:
+                        slot['ended'] = slot['id'] != -1
                     else:
-                        event['time'] = input_event.timestamp()
-                        self.events.put(event)
-                        e = event
-                        event = {'x': e['x'], 'y': e['y']}
-                        try:
-                            event['id'] = e['id']
-                        except KeyError:
-                            event['id'] = None
-                        try:
-                            event['touch'] = e['touch']
-                        except KeyError:
-                            event['touch'] = None
-                elif input_event.type == evdev.ecodes.SYN_DROPPED:
-                    dropping = True
-        if self.grab:
-            device.ungrab()
+                        slot['id'] = value
+                        slot['began'] = True
+                    slot['changed'] = True
+            elif code == evdev.ecodes.ABS_MT_POSITION_X or code == evdev.ecodes.ABS_MT_POSITION_Y:
+                self.mt = True
+                if self.slot >= 0:
+                    slot = self.slots[self.slot]
+                    slot['x' if code == evdev.ecodes.ABS_MT_POSITION_X else 'y'] = value
+                    slot['changed'] = True
+        elif etype == evdev.ecodes.EV_KEY:
+            event['touch'] = value
+            self.key_seen = True
+        elif etype == evdev.ecodes.EV_SYN:
+            if code == evdev.ecodes.SYN_DROPPED:
+                self.dropping = True
+            elif code == evdev.ecodes.SYN_REPORT:
+                if self.dropping:
+                    event['x'] = None
+                    event['y'] = None
+                    event['touch'] = None
+                    self.dropping = False
+                    for slot in self.slots:
+                        slot['changed'] = slot['began'] = slot['ended'] = False
+                elif self.mt:
+                    self.publish_slots(timestamp)
+                    self.new_event()
+                else:
+                    event['time'] = timestamp
+                    event['read_time'] = time.time()
+                    # finger still down and no press/release in this report
+                    event['motion'] = event['touch'] == 1 and not self.key_seen
+                    self.events.put(event)
+                    self.new_event()
+
+    def publish_slots(self, timestamp):
+        """Queue a press, motion and/or release for every contact that
+        changed in this report. A release keeps the contact's last position."""
+        now = time.time()
+        for n, slot in enumerate(self.slots):
+            if not slot['changed']:
+                continue
+            if slot['began']:
+                self.events.put(self.slot_event(n, slot, 1, False, timestamp, now))
+            elif slot['id'] != -1 and not slot['ended']:
+                self.events.put(self.slot_event(n, slot, 1, True, timestamp, now))
+            if slot['ended']:
+                self.events.put(self.slot_event(n, slot, 0, False, timestamp, now))
+                slot['id'] = -1
+            slot['changed'] = slot['began'] = slot['ended'] = False
+
+    def slot_event(self, n, slot, touch, motion, timestamp, now):
+        return {'time': timestamp, 'read_time': now, 'id': slot['id'], 'slot': n,
+                'x': slot['x'], 'y': slot['y'], 'touch': touch, 'motion': motion}
+
+    def get_events(self, out):
+        """Append every pending event to `out` in one locked batch."""
+        return self.events.drain(out)
 
     def get_event(self):
-        if not self.events.empty():
-            event = self.events.get()
-            yield event
+        # one-at-a-time interface, kept for older callers
+        batch = self.events.drain([])
+        if batch:
+            for event in batch:
+                yield event
         else:
             yield None
 
@@ -107,7 +359,46 @@ class pitft_touchscreen(threading.Thread):
         return self.events.empty()
 
     def stop(self):
+        if self.shutdown.is_set():
+            return
         self.shutdown.set()
+        try:
+            os.write(self.wake_w, b"x")
+        except OSError:
+            pass
 
     def __del__(self):
-        self.shutdown.set()
+        self.stop()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+
+if __name__ == "__main__":
+    # Benchmark the parser + ring without hardware:
+    #   python3 pitft_touchscreen.py touches.bin     (or --synthetic N [FINGERS])
+    import sys
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "--synthetic":
+        filename = "/tmp/pitft_synthetic.bin"
+        fingers = int(sys.argv[3]) if len(sys.argv) == 4 else 1
+        if fingers > 1:
+            write_event_stream(filename, synthetic_multitouch(int(sys.argv[2]), fingers))
+        else:
+            write_event_stream(filename, synthetic_taps(int(sys.argv[2])))
+    elif len(sys.argv) == 2:
+        filename = sys.argv[1]
+    else:
+        print("usage: pitft_touchscreen.py FILE | --synthetic TAPS [FINGERS]")
+        sys.exit(2)
+    ts = pitft_touchscreen(replay=filename, realtime=False)
+    batch = []
+    delivered = 0
+    t0 = time.time()
+    ts.start()
+    while ts.is_alive() or not ts.queue_empty():
+        delivered += len(ts.get_events(batch))
+        del batch[:]
+        time.sleep(0.001)
+    elapsed = time.time() - t0
+    print("%d evdev events in %.3fs (%.0f/s), %d delivered, %d coalesced, %d dropped"
+          % (ts.replayed, elapsed, ts.replayed / max(elapsed, 1e-9), delivered,
+             ts.events.coalesced, ts.events.dropped))
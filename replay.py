@@ -0,0 +1,131 @@
+# replay.py
+# Compact binary round recording and deterministic playback.
+#
+# File layout (little-endian):
+#   header  "<4sBIBB"  magic b"TDRP", version, RNG seed, difficulty index, path index
+#   records, each starting with a one-byte tag:
+#     TAP     "<Bhh"   tap position handled this tick
+#     CMD     "<BBh"   voice command applied this tick
+#     FRAME   "<BH"    closes the tick: its dt in whole milliseconds
+#                      (clock.tick() returns ms, so playback dt is exact)
+#     END     "<BBhH"  result (0 none / 1 win / 2 lose), player HP, enemies spawned
+# A tap's timestamp is the sum of the FRAME dts before it.
+
+import os
+import struct
+import time
+
+MAGIC = b"TDRP"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBIBB")
+FRAME = struct.Struct("<BH")
+TAP = struct.Struct("<Bhh")
+CMD = struct.Struct("<BBh")
+END = struct.Struct("<BBhH")
+
+TAG_FRAME, TAG_TAP, TAG_CMD, TAG_END = 1, 2, 3, 4
+
+# voice command codes (see apply_voice_command in the game)
+CMD_START, CMD_PAUSE, CMD_RESUME, CMD_RESTART, CMD_EXIT = 1, 2, 3, 4, 5
+CMD_VOLUME, CMD_DIFFICULTY = 6, 7
+
+RESULT_CODES = {None: 0, "win": 1, "lose": 2}
+RESULT_NAMES = {v: k for k, v in RESULT_CODES.items()}
+
+
+class ReplayRecorder:
+    """Appends packed records to an in-memory buffer; written out once per round."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.buf = None
+
+    @property
+    def active(self):
+        return self.buf is not None
+
+    def begin(self, seed, difficulty, path):
+        self.buf = bytearray(HEADER.pack(MAGIC, VERSION, seed, difficulty, path))
+
+    def frame(self, dt):
+        if self.buf is not None:
+            self.buf += FRAME.pack(TAG_FRAME, min(65535, int(round(dt * 1000.0))))
+
+    def tap(self, pos):
+        if self.buf is not None:
+            self.buf += TAP.pack(TAG_TAP, pos[0], pos[1])
+
+    def command(self, code, value=0):
+        if self.buf is not None:
+            self.buf += CMD.pack(TAG_CMD, code, value)
+
+    def finish(self, result, player_hp, spawned):
+        """Close the round and write it to disk; returns the file name."""
+        if self.buf is None:
+            return None
+        self.buf += END.pack(TAG_END, RESULT_CODES.get(result, 0), player_hp, spawned)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            filename = os.path.join(
+                self.directory, "round-%s.tdr" % time.strftime("%Y%m%d-%H%M%S"))
+            with open(filename, "wb") as f:
+                f.write(self.buf)
+        except OSError as e:
+            print("[Replay] Failed to save replay:", e)
+            filename = None
+        self.buf = None
+        return filename
+
+
+class ReplayPlayer:
+    """Walks a recorded round frame by frame."""
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self.data = f.read()
+        magic, version, self.seed, self.difficulty, self.path = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a v%d replay file" % (filename, VERSION))
+        self.offset = HEADER.size
+        self.frames = 0
+        # expected outcome, filled in when the END record is reached
+        self.result = None
+        self.player_hp = None
+        self.spawned = None
+        self.finished = False
+
+    def next_frame(self, taps, commands):
+        """Read one tick. Fills `taps` with positions and `commands` with
+        (code, value) pairs and returns its dt, or None at the end."""
+        data = self.data
+        while self.offset < len(data):
+            tag = data[self.offset]
+            if tag == TAG_TAP:
+                _, x, y = TAP.unpack_from(data, self.offset)
+                taps.append((x, y))
+                self.offset += TAP.size
+            elif tag == TAG_CMD:
+                _, code, value = CMD.unpack_from(data, self.offset)
+                commands.append((code, value))
+                self.offset += CMD.size
+            elif tag == TAG_FRAME:
+                _, dt_ms = FRAME.unpack_from(data, self.offset)
+                self.offset += FRAME.size
+                self.frames += 1
+                return dt_ms / 1000.0
+            elif tag == TAG_END:
+                self._read_end()
+                return None
+            else:
+                raise ValueError("corrupt replay record at byte %d" % self.offset)
+        self.finished = True
+        return None
+
+    def _read_end(self):
+        _, result, self.player_hp, self.spawned = END.unpack_from(self.data, self.offset)
+        self.result = RESULT_NAMES.get(result)
+        self.offset = len(self.data)
+        self.finished = True
+        return None
@@ -0,0 +1,136 @@
+# spatial_grid.py
+# Uniform-grid spatial hash over the playfield, used for tap hit-testing.
+
+
+class EnemyGrid:
+    """Buckets enemies into fixed-size cells so a point lookup only has to
+    look at the handful of enemies sharing the touched cell.
+
+    Enemies are the game's plain dicts; the grid reads e["rect"] for bounds,
+    e["hp"] to skip dead ones and e["dist"] (distance travelled along the
+    path) to pick a winner when sprites overlap. Point lookups also count
+    e["pending"], tap hits queued this frame but not applied yet.
+    """
+
+    def __init__(self, width, height, cell_size=40):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = (width + cell_size - 1) // cell_size
+        self.rows = (height + cell_size - 1) // cell_size
+        # flat row-major list of buckets, reused across rebuilds; a bucket
+        # holds sizes[idx] enemies and is overwritten rather than emptied,
+        # since emptying a list frees its storage
+        ncells = self.cols * self.rows
+        self.cells = [[] for _ in range(ncells)]
+        self.sizes = [0] * ncells
+        self._used = [0] * ncells
+        self._nused = 0
+
+    def clear(self):
+        sizes = self.sizes
+        used = self._used
+        for k in range(self._nused):
+            sizes[used[k]] = 0
+        self._nused = 0
+
+    def insert(self, enemy):
+        """Add one enemy to every cell its rect overlaps (clipped to the field)."""
+        r = enemy["rect"]
+        cs = self.cell_size
+        c0 = max(0, r.left // cs)
+        c1 = min(self.cols - 1, (r.right - 1) // cs)
+        r0 = max(0, r.top // cs)
+        r1 = min(self.rows - 1, (r.bottom - 1) // cs)
+        for row in range(r0, r1 + 1):
+            base = row * self.cols
+            for col in range(c0, c1 + 1):
+                idx = base + col
+                cell = self.cells[idx]
+                n = self.sizes[idx]
+                if n == 0:
+                    self._used[self._nused] = idx
+                    self._nused += 1
+                if n < len(cell):
+                    cell[n] = enemy
+                else:
+                    cell.append(enemy)
+                self.sizes[idx] = n + 1
+
+    def rebuild(self, enemies):
+        """Re-bucket every enemy; call once per tick after they have moved."""
+        self.clear()
+        for e in enemies:
+            self.insert(e)
+
+    def query_point(self, x, y):
+        """Return the live enemy under (x, y), or None.
+
+        When several overlap, the one furthest along the path wins since it
+        is the closest to escaping. An enemy whose queued hits already use
+        up its hp counts as dead, so the next tap goes to the one below.
+        """
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return None
+        cs = self.cell_size
+        idx = (y // cs) * self.cols + (x // cs)
+        cell = self.cells[idx]
+        best = None
+        for k in range(self.sizes[idx]):
+            e = cell[k]
+            if e["hp"] <= e["pending"] or not e["rect"].collidepoint(x, y):
+                continue
+            if best is None or e["dist"] > best["dist"]:
+                best = e
+        return best
+
+    def queue_hit(self, x, y):
+        """query_point(), then count one pending hit on the enemy found.
+        The caller applies the damage later and resets e["pending"]."""
+        e = self.query_point(x, y)
+        if e is not None:
+            e["pending"] += 1
+        return e
+
+    def query_radius(self, x, y, radius, policy="first"):
+        """Return the live enemy whose centre is within `radius` of (x, y)
+        that ranks highest under `policy`, or None.
+
+        "first" prefers the enemy furthest along the path, "strongest" the
+        one with the most HP and "nearest" the closest one. Only the cells
+        under the circle's bounding box are scanned.
+        """
+        cs = self.cell_size
+        c0 = max(0, int(x - radius) // cs)
+        c1 = min(self.cols - 1, int(x + radius) // cs)
+        r0 = max(0, int(y - radius) // cs)
+        r1 = min(self.rows - 1, int(y + radius) // cs)
+        r2 = radius * radius
+        best = None
+        best_key = 0.0
+        for row in range(r0, r1 + 1):
+            base = row * self.cols
+            for col in range(c0, c1 + 1):
+                # an enemy spanning several cells is seen more than once;
+                # that only repeats a comparison, it never changes the winner
+                cell = self.cells[base + col]
+                for k in range(self.sizes[base + col]):
+                    e = cell[k]
+                    if e["hp"] <= 0:
+                        continue
+                    r = e["rect"]
+                    dx = r.centerx - x
+                    dy = r.centery - y
+                    d2 = dx*dx + dy*dy
+                    if d2 > r2:
+                        continue
+                    if policy == "first":
+                        key = e["dist"]
+                    elif policy == "strongest":
+                        key = e["hp"]
+                    else:
+                        key = -d2
+                    if best is None or key > best_key:
+                        best = e
+                        best_key = key
+        return best
@@ -1,10 +1,22 @@
 # game.py
 # mw2335-fw292 – Z-path tap defense with menu / pause / game-over (pygame 1.9.6)
 
-import os, time, sys, random, math
-import pygame, pigame
+import os, time, sys, random, math, argparse, threading
+import pygame
 from pygame.locals import *
 from game_state import api
+from spatial_grid import EnemyGrid
+from enemy_pool import EnemyPool
+from wave_scheduler import WaveScheduler, load_waves, default_wave
+from game_rules import (SCREEN_SIZE, ENEMY_W, ENEMY_H, SPAWN_INTERVAL,
+                        DIFFICULTY_SETTINGS, ENEMY_TYPES, build_path_sets,
+                        distance_to_path)
+import towers
+from particles import ParticleSystem
+from lag_compensation import PositionHistory
+from touch_latency import LatencyTracker
+import replay
+from gpio_input import shared_input
 
 try:
     import RPi.GPIO as GPIO
@@ -17,16 +29,51 @@ except (ImportError, RuntimeError):
 DEVICE_PITFT = True
 TIMEOUT_SEC  = 0      # 0 = no auto-timeout
 BAILOUT_PIN  = 27
-
-# PiTFT display settings 
-os.putenv('SDL_VIDEODRIVER', 'fbcon')
-os.putenv('SDL_VIDEODRV',  'fbcon')
-os.putenv('SDL_FBDEV',     '/dev/fb1')
-os.putenv('SDL_MOUSEDRV',  'dummy')
-os.putenv('SDL_MOUSEDEV',  '/dev/null')
-os.putenv('DISPLAY',       '')
-
-SCREEN_SIZE = (320, 240)
+REPLAY_DIR   = "./replays"   # every finished round is recorded here (not under --autoplay)
+
+parser = argparse.ArgumentParser(description="Tap Defense")
+parser.add_argument("--replay", metavar="FILE",
+                    help="play back a recorded round instead of live input")
+parser.add_argument("--fast", action="store_true",
+                    help="with --replay: run unthrottled and skip drawing")
+parser.add_argument("--headless", action="store_true",
+                    help="SDL dummy video/audio drivers and no PiTFT (CI, soak runs)")
+parser.add_argument("--autoplay", action="store_true",
+                    help="let the scripted autoplayer play (see autoplayer.py)")
+parser.add_argument("--accuracy", type=float, default=0.8,
+                    help="autoplayer: chance an aimed tap hits")
+parser.add_argument("--tap-rate", type=float, default=3.0,
+                    help="autoplayer: taps per second")
+parser.add_argument("--latency-ms", type=float, nargs=2, default=[180.0, 60.0],
+                    metavar=("MEAN", "SD"), help="autoplayer: tap latency model")
+parser.add_argument("--voice-interval", type=float, default=15.0,
+                    help="autoplayer: seconds between voice commands (0 = none)")
+parser.add_argument("--record", action="store_true",
+                    help="autoplayer: record a replay of every round anyway")
+parser.add_argument("--soak-minutes", type=float, default=0,
+                    help="autoplayer: stop after this many minutes (0 = run until quit)")
+parser.add_argument("--soak-report", default="./soak_report.txt",
+                    help="autoplayer: where to write the soak report")
+parser.add_argument("--lag-comp-ms", type=float, default=250.0,
+                    help="hit-test taps against enemy positions up to this old (0 = off)")
+parser.add_argument("--touch-latency", metavar="FILE",
+                    help="write per-stage touch-to-photon latency histograms here on exit")
+ARGS = parser.parse_args()
+# a soak run finishes a round every minute or two; don't fill the disk with them
+RECORD_ROUNDS = not ARGS.replay and (ARGS.record or not ARGS.autoplay)
+
+if ARGS.headless:
+    DEVICE_PITFT = False
+    os.putenv('SDL_VIDEODRIVER', 'dummy')
+    os.putenv('SDL_AUDIODRIVER', 'dummy')
+else:
+    # PiTFT display settings 
+    os.putenv('SDL_VIDEODRIVER', 'fbcon')
+    os.putenv('SDL_VIDEODRV',  'fbcon')
+    os.putenv('SDL_FBDEV',     '/dev/fb1')
+    os.putenv('SDL_MOUSEDRV',  'dummy')
+    os.putenv('SDL_MOUSEDEV',  '/dev/null')
+    os.putenv('DISPLAY',       '')
 
 pygame.display.init()
 pygame.font.init()
@@ -50,7 +97,11 @@ try:
 except Exception as e:
     print("Failed to load click sound:", e)
 
-pitft = pigame.PiTft() if DEVICE_PITFT else None
+if DEVICE_PITFT:
+    import pigame   # needs evdev, so only imported when the PiTFT is used
+    pitft = pigame.PiTft()
+else:
+    pitft = None
 flags = pygame.FULLSCREEN if DEVICE_PITFT else 0
 screen = pygame.display.set_mode(SCREEN_SIZE, flags)
 
@@ -76,9 +127,13 @@ pause_font = pygame.font.Font(None, 28)
 pygame.mouse.set_visible(True)
 clock = pygame.time.Clock()
 
+# bail-out button: edge interrupt sets a flag, nothing polls the pin
+bailout_pressed = threading.Event()
+gpio_buttons = None
 if ON_RPI:
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(BAILOUT_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    gpio_buttons = shared_input()
+    gpio_buttons.add_button("bailout", BAILOUT_PIN)
+    gpio_buttons.on("bailout", lambda name, pressed: pressed and bailout_pressed.set())
 
 running = True
 start_time = time.time()
@@ -122,22 +177,36 @@ pause_btn_rect    = pygame.Rect(W//2 - 30, 5, 60, 24)
 pause_resume_rect = pygame.Rect(W//2 - 50, H//2 - 35, 120, 50)
 pause_menu_rect   = pygame.Rect(W//2 - 60, H//2 + 30, 140, 50)
 
+# Tower build button (bottom right during play)
+build_btn_rect    = pygame.Rect(W - 74, H - 30, 68, 24)
+
 # Game-over buttons
 go_restart_rect   = pygame.Rect(W//2 - 60, H//2-15,      120, 35)
 go_menu_rect      = pygame.Rect(W//2 - 60, H//2 + 30, 120, 35)
 go_exit_rect      = pygame.Rect(W//2 - 60, H//2 + 80, 120, 35)
 
 # ---------------- Enemy & Path Configuration ----------------
-ENEMY_W, ENEMY_H = 40, 24
 INIT_HP          = 5
 ENEMY_SPEED      = 30.0
-SPAWN_INTERVAL   = 2.0
 MAX_ENEMIES      = 7
 ENEMY_SPAWNED    = 0
 
+# Optional wave files: ./waves/<difficulty>.json (see wave_scheduler.py).
+# Difficulties without a file use MAX_ENEMIES every SPAWN_INTERVAL.
+# waves/example_mixed.json is a sample and is never loaded on its own.
+
 # Player HP
 PLAYER_HP        = 3
 
+# ---------------- Tower Configuration ----------------
+START_GOLD       = 40
+TOWER_COST       = 20
+KILL_REWARD      = 5
+TOWER_RADIUS     = 9       # drawn size; also the tap target for re-targeting
+TOWER_PATH_CLEAR = 18      # towers can't sit closer than this to a path
+gold             = START_GOLD
+build_mode       = False   # next tap on empty ground places a tower
+
 # Z-shaped path
 PATH_POINTS = [
 
@@ -147,68 +216,7 @@ PATH_SETS = {}
 def build_paths():
     """Build two candidate paths for each difficulty level."""
     global PATH_SETS
-
-    mid_y  = H // 2
-    top_y  = 50
-    bot_y  = H - 80
-
-    PATH_SETS = {
-    # EASY
-    "easy": [
-        [
-            (-ENEMY_W, mid_y),
-            (W + ENEMY_W, mid_y),
-        ],
-        [
-            (-ENEMY_W, top_y),
-            (W // 2, bot_y),
-            (W + ENEMY_W, bot_y - 10),
-        ],
-    ],
-
-    # NORMAL
-    "normal": [
-        [
-            (-ENEMY_W, 80),
-            (W - 40, 80),
-            (40, 170),
-            (W + ENEMY_W, 170),
-        ],
-        [
-            (-ENEMY_W,110),
-            (W // 4, 70),
-            (W // 2, 150),
-            (3 * W // 4, 90),
-            (W + ENEMY_W, 170),
-        ],
-    ],
-
-    # HARD
-    "hard": [
-    
-        [
-        (-ENEMY_W, 60),
-        (W // 6, 60),      
-        (W // 3, 200),     
-        (W // 2, 80),      
-        (2 * W // 3, 210), 
-        (5 * W // 6, 90),  
-        (W + ENEMY_W, 170) 
-        ],
-    
-        [
-        (-ENEMY_W, 50),
-        (W // 5, 210),     
-        (2 * W // 5, 70),  
-        (3 * W // 5, 200), 
-        (4 * W // 5, 80),  
-        (W + ENEMY_W, 160) 
-        ],
-    ],
-}
-
-
-    
+    PATH_SETS = build_path_sets(W, H, ENEMY_W)
 
 def choose_path_for_current_difficulty():
     """Randomly choose one of the two paths for the current difficulty."""
@@ -216,122 +224,153 @@ def choose_path_for_current_difficulty():
     diff = DIFFICULTY_LEVELS[difficulty_index]
     PATH_POINTS = random.choice(PATH_SETS[diff])
 
-enemies = []
-last_spawn_time = start_time
+enemy_pool = EnemyPool(MAX_ENEMIES, ENEMY_W, ENEMY_H)
+enemies = enemy_pool.active      # same list object for the whole run
+enemy_grid = EnemyGrid(W, H)
+wave = WaveScheduler([], SPAWN_INTERVAL)
+round_time = 0.0                 # play time since round start (excludes pauses)
+ROUND_PATHS = []                 # every path used by the current round's wave
+ROUND_DIFFICULTY = DIFFICULTY_LEVELS[difficulty_index]  # fixed at round start
+tower_list = []
+projectiles = towers.ProjectilePool()
+particles = ParticleSystem(capacity=512)
+touch_history = PositionHistory(max_rewind=ARGS.lag_comp_ms / 1000.0)
+touch_latency = LatencyTracker()
+tap_hits = []          # enemies tapped this frame, damaged together by apply_tap_hits()
+next_enemy_uid = 0
+recorder = replay.ReplayRecorder(REPLAY_DIR)
+replay_player = replay.ReplayPlayer(ARGS.replay) if ARGS.replay else None
 build_paths()
+WAVES = load_waves(PATH_SETS, ENEMY_TYPES)
 choose_path_for_current_difficulty()
 
 # Difficulty affects enemy speed / HP / count
 def apply_difficulty():
-    global ENEMY_SPEED, INIT_HP, MAX_ENEMIES, PATH_POINTS,PLAYER_HP
-    diff = DIFFICULTY_LEVELS[difficulty_index]
-    if diff == "easy":
-        ENEMY_SPEED = 25.0
-        INIT_HP     = 3
-        MAX_ENEMIES = 5
-        PLAYER_HP   = 7
-
-    elif diff == "normal":
-        ENEMY_SPEED = 30.0
-        INIT_HP     = 6
-        MAX_ENEMIES = 8
-        PLAYER_HP   = 5
-
-    else:  # hard
-        ENEMY_SPEED = 60.0
-        INIT_HP     = 9
-        MAX_ENEMIES = 12
-        PLAYER_HP   = 3
-  
+    global ENEMY_SPEED, INIT_HP, MAX_ENEMIES, PLAYER_HP
+    cfg = DIFFICULTY_SETTINGS[DIFFICULTY_LEVELS[difficulty_index]]
+    ENEMY_SPEED = cfg["ENEMY_SPEED"]
+    INIT_HP     = cfg["INIT_HP"]
+    MAX_ENEMIES = cfg["MAX_ENEMIES"]
+    PLAYER_HP   = cfg["PLAYER_HP"]
+
 
 def reset_round():
     """Reset all per-round variables and start playing."""
-    global enemies, ENEMY_SPAWNED, PLAYER_HP
-    global last_spawn_time, game_state, game_result
+    global ENEMY_SPAWNED, PLAYER_HP, MAX_ENEMIES, ROUND_PATHS, ROUND_DIFFICULTY
+    global wave, round_time, game_state, game_result, gold, build_mode
 
     apply_difficulty()
+    # a fresh seed per round makes it reproducible from its replay;
+    # during playback the seed comes from the replay file instead
+    if replay_player is None:
+        seed = random.getrandbits(32)
+        random.seed(seed)
     choose_path_for_current_difficulty()
-    enemies = []
+
+    diff = ROUND_DIFFICULTY = DIFFICULTY_LEVELS[difficulty_index]
+    events = WAVES.get(diff) or default_wave(MAX_ENEMIES, SPAWN_INTERVAL)
+    wave = WaveScheduler(events, SPAWN_INTERVAL)
+    MAX_ENEMIES = wave.total
+    ROUND_PATHS = [PATH_POINTS]
+    for ev in events:
+        if ev["path"] is not None:
+            p = PATH_SETS[diff][ev["path"]]
+            if p not in ROUND_PATHS:
+                ROUND_PATHS.append(p)
+
+    enemy_pool.release_all()
+    enemy_pool.reserve(MAX_ENEMIES)
+    touch_history.reserve(MAX_ENEMIES)
+    enemy_grid.clear()
     ENEMY_SPAWNED = 0
+    del tower_list[:]
+    projectiles.clear()
+    particles.clear()
+    touch_history.clear()
+    del tap_hits[:]
+    gold = START_GOLD
+    build_mode = False
     
-    last_spawn_time = time.time()
+    round_time = 0.0
     game_result = None
     game_state = STATE_PLAYING
+    if RECORD_ROUNDS:
+        recorder.begin(seed, difficulty_index, PATH_SETS[diff].index(PATH_POINTS))
     hide_quit_bar()
 
-def spawn_enemy():
-    global ENEMY_SPAWNED
-    sx, sy = PATH_POINTS[0]
-    rect = pygame.Rect(int(sx), int(sy) - ENEMY_H//2, ENEMY_W, ENEMY_H)
-    enemy = {
-        "rect": rect,
-        "hp": INIT_HP,
-        "x": float(sx),
-        "y": float(sy),
-        "speed": ENEMY_SPEED,
-        "seg_idx": 0
-    }
-    enemies.append(enemy)
-    ENEMY_SPAWNED += 1
-
-def advance_along_path(enemy, dt):
-    """Move an enemy along the Z-shaped polyline path."""
-    while dt > 0 and enemy["seg_idx"] < len(PATH_POINTS) - 1:
-        sx, sy = enemy["x"], enemy["y"]
-        tx, ty = PATH_POINTS[enemy["seg_idx"] + 1]
-
-        dx = tx - sx
-        dy = ty - sy
-        dist = (dx*dx + dy*dy) ** 0.5
-
-        if dist == 0:
-            enemy["seg_idx"] += 1
-            continue
-
-        max_move = enemy["speed"] * dt
-
-        if max_move >= dist:
-            enemy["x"], enemy["y"] = float(tx), float(ty)
-            enemy["seg_idx"] += 1
-            dt -= dist / enemy["speed"]
-        else:
-            ratio = max_move / dist
-            enemy["x"] = sx + dx * ratio
-            enemy["y"] = sy + dy * ratio
-            dt = 0
+def spawn_enemy(entry=None):
+    """Spawn one enemy for a wave entry; type/path default to the round's."""
+    global ENEMY_SPAWNED, next_enemy_uid
+    etype = entry and entry["type"]
+    path_idx = entry and entry["path"]
+    # not difficulty_index: a mid-round SetDifficulty must not switch the
+    # wave onto paths that ROUND_PATHS never drew
+    diff = ROUND_DIFFICULTY
+    path = PATH_POINTS if path_idx is None else PATH_SETS[diff][path_idx]
+    if etype is None:
+        etype = diff
+        hp, speed = INIT_HP, ENEMY_SPEED
+    else:
+        hp, speed = ENEMY_TYPES[etype]["hp"], ENEMY_TYPES[etype]["speed"]
 
-    enemy["rect"].x = int(enemy["x"])
-    enemy["rect"].y = int(enemy["y"] - ENEMY_H // 2)
+    if enemy_pool.spawn(path, etype, hp, speed, next_enemy_uid + 1) is None:
+        return
+    next_enemy_uid += 1
+    ENEMY_SPAWNED += 1
 
 def update_enemies(dt):
-    """Update movement, remove dead/out-of-bound enemies, subtract player HP."""
-    global enemies, PLAYER_HP
-
-    alive = []
-    for e in enemies:
-        advance_along_path(e, dt)
-
-        escaped = (
-            e["seg_idx"] >= len(PATH_POINTS) - 1 and
-            e["x"] >= PATH_POINTS[-1][0]
-        )
+    """Update movement, remove dead/out-of-bound enemies, subtract player HP.
 
-        if escaped:
-            PLAYER_HP -= 1
-            continue
+    EnemyPool.update() compacts `enemies` in place and hands removed ones
+    back to the pool, so a steady-state tick allocates nothing.
+    """
+    global PLAYER_HP
 
-        if e["hp"] > 0:
-            alive.append(e)
+    PLAYER_HP -= enemy_pool.update(dt)
+    enemy_grid.rebuild(enemies)
 
-    enemies = alive
+def damage_enemy(e, amount):
+    """Apply tap or tower damage; a kill pays out gold."""
+    global gold
+    if e["hp"] <= 0:
+        return
+    e["hp"] -= amount
+    cx, cy = e["rect"].center
+    if e["hp"] <= 0:
+        gold += KILL_REWARD
+        particles.emit(cx, cy, 40, 140.0, FX_BURST_COLOR, life=0.7)
+    else:
+        particles.emit(cx, cy, 8, 90.0, FX_SPARK_COLOR, life=0.3)
+
+def tower_fired(t):
+    particles.emit(t["x"], t["y"], 4, 60.0, FX_MUZZLE_COLOR, life=0.15)
+
+def can_place_tower(pos):
+    x, y = pos
+    if y < 30 or build_btn_rect.collidepoint(pos):
+        return False
+    for path in ROUND_PATHS:
+        if distance_to_path(x, y, path) < TOWER_PATH_CLEAR:
+            return False
+    for t in tower_list:
+        if (t["x"] - x) ** 2 + (t["y"] - y) ** 2 < (2 * TOWER_RADIUS) ** 2:
+            return False
+    return True
+
+def tower_at(pos):
+    for t in tower_list:
+        if (t["x"] - pos[0]) ** 2 + (t["y"] - pos[1]) ** 2 <= TOWER_RADIUS ** 2:
+            return t
+    return None
+
+def update_towers(dt):
+    """Fire towers at targets from the freshly rebuilt grid, move shots."""
+    towers.update_towers(tower_list, enemy_grid, projectiles, dt, tower_fired)
+    projectiles.update(dt, damage_enemy)
 
 def maybe_spawn_enemy(now):
-    global last_spawn_time
-    if ENEMY_SPAWNED >= MAX_ENEMIES:
-        return
-    if now - last_spawn_time >= SPAWN_INTERVAL:
-        spawn_enemy()
-        last_spawn_time = now
+    """Spawn whatever the wave has due by `now` (round play time)."""
+    wave.poll(now, spawn_enemy)
 
 
 # ---------------- Load Tiled Pixel Background ----------------
@@ -419,8 +458,12 @@ load_enemy_sprites()
 
 
 # ---------------- Drawing helpers ----------------
-def draw_path():
-    pts = [(float(x), float(y)) for (x, y) in PATH_POINTS]
+def draw_paths():
+    for path in ROUND_PATHS:
+        draw_path(path)
+
+def draw_path(points):
+    pts = [(float(x), float(y)) for (x, y) in points]
     if len(pts) < 2:
         return
 
@@ -513,16 +556,15 @@ def draw_chatbot_indicator(dt):
 
 def draw_enemy_and_ui():
     # Enemies and path
-    draw_path()
+    draw_paths()
     for e in enemies:
         hp = e["hp"]
         rect = e["rect"]
-        ratio = max(0.0, min(1.0, float(hp) / INIT_HP))
+        ratio = max(0.0, min(1.0, float(hp) / e["max_hp"]))
         color = (255, int(120 * ratio), int(80 * ratio))
 
         
-        current_diff = DIFFICULTY_LEVELS[difficulty_index]
-        enemy_img = ENEMY_SPRITES[current_diff]
+        enemy_img = ENEMY_SPRITES[e["type"]]
 
         if enemy_img:
             img_rect = enemy_img.get_rect(center=rect.center)
@@ -535,11 +577,23 @@ def draw_enemy_and_ui():
         hp_txt = small_font.render(str(hp), True, (255, 255, 255))
         hp_rect = hp_txt.get_rect(center=(rect.centerx, rect.top - 8))
         screen.blit(hp_txt, hp_rect)
+
+    draw_towers()
+
     # Remaining enemies
     remaining = max(0, MAX_ENEMIES - ENEMY_SPAWNED)
     rem_txt = small_font.render("Enemies left: %d" % remaining,
                                 True, (255, 255, 0))
     screen.blit(rem_txt, (5, 5))
+    gold_txt = small_font.render("Gold: %d" % gold, True, (255, 215, 0))
+    screen.blit(gold_txt, (5, 20))
+
+    # Build button
+    can_afford = gold >= TOWER_COST
+    btn_color = (40, 140, 200) if build_mode else ((60, 90, 60) if can_afford else (70, 70, 70))
+    pygame.draw.rect(screen, btn_color, build_btn_rect)
+    b_txt = small_font.render("Tower %d" % TOWER_COST, True, (255, 255, 255))
+    screen.blit(b_txt, b_txt.get_rect(center=build_btn_rect.center))
 
     # Player HP (right top)
     if HEART_IMG:
@@ -559,6 +613,27 @@ def draw_enemy_and_ui():
     pygame.draw.rect(screen, (220, 220, 220),
                      (x0 + w0 - 18, y0 + 4, 8, h0 - 8))
 
+POLICY_LABELS = {p: small_font.render(p[0].upper(), True, (0, 0, 0))
+                 for p in towers.TARGET_POLICIES}
+
+# particle colours, pre-mapped to the screen's pixel format
+FX_SPARK_COLOR  = screen.map_rgb((255, 230, 120))
+FX_BURST_COLOR  = screen.map_rgb((255, 110, 60))
+FX_MUZZLE_COLOR = screen.map_rgb((150, 220, 255))
+
+def draw_towers():
+    for t in tower_list:
+        center = (int(t["x"]), int(t["y"]))
+        if build_mode:
+            pygame.draw.circle(screen, (90, 90, 140), center, int(t["range"]), 1)
+        pygame.draw.circle(screen, (120, 200, 255), center, TOWER_RADIUS)
+        label = POLICY_LABELS[t["policy"]]
+        screen.blit(label, label.get_rect(center=center))
+    xs, ys = projectiles.x, projectiles.y
+    for i in range(projectiles.count):
+        pygame.draw.circle(screen, (255, 255, 120), (int(xs[i]), int(ys[i])), 2)
+    particles.draw(screen)
+
 def draw_menu():
     if MENU_BG_SURF:
         screen.blit(MENU_BG_SURF, (0, 0))
@@ -619,6 +694,7 @@ def draw_how_to_overlay():
         "you lose 1 HP.",
         "Lose all HP = Game Over.",
         "Pause with the button on top.",
+        "Tower button, then tap to build.",
         "Tap anywhere to close."
         
     ]
@@ -690,6 +766,42 @@ def draw_game_over():
     pygame.display.flip()
 
 # ---------------- Input handlers ----------------
+def compensate_tap(pos, touch_time):
+    """Move a tap onto the enemy it hit in the frame that was on screen when
+    the finger landed. The adjusted position is what gets recorded, so
+    replays stay deterministic without carrying timestamps."""
+    if ARGS.lag_comp_ms <= 0:
+        return pos
+    if pause_btn_rect.collidepoint(pos) or build_btn_rect.collidepoint(pos):
+        return pos
+    e = touch_history.query_point(pos[0], pos[1], touch_time, time.time())
+    if e is None:
+        return pos
+    r = e["rect"]
+    if r.collidepoint(pos):
+        return pos
+    # nearest on-screen point to the enemy's centre
+    x0, x1 = max(r.left, 0), min(r.right, W) - 1
+    y0, y1 = max(r.top, 0), min(r.bottom, H) - 1
+    if x0 > x1 or y0 > y1:
+        return pos
+    return (min(max(r.centerx, x0), x1), min(max(r.centery, y0), y1))
+
+def handle_click(pos, touch_time=None):
+    """Route a tap to the handler for the current screen. `touch_time` is
+    the touch's hardware timestamp when the input source provides one."""
+    if touch_time is not None and game_state == STATE_PLAYING:
+        pos = compensate_tap(pos, touch_time)
+    recorder.tap(pos)
+    if game_state == STATE_MENU:
+        handle_menu_click(pos)
+    elif game_state == STATE_PLAYING:
+        handle_playing_click(pos)
+    elif game_state == STATE_PAUSED:
+        handle_paused_click(pos)
+    elif game_state == STATE_GAME_OVER:
+        handle_game_over_click(pos)
+
 def handle_menu_click(pos):
     global difficulty_index, volume, running, show_howto
     click_snd_menu.play()
@@ -736,7 +848,7 @@ def handle_menu_click(pos):
         return
 
 def handle_playing_click(pos):
-    global game_state, running
+    global game_state, running, gold, build_mode
 
     click_snd.play()
 
@@ -744,11 +856,36 @@ def handle_playing_click(pos):
         game_state = STATE_PAUSED
         return
 
-    # hit enemies
-    for e in enemies:
-        if e["rect"].collidepoint(pos):
-            e["hp"] -= 1
-            break
+    if build_btn_rect.collidepoint(pos):
+        build_mode = not build_mode and gold >= TOWER_COST
+        return
+
+    # hit enemies: grid lookup, furthest-along enemy wins on overlap.
+    # Damage is deferred so every tap this frame (one per finger) is tested
+    # against the same grid, then applied together by apply_tap_hits();
+    # queue_hit() counts it so a second finger skips an enemy already killed.
+    e = enemy_grid.queue_hit(pos[0], pos[1])
+    if e is not None:
+        tap_hits.append(e)
+        return
+
+    # tapping a tower cycles its targeting policy
+    t = tower_at(pos)
+    if t is not None:
+        towers.cycle_policy(t)
+        return
+
+    if build_mode and gold >= TOWER_COST and can_place_tower(pos):
+        tower_list.append(towers.make_tower(pos[0], pos[1]))
+        gold -= TOWER_COST
+        build_mode = False
+
+def apply_tap_hits():
+    """Apply this frame's batch of enemy taps."""
+    for e in tap_hits:
+        e["pending"] = 0
+        damage_enemy(e, 1)
+    del tap_hits[:]
 
 def handle_paused_click(pos):
     global game_state, running
@@ -785,7 +922,7 @@ def handle_game_over_click(pos):
 
 def check_gpio_bailout():
     global running
-    if ON_RPI and not GPIO.input(BAILOUT_PIN):
+    if bailout_pressed.is_set():
         running = False
 
 # chatbot funcs
@@ -807,9 +944,31 @@ def api_phraser():
         "want_exit": False,
     })
 
+def apply_voice_command(code, value=0):
+    """Apply one voice command (replay.CMD_*). Recorded, and re-applied
+    verbatim during replay playback."""
+    global running, game_state, volume, difficulty_index
+    recorder.command(code, value)
+
+    if code == replay.CMD_VOLUME:
+        volume = value
+        pygame.mixer.music.set_volume(volume / 100.0)
+        click_snd_menu.set_volume(volume / 100.0)
+        click_snd.set_volume(volume / 100.0)
+    elif code == replay.CMD_DIFFICULTY:
+        difficulty_index = value
+    elif code in (replay.CMD_START, replay.CMD_RESTART):
+        reset_round()
+    elif code == replay.CMD_PAUSE:
+        game_state = STATE_PAUSED
+    elif code == replay.CMD_RESUME:
+        game_state = STATE_PLAYING
+    elif code == replay.CMD_EXIT:
+        running = False
+
 def apply_chat_commands():
     """Apply one-shot voice commands from GameState."""
-    global running, game_state, volume, difficulty_index, chatbot_status
+    global chatbot_status
 
     s = api.get_state()
     if not s:
@@ -819,14 +978,11 @@ def apply_chat_commands():
         chatbot_status = s.get("chat_status")
     new_volume = s.get("volume", volume)
     if isinstance(new_volume, int) and 0 <= new_volume <= 100 and new_volume != volume:
-        volume = new_volume
-        pygame.mixer.music.set_volume(volume / 100.0)
-        click_snd_menu.set_volume(volume / 100.0)
-        click_snd.set_volume(volume / 100.0)
+        apply_voice_command(replay.CMD_VOLUME, new_volume)
 
     new_diff = s.get("difficulty", DIFFICULTY_LEVELS[difficulty_index])
     if new_diff in DIFFICULTY_LEVELS and new_diff != DIFFICULTY_LEVELS[difficulty_index]:
-        difficulty_index = DIFFICULTY_LEVELS.index(new_diff)
+        apply_voice_command(replay.CMD_DIFFICULTY, DIFFICULTY_LEVELS.index(new_diff))
 
     want_start   = s.get("want_start", False)
     want_pause   = s.get("want_pause", False)
@@ -838,65 +994,155 @@ def apply_chat_commands():
 
     # start game from menu
     if game_state == STATE_MENU and want_start:
-        reset_round()
+        apply_voice_command(replay.CMD_START)
         consumed = True
 
     # pause / resume while playing / paused
     elif game_state == STATE_PLAYING and want_pause:
-        game_state = STATE_PAUSED
+        apply_voice_command(replay.CMD_PAUSE)
         consumed = True
 
     elif game_state == STATE_PAUSED and want_resume:
-        game_state = STATE_PLAYING
+        apply_voice_command(replay.CMD_RESUME)
         consumed = True
 
     # restart after game over
     elif game_state == STATE_GAME_OVER and want_restart:
-        reset_round()
+        apply_voice_command(replay.CMD_RESTART)
         consumed = True
 
 
     elif want_exit:
-        running = False
+        apply_voice_command(replay.CMD_EXIT)
         consumed = True
 
     if consumed:
         api_phraser()
 
+# replay funcs
+def finish_recording():
+    """Close the current round's replay and save it."""
+    if recorder.active:
+        filename = recorder.finish(game_result, PLAYER_HP, ENEMY_SPAWNED)
+        if filename:
+            print("[Replay] Saved", filename)
+
+def report_playback(elapsed):
+    """Compare the re-run round against the outcome stored in the replay."""
+    p = replay_player
+    expected = (p.result, p.player_hp, p.spawned)
+    actual = (game_result, PLAYER_HP, ENEMY_SPAWNED)
+    print("[Replay] %d frames in %.3fs (%.0f fps)"
+          % (p.frames, elapsed, p.frames / max(elapsed, 1e-9)))
+    print("[Replay] expected result/hp/spawned=%s, got %s" % (expected, actual))
+    if p.result is not None and expected != actual:
+        print("[Replay] MISMATCH: playback diverged from the recording")
+        return False
+    return True
+
+
+
+# ---------------- Autoplayer / soak ----------------
+autoplayer = None
+soak = None
+if ARGS.autoplay:
+    from autoplayer import AutoPlayer, SoakMonitor
+    autoplayer = AutoPlayer(accuracy=ARGS.accuracy, tap_rate=ARGS.tap_rate,
+                            latency_ms=tuple(ARGS.latency_ms),
+                            voice_interval=ARGS.voice_interval)
+    autoplay_buttons = {
+        "start":   menu_start_rect,
+        "pause":   pause_btn_rect,
+        "resume":  pause_resume_rect,
+        "restart": go_restart_rect,
+    }
+    soak = SoakMonitor()
+    autoplayer.start()
 
+def finish_soak():
+    """Stop the autoplayer and print / save the soak report."""
+    if soak is None:
+        return
+    autoplayer.stop()
+    text = soak.report({"taps": autoplayer.taps,
+                        "voice cmds": autoplayer.voice_commands,
+                        "lag comp": touch_history.report()})
+    text += "\n" + touch_latency.report()
+    print(text)
+    try:
+        with open(ARGS.soak_report, "w") as f:
+            f.write(text + "\n")
+    except OSError as e:
+        print("Failed to write soak report:", e)
 
 # ---------------- Main Loop ----------------
+replay_taps = []
+replay_cmds = []
+replay_ok = True
+if replay_player is not None:
+    difficulty_index = replay_player.difficulty
+    random.seed(replay_player.seed)
+    reset_round()
+    if PATH_SETS[DIFFICULTY_LEVELS[difficulty_index]].index(PATH_POINTS) != replay_player.path:
+        print("[Replay] Warning: seed picked a different path than recorded")
+    replay_start = time.time()
+
 try:
     while running:
-        dt = clock.tick(30) / 1000.0
+        if replay_player is None:
+            dt = clock.tick(30) / 1000.0
+        else:
+            del replay_taps[:]
+            del replay_cmds[:]
+            dt = replay_player.next_frame(replay_taps, replay_cmds)
+            if dt is None:
+                replay_ok = report_playback(time.time() - replay_start)
+                break
+            if not ARGS.fast:
+                clock.tick(30)
         now = time.time()
 
+        if soak is not None:
+            soak.frame(dt * 1000.0, clock.get_rawtime())
+            soak.sample(now)
+            if ARGS.soak_minutes and now - soak.started >= ARGS.soak_minutes * 60:
+                running = False
+            autoplayer.update(now, game_state, enemies, autoplay_buttons)
+
         if pitft is not None:
             pitft.update()
 
         for event in pygame.event.get():
             if event.type == QUIT:
                 running = False
-            elif event.type == MOUSEBUTTONUP:
-                pos = pygame.mouse.get_pos()
-                if game_state == STATE_MENU:
-                    handle_menu_click(pos)
-                elif game_state == STATE_PLAYING:
-                    handle_playing_click(pos)
-                elif game_state == STATE_PAUSED:
-                    handle_paused_click(pos)
-                elif game_state == STATE_GAME_OVER:
-                    handle_game_over_click(pos)
+            elif event.type == MOUSEBUTTONUP and replay_player is None:
+                handle_click(event.pos, getattr(event, "timestamp", None))
+                touch_latency.handled(event, time.time())
+
+        for pos in replay_taps:
+            handle_click(pos)
+
+        apply_tap_hits()
 
         check_gpio_bailout()
 
         # apply voice command first
-        apply_chat_commands()
+        if replay_player is None:
+            apply_chat_commands()
+        else:
+            for code, value in replay_cmds:
+                apply_voice_command(code, value)
+
+        # closes this tick's replay record; taps/commands above belong to it
+        recorder.frame(dt)
 
         # Only update gameplay when actually playing
         if game_state == STATE_PLAYING:
-            maybe_spawn_enemy(now)
+            round_time += dt
+            maybe_spawn_enemy(round_time)
             update_enemies(dt)
+            update_towers(dt)
+            particles.update(dt)
 
             # Check win / lose
             if PLAYER_HP <= 0:
@@ -906,13 +1152,19 @@ try:
                 game_state = STATE_GAME_OVER
                 game_result = "win"
 
+        # round over (or abandoned to the menu): save its replay
+        if game_state in (STATE_GAME_OVER, STATE_MENU):
+            finish_recording()
+
         # sync states to chatbot
-        if now - last_sync_time >= 0.5:
+        if replay_player is None and now - last_sync_time >= 0.5:
             sync_to_chat_state()
             last_sync_time = now
 
         # Draw by state
-        if game_state == STATE_MENU:
+        if replay_player is not None and ARGS.fast:
+            pass
+        elif game_state == STATE_MENU:
             draw_menu()
         elif game_state == STATE_PLAYING:
             draw_playing()
@@ -921,9 +1173,27 @@ try:
         elif game_state == STATE_GAME_OVER:
             draw_game_over()
 
+        # what the player can see (and aim at) from now on
+        shown = time.time()
+        touch_latency.presented(shown)
+        if game_state == STATE_PLAYING and replay_player is None:
+            touch_history.record(shown, enemies)
+
 finally:
+    finish_recording()
+    finish_soak()
+    if touch_history.taps:
+        print("[Touch] lag comp:", touch_history.report())
+    if ARGS.touch_latency:
+        touch_latency.dump(ARGS.touch_latency)
+        print("[Touch] Latency report written to", ARGS.touch_latency)
     pygame.quit()
+    if gpio_buttons is not None:
+        gpio_buttons.close()
     if ON_RPI:
         GPIO.cleanup()
     if pitft is not None:
         del pitft
+
+if not replay_ok:
+    sys.exit(1)
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from gpio_input import ButtonInput, FakeGPIO
+
+DEBOUNCE_MS = 20
+PIN = 17
+
+
+def make_input():
+    gpio = FakeGPIO()
+    buttons = ButtonInput(backend=gpio, debounce_ms=DEBOUNCE_MS)
+    return gpio, buttons
+
+
+def settle():
+    # past the debounce window of the last accepted change
+    time.sleep(2 * DEBOUNCE_MS / 1000.0)
+
+
+def names_and_states(buttons):
+    return [(name, pressed) for name, pressed, _ in buttons.get_events([])]
+
+
+def test_press_and_release_are_reported_after_debounce():
+    gpio, buttons = make_input()
+    buttons.add_button("fire", PIN)
+    assert not buttons.is_pressed("fire")
+
+    settle()
+    gpio.press(PIN)
+    assert buttons.is_pressed("fire")
+    settle()
+    gpio.release(PIN)
+    assert not buttons.is_pressed("fire")
+    assert names_and_states(buttons) == [("fire", True), ("fire", False)]
+    buttons.close()
+
+
+def test_bounce_inside_the_window_is_ignored():
+    gpio, buttons = make_input()
+    buttons.add_button("fire", PIN)
+    settle()
+    gpio.press(PIN)
+    gpio.release(PIN)       # contact bounce
+    gpio.press(PIN)
+    settle()                # the re-check finds the button still down
+    assert buttons.is_pressed("fire")
+    assert names_and_states(buttons) == [("fire", True)]
+    buttons.close()
+
+
+def test_change_inside_the_window_is_picked_up_by_the_recheck():
+    gpio, buttons = make_input()
+    buttons.add_button("fire", PIN)
+    settle()
+    gpio.press(PIN)
+    gpio.release(PIN)       # a real (very short) tap
+    assert buttons.is_pressed("fire")
+    assert buttons.wait_release("fire", timeout=1.0)
+    assert names_and_states(buttons) == [("fire", True), ("fire", False)]
+    buttons.close()
+
+
+def test_shared_pin_reports_every_name():
+    gpio, buttons = make_input()
+    seen = []
+    buttons.add_button("pitft_4", PIN)
+    buttons.add_button("bailout", PIN)    # FakeGPIO raises on a second add_event_detect
+    buttons.on("pitft_4", lambda name, pressed: seen.append((name, pressed)))
+    buttons.on("bailout", lambda name, pressed: seen.append((name, pressed)))
+    settle()
+    gpio.press(PIN)
+    assert buttons.is_pressed("pitft_4") and buttons.is_pressed("bailout")
+    assert names_and_states(buttons) == [("pitft_4", True), ("bailout", True)]
+    assert sorted(seen) == [("bailout", True), ("pitft_4", True)]
+    buttons.close()
+
+
+def test_wait_press_and_wait_release_time_out():
+    gpio, buttons = make_input()
+    buttons.add_button("talk", PIN)
+    assert not buttons.wait_press("talk", timeout=0.01)
+    assert buttons.wait_release("talk", timeout=0.01)
+
+    settle()
+    threading.Timer(0.05, gpio.press, (PIN,)).start()
+    assert buttons.wait_press("talk", timeout=1.0)
+    assert not buttons.wait_release("talk", timeout=0.01)
+    buttons.close()
@@ -0,0 +1,79 @@
+import tracemalloc
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+from lag_compensation import PositionHistory
+
+
+def enemy(uid, x, y, dist=0.0, hp=3):
+    return {"uid": uid, "hp": hp, "pending": 0, "dist": dist,
+            "rect": pygame.Rect(x, y, 10, 10)}
+
+
+def test_tap_hits_where_the_enemy_was_drawn():
+    hist = PositionHistory(frames=4, capacity=2)
+    e = enemy(1, 0, 0)
+    hist.record(1.0, [e])
+    e["rect"].x = 50
+    hist.record(2.0, [e])
+
+    assert hist.query_point(5, 5, 1.5, 1.6) is e
+    assert hist.rescued == 1
+    assert hist.query_point(55, 5, 2.1, 2.2) is e
+
+
+def test_recycled_enemy_is_not_rewound():
+    hist = PositionHistory(frames=4, capacity=2)
+    e = enemy(1, 0, 0)
+    hist.record(1.0, [e])
+    e["uid"] = 2     # back through the pool as a new enemy
+    assert hist.query_point(5, 5, 1.0, 1.1) is None
+
+
+def test_frame_overwrite_drops_stale_entries():
+    hist = PositionHistory(frames=1, capacity=4)
+    a, b = enemy(1, 0, 0), enemy(2, 50, 0)
+    hist.record(1.0, [a, b])
+    hist.record(2.0, [b])
+    assert hist.sizes[0] == 1
+    assert hist.enemy[0][1] is None
+    assert hist.query_point(5, 5, 2.0, 2.1) is None
+
+
+def test_record_overwrites_frames_in_place():
+    hist = PositionHistory(frames=16, capacity=64)
+    # coordinates below 256 so the rect edges are cached small ints
+    enemies = [enemy(i, i * 3, 0, dist=float(i)) for i in range(64)]
+    for t in range(32):
+        hist.record(float(t), enemies)
+    arrays = [hist.enemy[0], hist.uid[0], hist.left[0], hist.dist[0]]
+
+    tracemalloc.start()
+    try:
+        hist.record(100.0, enemies)
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for t in range(1000):
+            hist.record(200.0 + t, enemies)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # the peak also sees a per-frame list that is freed again right away
+    assert peak - before < 384
+    same = [hist.enemy[0], hist.uid[0], hist.left[0], hist.dist[0]]
+    assert all(a is b for a, b in zip(arrays, same))
+    assert len(hist.left[0]) == hist.capacity == 64
+
+
+def test_reserve_grows_every_frame():
+    hist = PositionHistory(frames=3, capacity=2)
+    hist.reserve(5)
+    hist.reserve(4)
+    assert hist.capacity == 5
+    assert all(len(hist.bottom[f]) == 5 for f in range(3))
+    enemies = [enemy(i, i * 20, 0) for i in range(6)]
+    hist.record(1.0, enemies)
+    assert hist.sizes[0] == 5      # the rest aren't recorded, never allocated
@@ -0,0 +1,72 @@
+import pytest
+
+evdev = pytest.importorskip("evdev")
+
+import pitft_touchscreen as pt
+
+
+def parse(events):
+    ts = pt.pitft_touchscreen(device_path="/dev/null", replay=None)
+    for stamp, etype, code, value in events:
+        ts.handle(etype, code, value, stamp)
+    return ts, ts.get_events([])
+
+
+def test_tracking_id_with_abs_xy_keeps_coordinates():
+    ts, out = parse(pt.synthetic_taps(taps=3, drag_steps=4, x=120, y=160))
+    assert not ts.mt
+    presses = [e for e in out if e['touch'] == 1 and not e['motion']]
+    motions = [e for e in out if e['motion']]
+    assert len(presses) == 3
+    assert motions, "drags must survive as motion events"
+    for e in presses + motions:
+        assert e['y'] == 160
+        assert 120 <= e['x'] < 124
+    # the last motion of each drag carries the final position
+    assert motions[-1]['x'] == 123
+
+
+def test_multitouch_slots_report_each_finger():
+    ts, out = parse(pt.synthetic_multitouch(taps=1, fingers=2, x=60, y=160, spacing=60))
+    assert ts.mt
+    presses = sorted((e['slot'], e['x'], e['y']) for e in out if e['touch'] == 1)
+    assert presses == [(0, 60, 160), (1, 120, 160)]
+    assert sorted(e['slot'] for e in out if e['touch'] == 0) == [0, 1]
+
+
+def press(slot, touch=1):
+    return {'slot': slot, 'touch': touch, 'motion': False}
+
+
+def motion(slot, x):
+    return {'slot': slot, 'touch': 1, 'motion': True, 'x': x}
+
+
+def test_full_ring_drops_motion_before_presses():
+    ring = pt.TouchRing(capacity=4)
+    for event in (press(0), motion(0, 1), press(1), motion(1, 2)):
+        ring.put(event)
+    ring.put(press(0, touch=0))     # full: the oldest motion goes
+    ring.put(press(1, touch=0))     # and then the other one
+    out = ring.drain([])
+    assert [(e['slot'], e['touch'], e['motion']) for e in out] == [
+        (0, 1, False), (1, 1, False), (0, 0, False), (1, 0, False)]
+    assert ring.dropped == 2
+
+
+def test_full_ring_of_presses_drops_incoming_motion():
+    ring = pt.TouchRing(capacity=2)
+    ring.put(press(0))
+    ring.put(press(1))
+    ring.put(motion(0, 5))
+    assert ring.drain([]) == [press(0), press(1)]
+    assert ring.dropped == 1
+
+
+def test_full_ring_of_presses_drops_oldest_press():
+    ring = pt.TouchRing(capacity=2)
+    ring.put(press(0))
+    ring.put(press(1))
+    ring.put(press(0, touch=0))
+    assert ring.drain([]) == [press(1), press(0, touch=0)]
+    assert ring.dropped == 1
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("pygame")
+
+from enemy_pool import EnemyPool
+from spatial_grid import EnemyGrid
+
+
+def stacked_pair(pool):
+    """Two enemies on the same spot; `front` is further along the path."""
+    path = [(100, 100), (300, 100)]
+    back = pool.spawn(path, "normal", 3, 30.0, uid=1)
+    front = pool.spawn(path, "easy", 1, 30.0, uid=2)
+    front["dist"] = 5.0
+    return front, back
+
+
+def test_second_tap_skips_enemy_the_first_one_killed():
+    pool = EnemyPool(4, 40, 24)
+    grid = EnemyGrid(320, 240)
+    front, back = stacked_pair(pool)
+    grid.rebuild(pool.active)
+
+    # two fingers in one frame, damage applied afterwards (apply_tap_hits)
+    hits = [grid.queue_hit(110, 100), grid.queue_hit(112, 102)]
+    assert hits == [front, back]
+    for e in hits:
+        e["pending"] = 0
+        e["hp"] -= 1
+    assert front["hp"] == 0
+    assert back["hp"] == 2
+
+
+def test_taps_stack_on_an_enemy_with_hp_to_spare():
+    pool = EnemyPool(4, 40, 24)
+    grid = EnemyGrid(320, 240)
+    front, back = stacked_pair(pool)
+    front["hp"] = 2
+    grid.rebuild(pool.active)
+
+    hits = [grid.queue_hit(110, 100) for _ in range(3)]
+    assert hits == [front, front, back]
+    assert grid.query_point(110, 100) is back
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("pygame")
+
+from enemy_pool import EnemyPool
+from towers import ProjectilePool
+
+
+def spawn(pool, uid, x=100, y=100, hp=3):
+    e = pool.acquire()
+    e["uid"] = uid
+    e["hp"] = hp
+    e["rect"].topleft = (x, y)
+    return e
+
+
+def test_shot_at_released_enemy_fizzles():
+    pool = EnemyPool(4, 10, 10)
+    target = spawn(pool, uid=1)
+    shots = ProjectilePool(8)
+    shots.fire(0.0, 0.0, target, speed=10.0, damage=1)
+
+    # the enemy escapes with hp left and goes back to the pool
+    pool.active.remove(target)
+    pool.release(target)
+
+    hits = []
+    shots.update(100.0, lambda e, dmg: hits.append(e))
+    assert hits == []
+    assert shots.count == 0
+
+
+def test_shot_at_recycled_enemy_fizzles():
+    pool = EnemyPool(1, 10, 10)
+    target = spawn(pool, uid=1)
+    shots = ProjectilePool(8)
+    shots.fire(0.0, 0.0, target, speed=10.0, damage=1)
+    pool.active.remove(target)
+    pool.release(target)
+    assert spawn(pool, uid=2) is target
+
+    hits = []
+    shots.update(100.0, lambda e, dmg: hits.append(e))
+    assert hits == []
+
+
+def test_shot_hits_live_enemy():
+    pool = EnemyPool(1, 10, 10)
+    target = spawn(pool, uid=1)
+    shots = ProjectilePool(8)
+    shots.fire(0.0, 0.0, target, speed=10.0, damage=2)
+
+    hits = []
+    shots.update(100.0, lambda e, dmg: hits.append((e["uid"], dmg)))
+    assert hits == [(1, 2)]
@@ -0,0 +1,30 @@
+import json
+
+from game_rules import ENEMY_TYPES
+from wave_scheduler import WaveScheduler, load_waves
+
+PATH_SETS = {"easy": [[(0, 0)]], "hard": [[(0, 0)], [(1, 1)]]}
+
+
+def write(directory, name, events):
+    (directory / name).write_text(json.dumps({"events": events}))
+
+
+def test_load_waves_keeps_valid_files_and_skips_bad_ones(tmp_path):
+    write(tmp_path, "hard.json", [{"time": 1.0, "type": "easy", "path": 1, "count": 2}])
+    write(tmp_path, "easy.json", [{"time": 1.0, "path": 3}])      # easy has no path 3
+    write(tmp_path, "example_mixed.json", [{"time": 1.0}])       # not a difficulty
+
+    waves = load_waves(PATH_SETS, ENEMY_TYPES, directory=str(tmp_path))
+    assert list(waves) == ["hard"]
+    assert waves["hard"][0]["count"] == 2
+
+
+def test_scheduler_spaces_out_a_burst():
+    events = [{"time": 1.0, "type": None, "path": None, "count": 3, "interval": 0.5}]
+    wave = WaveScheduler(events, default_interval=2.0)
+    spawned = []
+    for now in (0.9, 1.0, 1.6, 2.0, 9.0):
+        wave.poll(now, lambda entry: spawned.append(now))
+    assert spawned == [1.0, 1.6, 2.0]
+    assert wave.empty()
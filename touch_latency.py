@@ -0,0 +1,93 @@
+# touch_latency.py
+# Touch-to-photon latency, broken down by pipeline stage.
+#
+# A PiTFT tap picks up a timestamp at each hop on its way to the screen:
+#
+#   touch     evdev hardware timestamp          (pitft_touchscreen)
+#   read      reader thread saw the SYN_REPORT  (pitft_touchscreen)
+#   post      pygame event posted               (PiTft.update)
+#   handled   click handler ran                 (main loop)
+#   flip      next display.flip() returned      (main loop)
+#
+# Each gap goes into its own histogram so it is obvious which stage is
+# worth optimising. All times are time.time() seconds.
+
+STAGES = (
+    ("read",     "touch",   "read"),
+    ("queue",    "read",    "post"),
+    ("dispatch", "post",    "handled"),
+    ("render",   "handled", "flip"),
+    ("total",    "touch",   "flip"),
+)
+
+
+class LatencyTracker:
+    """Per-stage 1 ms histograms for taps that reach the screen."""
+
+    BUCKETS = 250      # the last bucket catches everything slower
+
+    def __init__(self):
+        self.hist = dict((name, [0] * self.BUCKETS) for name, _, _ in STAGES)
+        self.worst = dict((name, 0.0) for name, _, _ in STAGES)
+        self.pending = []      # stamps of taps handled since the last flip
+        self.taps = 0
+
+    def handled(self, event, now):
+        """Note a tap the main loop just dispatched. `event` is the pygame
+        event; stamps the input source did not provide are skipped."""
+        stamps = {"handled": now}
+        for key, attr in (("touch", "timestamp"), ("read", "read_time"), ("post", "post_time")):
+            value = getattr(event, attr, None)
+            if value is not None:
+                stamps[key] = value
+        self.pending.append(stamps)
+
+    def presented(self, now):
+        """Call right after display.flip(); closes every pending tap."""
+        if not self.pending:
+            return
+        for stamps in self.pending:
+            stamps["flip"] = now
+            for name, start, end in STAGES:
+                if start in stamps and end in stamps:
+                    ms = max(0.0, (stamps[end] - stamps[start]) * 1000.0)
+                    self.hist[name][min(int(ms), self.BUCKETS - 1)] += 1
+                    self.worst[name] = max(self.worst[name], ms)
+            self.taps += 1
+        del self.pending[:]
+
+    def _percentile(self, hist, q):
+        target = q * sum(hist)
+        seen = 0
+        for ms, n in enumerate(hist):
+            seen += n
+            if seen >= target and n:
+                return ms
+        return 0
+
+    def report(self):
+        lines = ["=== Touch latency (%d taps) ===" % self.taps]
+        for name, start, end in STAGES:
+            hist = self.hist[name]
+            n = sum(hist)
+            if not n:
+                continue
+            lines.append("%-9s %-16s n %-6d p50 %d ms  p95 %d ms  p99 %d ms  max %.1f ms"
+                         % (name, "%s->%s" % (start, end), n,
+                            self._percentile(hist, 0.50), self._percentile(hist, 0.95),
+                            self._percentile(hist, 0.99), self.worst[name]))
+        return "\n".join(lines)
+
+    def dump(self, filename):
+        """Write the report plus the raw histograms (ms,count per stage)."""
+        try:
+            with open(filename, "w") as f:
+                f.write(self.report() + "\n\n")
+                for name, _, _ in STAGES:
+                    hist = self.hist[name]
+                    f.write("[%s]\n" % name)
+                    for ms, n in enumerate(hist):
+                        if n:
+                            f.write("%d,%d\n" % (ms, n))
+        except OSError as e:
+            print("Failed to write touch latency report:", e)
@@ -0,0 +1,118 @@
+# towers.py
+# Auto-firing towers and their pooled projectiles.
+#
+# Towers are plain dicts like enemies. Target acquisition goes through the
+# EnemyGrid (only the cells under a tower's range circle are scanned), and
+# projectiles live in fixed-size parallel arrays so firing never allocates.
+
+TARGET_POLICIES = ("first", "strongest", "nearest")
+
+TOWER_RANGE      = 60.0     # px, measured to the enemy's centre
+TOWER_FIRE_RATE  = 1.5      # shots per second
+TOWER_DAMAGE     = 1
+PROJECTILE_SPEED = 200.0    # px per second
+
+
+def make_tower(x, y, policy="first"):
+    return {
+        "x": x,
+        "y": y,
+        "range": TOWER_RANGE,
+        "rate": TOWER_FIRE_RATE,
+        "damage": TOWER_DAMAGE,
+        "policy": policy,
+        "cooldown": 0.0,
+    }
+
+
+def cycle_policy(tower):
+    i = TARGET_POLICIES.index(tower["policy"])
+    tower["policy"] = TARGET_POLICIES[(i + 1) % len(TARGET_POLICIES)]
+
+
+class ProjectilePool:
+    """Homing projectiles stored as parallel arrays with swap-remove.
+
+    Each shot remembers its target's spawn uid so that an enemy recycled by
+    the EnemyPool is never hit by a shot aimed at its previous life.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.count = 0
+        self.x = [0.0] * capacity
+        self.y = [0.0] * capacity
+        self.speed = [0.0] * capacity
+        self.damage = [0] * capacity
+        self.target = [None] * capacity
+        self.uid = [0] * capacity
+
+    def clear(self):
+        for i in range(self.count):
+            self.target[i] = None
+        self.count = 0
+
+    def fire(self, x, y, target, speed, damage):
+        """Launch a shot; returns False (and drops it) when the pool is full."""
+        i = self.count
+        if i >= self.capacity:
+            return False
+        self.x[i] = x
+        self.y[i] = y
+        self.speed[i] = speed
+        self.damage[i] = damage
+        self.target[i] = target
+        self.uid[i] = target["uid"]
+        self.count = i + 1
+        return True
+
+    def _remove(self, i):
+        last = self.count - 1
+        if i != last:
+            self.x[i] = self.x[last]
+            self.y[i] = self.y[last]
+            self.speed[i] = self.speed[last]
+            self.damage[i] = self.damage[last]
+            self.target[i] = self.target[last]
+            self.uid[i] = self.uid[last]
+        self.target[last] = None
+        self.count = last
+
+    def update(self, dt, on_hit):
+        """Move every shot toward its target; call on_hit(enemy, damage) on
+        arrival. Shots whose target already died just fizzle."""
+        i = 0
+        while i < self.count:
+            e = self.target[i]
+            if e["uid"] != self.uid[i] or e["hp"] <= 0:
+                self._remove(i)
+                continue
+            r = e["rect"]
+            dx = r.centerx - self.x[i]
+            dy = r.centery - self.y[i]
+            dist = (dx*dx + dy*dy) ** 0.5
+            step = self.speed[i] * dt
+            if step >= dist:
+                on_hit(e, self.damage[i])
+                self._remove(i)
+                continue
+            self.x[i] += dx * step / dist
+            self.y[i] += dy * step / dist
+            i += 1
+
+
+def update_towers(towers, grid, projectiles, dt, on_fire=None):
+    """Tick tower cooldowns and fire at whatever each tower's policy picks.
+    on_fire(tower), if given, is called for every shot (muzzle effects)."""
+    for t in towers:
+        t["cooldown"] -= dt
+        if t["cooldown"] > 0:
+            continue
+        target = grid.query_radius(t["x"], t["y"], t["range"], t["policy"])
+        if target is None:
+            t["cooldown"] = 0.0   # stay ready, look again next tick
+            continue
+        if projectiles.fire(t["x"], t["y"], target, PROJECTILE_SPEED, t["damage"]):
+            t["cooldown"] += 1.0 / t["rate"]
+            if on_fire is not None:
+                on_fire(t)